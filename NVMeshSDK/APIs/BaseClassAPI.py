@@ -5,17 +5,49 @@
 """
 from NVMeshSDK.ConnectionManager import ConnectionManager, ConnectionManagerError
 from NVMeshSDK.Entities.Entity import Entity
+from NVMeshSDK.MongoObj import MongoObj
+from NVMeshSDK.RequestContext import RequestContext
 from NVMeshSDK.Utils import Utils
 from NVMeshSDK.LoggerUtils import Logger
-from NVMeshSDK.APIs.ConfigurationVersionAPI import ConfigurationVersionAPI
+from NVMeshSDK.APIs.ConfigurationVersionAPI import ConfigurationVersionAPI, DBUUIDCache
 
+from concurrent import futures
+import collections
 import logging
+import threading
+import Queue
+
+DEFAULT_ITERATE_PAGE_SIZE = 1000
+# most HTTP servers and proxies limit the request line to 8KB, the rest of the URL should fit in the remaining space
+MAX_QUERY_STRING_LENGTH = 4096
+DEFAULT_GET_BY_IDS_CONCURRENCY = 4
+# the threads that run the concurrent requests (e.g. of getByIds) of all API objects in the process
+MAX_SHARED_WORKERS = 16
+
+_sharedExecutor = None
+_sharedExecutorLock = threading.Lock()
+
+
+def _getSharedExecutor():
+    global _sharedExecutor
+    with _sharedExecutorLock:
+        if _sharedExecutor is None:
+            _sharedExecutor = futures.ThreadPoolExecutor(max_workers=MAX_SHARED_WORKERS, thread_name_prefix='sdk-worker')
+
+        return _sharedExecutor
+
+
+class IterateError(Exception):
+    def __init__(self, err):
+        Exception.__init__(self, 'Failed to fetch a page of entities. Error: {0}'.format(err))
+        self.err = err
+
 
 class BaseClassAPI(object):
     configFile = '/etc/opt/NVMesh/nvmesh.conf'
 
     """All the base API functions are defined here."""
-    def __init__(self, user=None, password=None, logger=None, managementServers=None, managementProtocol='https', dbUUID=None):
+    def __init__(self, user=None, password=None, logger=None, managementServers=None, managementProtocol='https', dbUUID=None, fastEntities=False):
         """**Initializes a singleton connection to the management server, by default uses an application user,
         it is optional to provide a different user and password for the connection.**
 
@@ -27,9 +59,12 @@ class BaseClassAPI(object):
         :type managementServers: str, optional
         :param managementProtocol:  The management servers protocol, defaults to https
         :type managementProtocol: str, optional
+        :param fastEntities: return __slots__ based entities (see Entity.getFastClass) from get and stream, defaults to False
+        :type fastEntities: bool, optional
         :raises ConnectionManagerError: If there was a problem connecting to the management server.
         """
         self.logger = logger if logger else logging.getLogger('NVMeshSDK')
+        self.fastEntities = fastEntities
 
         if not managementServers:
             managementServers, managementProtocol = self.getManagementServersAndProtocolFromConfigs()
@@ -48,6 +83,10 @@ class BaseClassAPI(object):
             raise e
 
     def getDBUUID(self, managementServers):
+        dbUUID = DBUUIDCache.get(managementServers)
+        if dbUUID:
+            return dbUUID
+
         err, result = ConfigurationVersionAPI(managementServersUrls=managementServers, logger=self.logger).getDBUUID()
         if err or not result:
             msg = 'Failed to resolve {} into DB UUID. '.format(managementServers)
@@ -88,24 +127,180 @@ class BaseClassAPI(object):
         return ''
 
     def get(self, page=0, count=0, filter=None, sort=None, projection=None, route=None):
-        routes = ['all'] if route is None else route
-        query = Utils.buildQueryStr({'filter': filter, 'sort': sort, 'projection': projection})
-
-        if page is None and count is None:
-            routes[0] += query
-        else:
-            routes += ['{0}'.format(page), '{0}{1}'.format(count, query)]
-
+        routes = self.getRoutesWithQuery(page, count, filter, sort, projection, route)
         err, out = self.makeGet(routes)
 
         if out is not None:
-            enteties = [self.getType()(**result) for result in out]
+            entityType = self.getEntityType()
+            enteties = [entityType(**result) for result in out]
             for entity in enteties:
                 entity.deserialize()
             return None, enteties
         else:
             return err, None
 
+    def iterate(self, filter=None, projection=None, pageSize=DEFAULT_ITERATE_PAGE_SIZE, afterId=None):
+        """**Yields all the entities that match filter ordered by _id, fetching pageSize entities at a time**
+
+        Every page is fetched with a filter of _id greater than the last _id of the previous page (keyset pagination),
+        so the management does not have to skip the entities of all the previous pages and a full scan is O(n) instead of O(n^2).
+
+        :param filter: a list of MongoObj, must not contain a condition on _id, defaults to None
+        :type filter: list, optional
+        :param projection: a list of MongoObj, the _id field must not be excluded, defaults to None
+        :type projection: list, optional
+        :param pageSize: the number of entities fetched in each request (0 - all in one request), defaults to 1000
+        :type pageSize: int, optional
+        :param afterId: start after the entity with this _id, defaults to None
+        :type afterId: str, optional
+        :raises IterateError: If fetching one of the pages failed.
+        :return: generator of entities
+
+        - Example::
+
+                from NVMeshSDK.APIs.VolumeAPI import VolumeAPI
+
+                for volume in VolumeAPI().iterate(projection=[MongoObj(field='capacity', value=1)], pageSize=500):
+                    print volume._id, volume.capacity
+        """
+        filter = list(filter or [])
+        sort = [MongoObj(field='_id', value=1)]
+
+        while True:
+            pageFilter = filter + [MongoObj(field='_id', value={'$gt': afterId})] if afterId is not None else filter
+            err, entities = self.get(page=0, count=pageSize, filter=pageFilter or None, sort=sort, projection=projection)
+            if err:
+                raise IterateError(err)
+
+            for entity in entities:
+                yield entity
+
+            # a pageSize of 0 fetches all the entities in a single request
+            if not pageSize or len(entities) < pageSize:
+                return
+
+            afterId = entities[-1]._id
+
+    def getByIds(self, ids, projection=None, idField='_id', maxQueryLength=MAX_QUERY_STRING_LENGTH, maxConcurrency=DEFAULT_GET_BY_IDS_CONCURRENCY):
+        """**Gets the entities with the given ids, using as few requests as possible**
+
+        The ids are split into chunks whose $in filter fits in a URL-safe query string, the chunks are fetched concurrently
+        (up to maxConcurrency requests at a time over the same pooled connection) and the results are merged.
+
+        :param ids: list of entity ids
+        :type ids: list
+        :param projection: a list of MongoObj, defaults to None
+        :type projection: list, optional
+        :param idField: the field the ids are matched against, defaults to _id
+        :type idField: str, optional
+        :param maxQueryLength: the maximal length of the query string of each request, defaults to 4096
+        :type maxQueryLength: int, optional
+        :param maxConcurrency: the maximal number of requests sent at the same time, defaults to 4
+        :type maxConcurrency: int, optional
+        :return: tuple (err, out) where out is a list of the entities that were found, in the order of the chunks. err is the error of the first chunk that failed
+        :rtype: tuple
+
+        - Example::
+
+                from NVMeshSDK.APIs.VolumeAPI import VolumeAPI
+
+                err, volumes = VolumeAPI().getByIds(['vol-1', 'vol-2'], projection=[MongoObj(field='capacity', value=1)])
+        """
+        ids = list(collections.OrderedDict.fromkeys(ids))
+        if not ids:
+            return None, []
+
+        fixedQuery = Utils.buildQueryStr({'filter': [MongoObj(field=idField, value={'$in': []})], 'projection': projection})
+        chunks = Utils.splitValuesForQuery(ids, Utils.getURLEncodedLength(fixedQuery), maxQueryLength)
+
+        def getChunk(chunk):
+            return self.get(filter=[MongoObj(field=idField, value={'$in': chunk})], projection=projection)
+
+        results = self.runConcurrently(getChunk, chunks, maxConcurrency)
+
+        entities = []
+        for err, out in results:
+            if err:
+                return err, None
+
+            entities.extend(out)
+
+        return None, entities
+
+    @staticmethod
+    def runConcurrently(func, argsList, maxConcurrency):
+        """Returns [func(args) for args in argsList] calling func from up to maxConcurrency threads, an exception raised by func is raised here
+        The calling thread and up to maxConcurrency - 1 threads of the shared executor (of MAX_SHARED_WORKERS threads) call func"""
+        if len(argsList) == 1 or maxConcurrency <= 1:
+            return [func(args) for args in argsList]
+
+        tasks = Queue.Queue()
+        for index, args in enumerate(argsList):
+            tasks.put((index, args))
+
+        results = [None] * len(argsList)
+        exceptions = []
+
+        def worker():
+            while not exceptions:
+                try:
+                    index, args = tasks.get_nowait()
+                except Queue.Empty:
+                    return
+
+                try:
+                    results[index] = func(args)
+                except Exception as ex:
+                    exceptions.append(ex)
+
+        executor = _getSharedExecutor()
+        helpers = [executor.submit(RequestContext.bindToCurrent(worker)) for _ in range(min(maxConcurrency, len(argsList)) - 1)]
+        # the calling thread works on the tasks too, so the call completes even when all the shared threads are busy
+        worker()
+
+        for helper in helpers:
+            # a helper that did not start yet has nothing left to do
+            if not helper.cancel():
+                helper.result()
+
+        if exceptions:
+            raise exceptions[0]
+
+        return results
+
+    def stream(self, page=0, count=0, filter=None, sort=None, projection=None, route=None):
+        """**Same as get, but the entities are created one at a time while the response is received, instead of loading the whole response into memory**
+
+        :return: tuple (err, out) where out is a generator of entities
+        :rtype: tuple
+        """
+        routes = self.getRoutesWithQuery(page, count, filter, sort, projection, route)
+        route = Utils.createRouteString(routes=routes, endPointRoute=self.getEndpointRoute())
+        err, out = self.managementConnection.getStream(route)
+
+        if out is not None:
+            return None, self.iterEntities(out)
+        else:
+            return err, None
+
+    def iterEntities(self, results):
+        entityType = self.getEntityType()
+        for result in results:
+            entity = entityType(**result)
+            entity.deserialize()
+            yield entity
+
+    def getRoutesWithQuery(self, page=0, count=0, filter=None, sort=None, projection=None, route=None):
+        routes = ['all'] if route is None else route
+        query = Utils.buildQueryStr({'filter': filter, 'sort': sort, 'projection': projection})
+
+        if page is None and count is None:
+            routes[0] += query
+        else:
+            routes += ['{0}'.format(page), '{0}{1}'.format(count, query)]
+
+        return routes
+
     def count(self):
         return self.makeGet(['count'])
 
@@ -160,3 +355,7 @@ class BaseClassAPI(object):
 
     def getType(self):
         pass
+
+    def getEntityType(self):
+        """**Returns the class used to create the entities returned by get and stream**"""
+        return self.getType().getFastClass() if self.fastEntities else self.getType()
@@ -1,7 +1,58 @@
+import threading
+import time
+
 from NVMeshSDK.Consts import EndpointRoutes
-from NVMeshSDK.ConnectionManager import ConnectionManagerError, ConnectionManager
+from NVMeshSDK.ConnectionManager import ConnectionManagerError, ConnectionManager, defaultConfig
 from NVMeshSDK.Utils import Utils
 
+DEFAULT_DB_UUID_CACHE_TTL = 300
+
+
+class DBUUIDCache(object):
+	"""**Process-wide cache of management servers to DB UUID**
+
+	Resolving the DB UUID takes a login and a request to the management, the cache lets API objects for the same servers skip it.
+	Entries expire after DB_UUID_CACHE_TTL seconds (from defaultConfig) in case the servers were moved to a different management cluster.
+	"""
+	__lock = threading.Lock()
+	__entries = {}
+
+	@staticmethod
+	def get(managementServers):
+		key = DBUUIDCache._getKey(managementServers)
+		with DBUUIDCache.__lock:
+			entry = DBUUIDCache.__entries.get(key)
+			if not entry:
+				return None
+
+			dbUUID, expiryTime = entry
+			if time.time() >= expiryTime:
+				del DBUUIDCache.__entries[key]
+				return None
+
+			return dbUUID
+
+	@staticmethod
+	def set(managementServers, dbUUID):
+		ttl = float(defaultConfig.get('DB_UUID_CACHE_TTL', DEFAULT_DB_UUID_CACHE_TTL))
+		if not ttl:
+			return
+
+		with DBUUIDCache.__lock:
+			DBUUIDCache.__entries[DBUUIDCache._getKey(managementServers)] = (dbUUID, time.time() + ttl)
+
+	@staticmethod
+	def clear():
+		with DBUUIDCache.__lock:
+			DBUUIDCache.__entries.clear()
+
+	@staticmethod
+	def _getKey(managementServers):
+		if isinstance(managementServers, list):
+			return tuple(managementServers)
+
+		return managementServers
+
 
 class ConfigurationVersionAPI(object):
 	endpointRoute = EndpointRoutes.INDEX
@@ -18,7 +69,8 @@ class ConfigurationVersionAPI(object):
 		err, response = self.makeGet(routes)
 
 		if response is not None:
-			ConnectionManager.addInstance(response['dbUUID'], self.managementConnection)
+			self.managementConnection = ConnectionManager.addInstance(response['dbUUID'], self.managementConnection)
+			DBUUIDCache.set(self.managementConnection.managementServers, response['dbUUID'])
 			return None, response
 		else:
 			return err, None
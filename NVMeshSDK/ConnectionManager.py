@@ -1,33 +1,61 @@
+from concurrent import futures
 import json
 import logging
 import threading
 import requests
+from requests.adapters import HTTPAdapter
 import urllib3
 import urlparse
 import random
 import time
+import weakref
 from logging import DEBUG, INFO, WARNING
 
 from NVMeshSDK import LoggerUtils
+from NVMeshSDK.RequestContext import RequestContext, RequestAbortedError
+from NVMeshSDK.RetryPolicy import RetryPolicy, RetryBudget
+from NVMeshSDK.RequestHedging import HedgingPolicy
+from NVMeshSDK.JSONStream import iterJSONArray, DEFAULT_CHUNK_SIZE
 from NVMeshSDK.Utils import Utils
 
 urllib3.disable_warnings()
 
 defaultConfig = {
     'HTTP_REQUEST_TIMEOUT': 30,
+    'CONNECTION_MANAGER_DEBUG': 'No',
+    # the maximum number of pooled (kept alive) HTTP connections to each management server
+    # should be at least the number of threads that use the same Connection concurrently
+    'HTTP_POOL_MAXSIZE': 50,
+    # how often the health of each management server is checked when there is more than one server
+    'HEALTH_CHECK_INTERVAL': 5,
+    'HEALTH_CHECK_TIMEOUT': 5,
+    # how many times all the management servers are tried by isAlive and by the login of a new connection before giving up
     'MAX_MANAGEMENT_ROTATIONS': 1,
-    'CONNECTION_MANAGER_DEBUG': 'No'
+    # failed requests (and 429 / 503 responses) are retried with exponential backoff and full jitter
+    'MAX_HTTP_REQUEST_RETRIES': 3,
+    'RETRY_BASE_DELAY': 0.5,
+    'RETRY_MAX_DELAY': 10,
+    # the maximum delay accepted from a Retry-After header
+    'RETRY_MAX_RETRY_AFTER': 30,
+    # a request is not retried after this many seconds from its first attempt
+    'REQUEST_TOTAL_TIMEOUT': 120,
+    # retries of each connection are limited to RETRY_BUDGET_RATIO retries per request + RETRY_BUDGET_MIN_PER_SECOND
+    'RETRY_BUDGET_RATIO': 0.2,
+    'RETRY_BUDGET_MIN_PER_SECOND': 1,
+    'RETRY_BUDGET_MAX_TOKENS': 10,
+    # when there is more than one management server, a GET that did not complete within the HEDGE_DELAY_PERCENTILE latency
+    # of recent GETs is sent to a second server as well and the first response is used
+    'HEDGED_GET_REQUESTS': 'No',
+    'HEDGE_DELAY_PERCENTILE': 95,
+    'HEDGE_MIN_DELAY': 0.05,
+    'HEDGE_INITIAL_DELAY': 1,
+    'HEDGE_MAX_CONCURRENT_ATTEMPTS': 20,
+    # log in again every SESSION_REFRESH_INTERVAL seconds so the session is renewed before it expires (0 - only when it expired)
+    'SESSION_REFRESH_INTERVAL': 1800,
+    # how long the DB UUID of the management servers is cached by the API objects (0 - resolve it on every API object creation)
+    'DB_UUID_CACHE_TTL': 300
 }
 
-class RandomSleepTime:
-    def __init__(self, start, stop, precision=2):
-        self.start = start
-        self.stop = stop
-        self.precision = precision
-
-    def getValue(self):
-        return round(random.uniform(self.start, self.stop), self.precision)
-
 
 class ConnectionManagerError(Exception):
     pass
@@ -48,6 +76,12 @@ class ManagementHTTPError(ConnectionManagerError):
         self.status_code = res.status_code
         self.message = "Reason:{0} Content:{1}".format(res.reason, res.content)
 
+
+class RetryableResponseError(ConnectionManagerError):
+    def __init__(self, res):
+        ConnectionManagerError.__init__(self, 'Management responded with status {0}'.format(res.status_code))
+        self.response = res
+
 conn_mgr_logger = logging.getLogger('NVMeshSDK')
 
 class ConnectionManager:
@@ -55,49 +89,146 @@ class ConnectionManager:
     DEFAULT_PASSWORD = "admin"
     DEFAULT_NVMESH_CONFIG_FILE = '/etc/opt/NVMesh/nvmesh.conf'
     __instances = {}
+    __lock = threading.Lock()
 
     @staticmethod
     def debug_getInstances():
-        return ConnectionManager.__instances
+        with ConnectionManager.__lock:
+            return dict(ConnectionManager.__instances)
 
     @staticmethod
     def getInstance(dbUUID, managementServers, user=DEFAULT_USERNAME, password=DEFAULT_PASSWORD, configFile=DEFAULT_NVMESH_CONFIG_FILE, logger=None):
         if not dbUUID:
-            connection = Connection(managementServers=managementServers, user=user, password=password, configFile=configFile, configObject=defaultConfig, logger=logger)
-        elif dbUUID in ConnectionManager.__instances:
-            connection = ConnectionManager.__instances[dbUUID]
-            conn_mgr_logger.debug('multi-threading::got connection for dbUUID %s with servers %s and requested managementServers=%s' % (dbUUID, connection.managementServers, managementServers))
-        else:
-            conn_mgr_logger.debug('multi-threading::dbUUID=%s NOT in __instances' % dbUUID)
-            connection = Connection(managementServers=managementServers, user=user, password=password, configFile=configFile, configObject=defaultConfig, logger=logger)
-            ConnectionManager.__instances[dbUUID] = connection
+            return Connection(managementServers=managementServers, user=user, password=password, configFile=configFile, configObject=defaultConfig, logger=logger)
+
+        with ConnectionManager.__lock:
+            connection = ConnectionManager.__instances.get(dbUUID)
+
+        if connection:
             conn_mgr_logger.debug('multi-threading::got connection for dbUUID %s with servers %s and requested managementServers=%s' % (dbUUID, connection.managementServers, managementServers))
+            return connection
+
+        conn_mgr_logger.debug('multi-threading::dbUUID=%s NOT in __instances' % dbUUID)
+        # the connection logs in to the management, so it is created outside of the lock
+        newConnection = Connection(managementServers=managementServers, user=user, password=password, configFile=configFile, configObject=defaultConfig, logger=logger)
+
+        with ConnectionManager.__lock:
+            # another thread might have created a connection for this dbUUID while we were logging in
+            connection = ConnectionManager.__instances.setdefault(dbUUID, newConnection)
+
+        if connection is not newConnection:
+            newConnection.close()
+
+        conn_mgr_logger.debug('multi-threading::got connection for dbUUID %s with servers %s and requested managementServers=%s' % (dbUUID, connection.managementServers, managementServers))
         return connection
 
     @classmethod
     def removeInstance(cls, id):
-        if id in cls.__instances:
-            del cls.__instances[id]
+        with ConnectionManager.__lock:
+            connection = ConnectionManager.__instances.pop(id, None)
+
+        # the connection might still be used by API objects, so only its background prober is stopped
+        if connection:
+            connection.stopHealthProber()
 
     @classmethod
     def addInstance(cls, dbUUID, connection):
+        """Registers the connection for dbUUID unless a connection is already registered for it
+        returns the registered connection, a connection that was not registered is closed"""
         if not dbUUID:
             raise ValueError('empty dbUUID')
 
         conn_mgr_logger.debug('multi-threading::adding connection for dbUUID %s with servers %s' % (dbUUID, connection.managementServers))
-        ConnectionManager.__instances[dbUUID] = connection
+        with ConnectionManager.__lock:
+            registeredConnection = ConnectionManager.__instances.setdefault(dbUUID, connection)
+
+        if registeredConnection is not connection:
+            connection.close()
+
+        return registeredConnection
+
+
+class ManagementServerState(object):
+    def __init__(self, url, session):
+        self.url = url
+        # each management server has its own session cookie, so each server has its own HTTP session
+        self.session = session
+        # the server responded to a login request, the session of a server that was not logged in to is not sent any requests
+        self.isLoggedIn = False
+        # a counter of successful logins, used to tell if the session was renewed since a request was sent
+        self.sessionId = 0
+        self.nextSessionRefreshTime = None
+        self.loginLock = threading.Lock()
+        self.outstandingRequests = 0
+        self.isHealthy = True
+        self.lastError = None
+
+
+class ManagementHealthProber(threading.Thread):
+    """**Checks /isAlive on every management server of a Connection in the background and updates its health**
+
+    The prober keeps only a weak reference to the connection, so it stops once the connection is no longer used, even if it was not closed.
+    """
+    def __init__(self, connection, interval):
+        threading.Thread.__init__(self)
+        self.name = 'mgmt-health-prober'
+        self.daemon = True
+        self.connectionRef = weakref.ref(connection)
+        self.interval = interval
+        self.stopEvent = threading.Event()
+
+    def run(self):
+        while not self.stopEvent.wait(self.interval):
+            connection = self.connectionRef()
+            if connection is None:
+                return
+
+            for index in range(len(connection.managementServers)):
+                if self.stopEvent.is_set():
+                    return
+
+                connection.probeServer(index)
+
+            # the connection can be garbage collected while the prober waits
+            del connection
+
+    def stop(self):
+        self.stopEvent.set()
+
+
+class HedgedGetAttempt(object):
+    """**One of the attempts of a hedged GET, runs with the deadline of the request and can be cancelled on its own**"""
+    def __init__(self, parentContext):
+        self.isCancelled = False
+        self.future = None
+        timeRemaining = parentContext.getTimeRemaining() if parentContext else None
+        self.context = RequestContext(timeRemaining, lambda: self.isCancelled or bool(parentContext and parentContext.isCancelled()))
+
+    def cancel(self):
+        # an HTTP request that was already sent is not interrupted, but it will not be retried and its response is ignored
+        self.isCancelled = True
+        self.future.cancel()
 
 
 class Connection(object):
     def __init__(self, user, password, configFile, configObject, managementServers, logger=None):
         self.logLevel = INFO
-        self.managementServer = None
+        # the server of the last request is kept per thread, since concurrent requests can be sent to different servers
+        self.threadLocal = threading.local()
         self.managementServers = None
         self.httpRequestTimeout = 15
-        self.randomSleepBetweenRequests = RandomSleepTime(start=0.5, stop=1)
-        self.randomSleepBeforeChangingMgmt = RandomSleepTime(start=0, stop=0.2)
-        self.maxHttpRequestRetries = 3
+        self.retryPolicy = RetryPolicy()
+        self.retryBudget = RetryBudget()
+        self.hedgingPolicy = HedgingPolicy()
+        # created when the first hedged GET is sent
+        self.hedgeExecutor = None
+        self.hedgeSlots = None
+        self.httpPoolMaxSize = 50
+        self.healthCheckInterval = 5
+        self.healthCheckTimeout = 5
         self.maxManagementsRotations = 1
+        self.sessionRefreshInterval = 1800
+        self.lock = threading.Lock()
         self.configFile = configFile
         self.configObject = configObject
 
@@ -106,23 +237,93 @@ class Connection(object):
 
         self.logger = (logger if logger else self.setLogger().getLogger('ConnectionManager'))
 
-        self.currentMgmtIndex = self.getInititalMgmtIndex()
+        self.serverStates = [ManagementServerState(url, self.createSession()) for url in self.managementServers]
         self.user = user
         self.password = password
-        self.session = requests.session()
-        self.login()
+        self.healthProber = None
+        self.startHealthProber()
+        # the other servers are logged in to when requests are first routed to them
+        self.loginToAnyServer()
+
+    @property
+    def managementServer(self):
+        """The management server that handled the last request of the calling thread"""
+        return getattr(self.threadLocal, 'managementServer', None)
+
+    def setCurrentServer(self, managementServer):
+        self.threadLocal.managementServer = managementServer
+
+    def createSession(self):
+        # connections are kept alive and reused by all threads, so TLS handshakes are done only when a new connection is opened
+        session = requests.session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.httpPoolMaxSize, pool_block=False)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def startHealthProber(self):
+        # with a single management server there is nothing to balance
+        if len(self.managementServers) > 1 and self.healthCheckInterval:
+            self.healthProber = ManagementHealthProber(self, self.healthCheckInterval)
+            self.healthProber.start()
+
+    def stopHealthProber(self):
+        if self.healthProber:
+            self.healthProber.stop()
+
+    def close(self):
+        self.stopHealthProber()
+
+        if self.hedgeExecutor:
+            self.hedgeExecutor.shutdown(wait=False)
+
+        for state in self.serverStates:
+            state.session.close()
 
     def setLogger(self):
         logger = LoggerUtils.Logger()
         logger.setOptions(logLevel=self.logLevel)
         return logger
 
-    def getInititalMgmtIndex(self):
-        isHA = len(self.managementServers) != 1
-        return self.getRandomMgmtIndex() if isHA else 0
+    def acquireServer(self, excludeServers=None):
+        """Selects the healthy management server with the least outstanding requests (or any server if none is healthy)
+        servers in excludeServers are selected only if all other healthy servers are excluded"""
+        with self.lock:
+            healthy = [i for i, state in enumerate(self.serverStates) if state.isHealthy]
+            candidates = [i for i in healthy if i not in (excludeServers or [])] or healthy or range(len(self.serverStates))
+            leastOutstanding = min(self.serverStates[i].outstandingRequests for i in candidates)
+            index = random.choice([i for i in candidates if self.serverStates[i].outstandingRequests == leastOutstanding])
+            self.serverStates[index].outstandingRequests += 1
+            return index
+
+    def releaseServer(self, index):
+        with self.lock:
+            self.serverStates[index].outstandingRequests -= 1
+
+    def setServerHealth(self, index, isHealthy, error=None):
+        with self.lock:
+            state = self.serverStates[index]
+            changed = state.isHealthy != isHealthy
+            state.isHealthy = isHealthy
+            state.lastError = error
+
+        if changed:
+            self.logger.info('Management server {} is {} {}'.format(state.url, 'healthy' if isHealthy else 'unhealthy', error or ''))
+
+    def probeServer(self, index):
+        url = urlparse.urljoin(self.managementServers[index], '/isAlive')
+        try:
+            res = self.serverStates[index].session.get(url, verify=False, timeout=self.healthCheckTimeout)
+            isHealthy = res.status_code == 200
+            self.setServerHealth(index, isHealthy, None if isHealthy else 'isAlive returned {}'.format(res.status_code))
+        except Exception as ex:
+            self.setServerHealth(index, False, str(ex))
+
+        return self.serverStates[index].isHealthy
 
-    def getRandomMgmtIndex(self):
-        return random.randint(0, len(self.managementServers) - 1)
+    def getServerStates(self):
+        with self.lock:
+            return [(state.url, state.isHealthy, state.outstandingRequests) for state in self.serverStates]
 
     def setManagementServers(self, managementServers=None):
         if managementServers:
@@ -139,8 +340,20 @@ class Connection(object):
 
         if 'HTTP_REQUEST_TIMEOUT' in configs:
             self.httpRequestTimeout = float(configs['HTTP_REQUEST_TIMEOUT'])
+        if 'HTTP_POOL_MAXSIZE' in configs:
+            self.httpPoolMaxSize = int(configs['HTTP_POOL_MAXSIZE'])
+        if 'HEALTH_CHECK_INTERVAL' in configs:
+            self.healthCheckInterval = float(configs['HEALTH_CHECK_INTERVAL'])
+        if 'HEALTH_CHECK_TIMEOUT' in configs:
+            self.healthCheckTimeout = float(configs['HEALTH_CHECK_TIMEOUT'])
         if 'MAX_MANAGEMENT_ROTATIONS' in configs:
-            self.maxManagementsRotations = configs['MAX_MANAGEMENT_ROTATIONS']
+            self.maxManagementsRotations = max(1, int(configs['MAX_MANAGEMENT_ROTATIONS']))
+        if 'SESSION_REFRESH_INTERVAL' in configs:
+            self.sessionRefreshInterval = float(configs['SESSION_REFRESH_INTERVAL'])
+
+        self.retryPolicy = RetryPolicy.fromConfig(configs)
+        self.retryBudget = RetryBudget.fromConfig(configs)
+        self.hedgingPolicy = HedgingPolicy.fromConfig(configs)
 
         if 'CONNECTION_MANAGER_DEBUG' in configs and configs['CONNECTION_MANAGER_DEBUG'] == 'Yes':
             self.logLevel = 'DEBUG'
@@ -150,46 +363,175 @@ class Connection(object):
         raise Exception(msg)
 
     def isAlive(self):
-        index = 0
-        currentRotation = 0
+        for rotation in range(self.maxManagementsRotations):
+            if rotation:
+                RequestContext.sleep(self.retryPolicy.getRetryDelay(rotation - 1))
 
-        while currentRotation < self.maxManagementsRotations:
-            try:
-                err, out = self.get('/isAlive')
-                return True if not err else False
-            except ManagementTimeout as ex:
-                self.getNextMgmtIndex()
-                index += 1
-                currentRotation += 1 if index % len(self.managementServers) == 0 else 0
-                sleepBeforeChangingMgmt = self.randomSleepBeforeChangingMgmt.getValue()
-                self.logger.debug(
-                    "failed isAlive to: {0}, exception: {1}, waiting for: {2}s before next request".format(self.managementServer, ex, sleepBeforeChangingMgmt))
-                time.sleep(sleepBeforeChangingMgmt)
+            for index in range(len(self.managementServers)):
+                if self.probeServer(index):
+                    return True
 
         raise ManagementTimeout(msg="Tried isAlive on all Management Servers in rotation for {} rotations and all failed".format(
-                                        self.maxManagementsRotations), iport=', '.join(self.managementServers))
-
-    def getNextMgmtIndex(self):
-        if len(self.managementServers) != 1:
-            self.currentMgmtIndex = (self.currentMgmtIndex + 1) % len(self.managementServers)
+                                    self.maxManagementsRotations), iport=', '.join(self.managementServers))
 
     def post(self, route, payload=None, postTimeout=None):
         return self.request('post', route, payload, postTimeout)
 
     def get(self, route, payload=None):
+        if self.hedgingPolicy.enabled and len(self.managementServers) > 1:
+            return self.hedgedGet(route, payload)
+
         return self.request('get', route, payload)
 
-    def request(self, method, route, payload=None, postTimeout=None, numberOfRetries=0):
-        if numberOfRetries == 0:
-            route = Utils.encodePlusInRoute(route)
+    def getStream(self, route, payload=None):
+        """Returns (err, iterator) - the iterator yields the items of the json array response while it is being received"""
+        return self.request('get', route, payload, stream=True)
+
+    def hedgedGet(self, route, payload=None):
+        """Sends the GET to a second server if the first did not respond within the hedge delay, returns the first response
+        The attempts are sent by the threads of a bounded executor, the attempt that did not respond first is cancelled"""
+        usedServers = []
+        hedgeDelay = self.hedgingPolicy.getHedgeDelay()
+
+        firstAttempt = self.startGetAttempt(route, payload, usedServers)
+        if not firstAttempt:
+            self.logger.debug('All hedged GET threads are busy, sending GET {0} without hedging'.format(route))
+            return self.request('get', route, payload)
+
+        pendingAttempts = [firstAttempt]
+        isHedged = False
+        error = None
 
-        self.managementServer = self.managementServers[self.currentMgmtIndex]
         try:
-            return self.doRequest(method, route, payload, postTimeout, numberOfRetries)
-        except ManagementTimeout as ex:
-            raise ex
+            while pendingAttempts:
+                # after the hedge was sent there is nothing left to do but wait for the request deadline
+                timeout = RequestContext.getTimeout(None if isHedged else hedgeDelay)
+                done, _ = futures.wait([attempt.future for attempt in pendingAttempts], timeout=timeout, return_when=futures.FIRST_COMPLETED)
+                if not done:
+                    RequestContext.checkCurrent()
+                    if not isHedged:
+                        isHedged = True
+                        # hedges add load to the managements just like retries, so they are limited by the same budget
+                        hedge = self.startGetAttempt(route, payload, usedServers) if self.retryBudget.tryAcquireRetry() else None
+                        if hedge:
+                            self.logger.debug('GET {0} did not complete within {1:.3f}s, sent it to another server'.format(route, hedgeDelay))
+                            pendingAttempts.append(hedge)
+
+                    continue
+
+                for attempt in [attempt for attempt in pendingAttempts if attempt.future in done]:
+                    pendingAttempts.remove(attempt)
+                    try:
+                        result, managementServer = attempt.future.result()
+                    except Exception as ex:
+                        error = ex
+                        continue
+
+                    # the attempts run in other threads, the server that answered becomes the server of the calling thread
+                    self.setCurrentServer(managementServer)
+                    return result
+
+            raise error
+        finally:
+            for attempt in pendingAttempts:
+                attempt.cancel()
+
+    def startGetAttempt(self, route, payload, usedServers):
+        """Returns a HedgedGetAttempt that sends the GET on a thread of the hedge executor, or None if all of its threads are busy"""
+        with self.lock:
+            if not self.hedgeExecutor:
+                self.hedgeSlots = threading.BoundedSemaphore(self.hedgingPolicy.maxConcurrentAttempts)
+                self.hedgeExecutor = futures.ThreadPoolExecutor(max_workers=self.hedgingPolicy.maxConcurrentAttempts, thread_name_prefix='hedged-get')
+
+        # a slot is taken for each attempt so an attempt never waits in the queue of the executor for another attempt to finish
+        if not self.hedgeSlots.acquire(False):
+            return None
+
+        attempt = HedgedGetAttempt(RequestContext.getCurrent())
+
+        def getAttempt():
+            with RequestContext.scope(context=attempt.context):
+                result = self.request('get', route, payload, usedServers=usedServers)
+                return result, self.managementServer
 
-    def doRequest(self, method, route, payload=None, postTimeout=None, numberOfRetries=0):
+        try:
+            attempt.future = self.hedgeExecutor.submit(getAttempt)
+        except Exception:
+            self.hedgeSlots.release()
+            raise
+
+        attempt.future.add_done_callback(lambda future: self.hedgeSlots.release())
+        return attempt
+
+    def request(self, method, route, payload=None, postTimeout=None, usedServers=None, stream=False):
+        """usedServers - a list of the servers used by this request, other requests sharing the same list will prefer other servers
+        stream - return an iterator over the items of the json array response instead of decoding the whole response"""
+        route = Utils.encodePlusInRoute(route)
+        startTime = time.time()
+        self.retryBudget.recordRequest()
+        numberOfRetries = 0
+
+        while True:
+            # the server is selected for each attempt, so a retry will usually go to a different server
+            mgmtIndex = self.acquireServer(usedServers)
+            if usedServers is not None:
+                usedServers.append(mgmtIndex)
+
+            self.setCurrentServer(self.managementServers[mgmtIndex])
+            retryAfter = None
+            attemptStartTime = time.time()
+            try:
+                result = self.doRequest(method, route, payload, postTimeout, numberOfRetries, mgmtIndex, stream)
+                if method == 'get' and self.hedgingPolicy.enabled:
+                    self.hedgingPolicy.recordLatency(time.time() - attemptStartTime)
+
+                return result
+            except RequestAbortedError:
+                raise
+            except RetryableResponseError as ex:
+                failure = ex
+                retryAfter = ex.response.headers.get('Retry-After')
+            except Exception as ex:
+                failure = ex
+            finally:
+                self.releaseServer(mgmtIndex)
+
+            delay = self.retryPolicy.getRetryDelay(numberOfRetries, retryAfter)
+            reasonNotToRetry = self.getReasonNotToRetry(route, numberOfRetries, startTime, delay)
+            if reasonNotToRetry:
+                self.logger.debug("Request to {0} failed, not retrying since {1}".format(route, reasonNotToRetry))
+                if isinstance(failure, RetryableResponseError):
+                    return self.handleResponse(failure.response)
+
+                raise ManagementTimeout(urlparse.urljoin(self.managementServers[mgmtIndex], route), failure.message)
+
+            if isinstance(failure, RetryableResponseError):
+                # the body of a streamed response was not read, closing it returns its HTTP connection to the pool
+                failure.response.close()
+
+            numberOfRetries += 1
+            self.logger.debug("Got error: {0}, sleeping for: {1:.2f}s then retrying route: {2}".format(failure, delay, route))
+            RequestContext.sleep(delay)
+
+    def getReasonNotToRetry(self, route, numberOfRetries, startTime, delay):
+        if route == '/isAlive':
+            return 'isAlive requests are never retried'
+
+        if numberOfRetries >= self.retryPolicy.maxRetries:
+            return 'it failed {0} times'.format(numberOfRetries + 1)
+
+        if not self.retryPolicy.hasTimeForRetry(startTime, delay):
+            return 'the total timeout of {0}s would be exceeded'.format(self.retryPolicy.totalTimeout)
+
+        # checked last since it consumes a retry from the budget
+        if not self.retryBudget.tryAcquireRetry():
+            return 'the retry budget of the connection is exhausted'
+
+        return None
+
+    def doRequest(self, method, route, payload=None, postTimeout=None, numberOfRetries=0, mgmtIndex=0, stream=False):
+        """Makes a single attempt of the request, raises RetryableResponseError if the response should be retried"""
+        managementServer = self.managementServers[mgmtIndex]
         isAliveRoute = route == '/isAlive'
         volumeSaveRoute = 'volumes/save' in route
         isDebug = self.logger.level == 'DEBUG'
@@ -198,6 +540,13 @@ class Connection(object):
             volName = payload[0]['name']
         startTime = None
 
+        # don't send requests for a caller that is no longer waiting for the response
+        RequestContext.checkCurrent()
+
+        if not isAliveRoute:
+            self.loginIfNeeded(mgmtIndex)
+            self.refreshSessionIfNeeded(mgmtIndex)
+
         res = None
         if not isAliveRoute:
             self.logger.debug(
@@ -205,37 +554,43 @@ class Connection(object):
                     format(method, route, payload, postTimeout, numberOfRetries))
         url = ''
         try:
-            url = urlparse.urljoin(self.managementServer, route)
+            url = urlparse.urljoin(managementServer, route)
             self.logger.debug('Doing request to: {}'.format(url))
 
-            if method == 'post':
-                if isDebug and volumeSaveRoute:
-                    startTime = time.time()
+            sessionId = self.serverStates[mgmtIndex].sessionId
+            if isDebug and volumeSaveRoute:
+                startTime = time.time()
 
-                res = self.session.post(url, json=payload, verify=False, timeout=self.httpRequestTimeout if not postTimeout else postTimeout)
-                if isDebug and volumeSaveRoute:
-                    execTime = (time.time() - startTime) * 1000
-                    err, jsonObject = self.handleResponse(res)
-                    self.logger.debug("id: {0}, err: {1}, res: {2}, it took me: {3}ms to save".format(volName, err, json.dumps(jsonObject), execTime))
-            elif method == 'get':
-                res = self.session.get(url, params=payload, verify=False, timeout=self.httpRequestTimeout)
+            res = self.sendRequest(self.serverStates[mgmtIndex].session, method, url, payload, postTimeout, stream)
+            if isDebug and volumeSaveRoute:
+                execTime = (time.time() - startTime) * 1000
+                err, jsonObject = self.handleResponse(res)
+                self.logger.debug("id: {0}, err: {1}, res: {2}, it took me: {3}ms to save".format(volName, err, json.dumps(jsonObject), execTime))
 
-            if '/login' in res.text:
-                res = self.login()
+            if route != '/login' and self.isSessionExpired(res):
+                success = self.relogin(mgmtIndex, sessionId)
 
                 if volumeSaveRoute:
-                    self.logger.debug("after login, id: {0}, res: {1}".format(volName, res))
+                    self.logger.debug("after login, id: {0}, success: {1}".format(volName, success))
 
-                success = res['success']
                 if success:
-                    return self.request(method, route, payload, postTimeout)
+                    res.close()
+                    res = self.sendRequest(self.serverStates[mgmtIndex].session, method, url, payload, postTimeout, stream)
 
-            if not isAliveRoute:
+            if not isAliveRoute and not stream:
                 self.logger.debug('url {0} got response: {1}'.format(url, res.content))
 
+            if self.retryPolicy.isRetryableStatus(res.status_code):
+                raise RetryableResponseError(res)
+
+            if stream:
+                return self.handleStreamResponse(res)
+
             err, jsonObj = self.handleResponse(res)
             return err, jsonObj
 
+        except (RequestAbortedError, RetryableResponseError):
+            raise
         except Exception as ex:
             if isDebug and volumeSaveRoute:
                 execTime = None
@@ -247,30 +602,86 @@ class Connection(object):
             else:
                 self.logger.debug("Request to {0} failed, ex: {1}".format(route, ex))
 
-            if isAliveRoute:
-                raise ManagementTimeout(url, ex.message)
-            elif numberOfRetries < self.maxHttpRequestRetries:
-                numberOfRetries += 1
-                sleepTimeBetweenRequestRetry = self.randomSleepBetweenRequests.getValue()
-                self.logger.debug("Got exception: {0}, sleeping for: {1}s then retrying route: {2}".format(ex,
-                                                                                                           sleepTimeBetweenRequestRetry,
-                                                                                                           route))
-                time.sleep(sleepTimeBetweenRequestRetry)
-                return self.request(method, route, payload, postTimeout, numberOfRetries)
-            else:
-                self.logger.debug("Request to {0}, failed {1} times. Trying to change management server.".format(route, self.maxHttpRequestRetries))
-                # check if we are still on the same management - isAlive could succeed while other calls fail because of overload (e.g ReadTimeout)
-                # if isAlive succeeded and we are still using the same management we should fail since we already exceeded the maxRetries
-                # If the problem is HTTP Timeout (ReadTimeout Exception) - This logic will not try to rotate to other managements in the same cluster
-                # but rather will fail and cause zone to be disabled - in the case of overloaded DB this is what we want,
-                # Since trying another management in the same mgmt HA Cluster will likely result in the same output
-                mgmtIndexWithTooManyRetries = self.currentMgmtIndex
-                isAlive = self.isAlive()
-                if not isAlive or self.currentMgmtIndex == mgmtIndexWithTooManyRetries:
-                    if isAlive:
-                        raise ManagementTimeout(url, ex.message)
-                else:
-                    return self.request(method, route, payload, postTimeout, numberOfRetries=0)
+            if isinstance(ex, requests.ConnectionError) and not isinstance(ex, requests.Timeout):
+                # the server could not be reached, new requests will go to other servers until the prober finds it alive again
+                # a server that is slow to respond (e.g overloaded DB) is not marked as unhealthy
+                # since the other managements in the same HA cluster will likely respond the same way
+                self.setServerHealth(mgmtIndex, False, str(ex))
+
+            raise
+
+    def sendRequest(self, session, method, url, payload=None, postTimeout=None, stream=False):
+        if method == 'post':
+            timeout = RequestContext.getTimeout(self.httpRequestTimeout if not postTimeout else postTimeout)
+            return session.post(url, json=payload, verify=False, timeout=timeout, stream=stream)
+
+        return session.get(url, params=payload, verify=False, timeout=RequestContext.getTimeout(self.httpRequestTimeout), stream=stream)
+
+    @staticmethod
+    def isSessionExpired(res):
+        if res.status_code == 401:
+            return True
+
+        # the management redirects requests without a valid session to the login page
+        if any('/login' in redirect.headers.get('Location', '') for redirect in res.history):
+            return True
+
+        # only an HTML response can be the login page, json responses (which can be large) are not searched
+        return 'text/html' in res.headers.get('Content-Type', '') and '/login' in res.text
+
+    def loginIfNeeded(self, index):
+        state = self.serverStates[index]
+        if state.isLoggedIn:
+            return
+
+        with state.loginLock:
+            if not state.isLoggedIn:
+                self.logger.debug('Logging in to management server {}'.format(state.url))
+                self.login(index)
+
+    def relogin(self, index, expiredSessionId):
+        """Logs in again to the server at index, unless another thread already did since the session expiredSessionId was found expired.
+        All threads that found the session of a server expired wait for a single login instead of each of them logging in"""
+        state = self.serverStates[index]
+        with state.loginLock:
+            if state.sessionId != expiredSessionId:
+                return True
+
+            self.logger.debug('Management session of {} expired, logging in again'.format(state.url))
+            self.login(index)
+            return state.sessionId != expiredSessionId
+
+    def refreshSessionIfNeeded(self, index):
+        state = self.serverStates[index]
+        if not self.sessionRefreshInterval or not state.nextSessionRefreshTime or time.time() < state.nextSessionRefreshTime:
+            return
+
+        # the current session is still valid, so other threads keep using it instead of waiting for the refresh
+        if not state.loginLock.acquire(False):
+            return
+
+        try:
+            if time.time() >= state.nextSessionRefreshTime:
+                state.nextSessionRefreshTime = time.time() + self.sessionRefreshInterval
+                self.logger.debug('Refreshing the management session of {}'.format(state.url))
+                self.login(index)
+        finally:
+            state.loginLock.release()
+
+    @staticmethod
+    def handleStreamResponse(res):
+        if res.status_code not in [200, 304]:
+            return Connection.handleResponse(res)
+
+        def iterItems():
+            try:
+                for item in iterJSONArray(res.iter_content(chunk_size=DEFAULT_CHUNK_SIZE)):
+                    yield item
+            finally:
+                # returns the HTTP connection to the pool even if the caller stopped iterating
+                res.close()
+
+        return None, iterItems()
 
     @staticmethod
     def handleResponse(res):
@@ -296,9 +707,37 @@ class Connection(object):
 
         return err, jsonObj
 
-    def login(self):
+    def loginToAnyServer(self):
+        """Logs in to the first management server that responds, healthy servers first, trying all servers up to MAX_MANAGEMENT_ROTATIONS times"""
+        error = None
+        for rotation in range(self.maxManagementsRotations):
+            if rotation:
+                RequestContext.sleep(self.retryPolicy.getRetryDelay(rotation - 1))
+
+            for index in sorted(range(len(self.serverStates)), key=lambda i: not self.serverStates[i].isHealthy):
+                try:
+                    return self.login(index)
+                except ManagementTimeout as ex:
+                    error = ex
+
+        raise error
+
+    def login(self, index):
+        """Logs in to the management server at index, the session cookie is kept in the HTTP session of that server"""
+        state = self.serverStates[index]
         try:
-            err, out = self.post("/login", payload={"username": self.user, "password": self.password})
-            return out
+            res = self.sendRequest(state.session, 'post', urlparse.urljoin(state.url, '/login'), payload={"username": self.user, "password": self.password})
         except requests.ConnectionError as ex:
-            raise ManagementTimeout(self.managementServer, ex.message)
+            if not isinstance(ex, requests.Timeout):
+                self.setServerHealth(index, False, str(ex))
+
+            raise ManagementTimeout(state.url, ex.message)
+
+        err, out = self.handleResponse(res)
+        state.isLoggedIn = True
+        if isinstance(out, dict) and out.get('success'):
+            state.sessionId += 1
+            if self.sessionRefreshInterval:
+                state.nextSessionRefreshTime = time.time() + self.sessionRefreshInterval
+
+        return out
@@ -2,33 +2,98 @@
 from NVMeshSDK.Utils import Utils
 
 import json
-import copy
+import threading
+
+JSON_PRIMITIVE_TYPES = (basestring, bool, int, long, float, type(None))
+# exact types that are checked with a set lookup before the slower isinstance checks
+EXACT_PRIMITIVE_TYPES = frozenset([str, unicode, bool, int, long, float, type(None)])
+STRING_TYPES = frozenset([str, unicode])
+# the instance attribute that holds the raw values of nested objects that were not instantiated yet
+LAZY_OBJECTS_ATTR = '_Entity__lazyObjects'
+
+
+def toJSONKey(key):
+    # the same conversion json.dumps does for dict keys
+    if isinstance(key, basestring):
+        return key
+    if key is True:
+        return 'true'
+    if key is False:
+        return 'false'
+    if key is None:
+        return 'null'
+    if isinstance(key, float):
+        return repr(key)
+    if isinstance(key, (int, long)):
+        return str(key)
+
+    raise TypeError('key {0!r} is not a string'.format(key))
+
+
+def toDict(obj):
+    # issubclass is used instead of isinstance since isinstance calls the (slow) Entity.__getattribute__ to get __class__
+    objType = type(obj)
+    if objType in EXACT_PRIMITIVE_TYPES:
+        return obj
+    if objType is dict or issubclass(objType, dict):
+        return {(key if type(key) in STRING_TYPES else toJSONKey(key)): (value if type(value) in EXACT_PRIMITIVE_TYPES else toDict(value))
+                for key, value in obj.iteritems()}
+    if objType is list or issubclass(objType, (list, tuple)):
+        return [value if type(value) in EXACT_PRIMITIVE_TYPES else toDict(value) for value in obj]
+    if issubclass(objType, Entity):
+        return toDict(objType.getAttributes(obj))
+    if issubclass(objType, JSON_PRIMITIVE_TYPES):
+        return obj
+
+    return toDict(obj.__dict__)
 
 
 class Entity(object):
+    _isFastEntity = False
+    __fastClasses = {}
+    __fastClassesLock = threading.Lock()
 
     def __str__(self):
-        dictCopy = copy.deepcopy(self.__dict__)
+        dictCopy = toDict(self)
         try:
             del dictCopy['_{0}__objectsToInstantiate'.format(self.__class__.__name__)]
         except KeyError:
             pass
-        return json.dumps(dictCopy, sort_keys=True, indent=4, default=lambda x: x.__dict__)
+        return json.dumps(dictCopy, sort_keys=True, indent=4)
+
+    def __repr__(self):
+        return '<{0} {1}>'.format(type(self).__name__, getattr(self, '_id', None))
 
     def __getattribute__(self, item):
         if '.' in item:
-            parts = item.split('.')
-            field = Entity.__getattribute__(self, parts[0])
-            if isinstance(field, list):
-                array = field
-                return [getattr(a, parts[1]) for a in array]
-            else:
-                return getattr(field, parts[1])
+            return Entity.__getDottedAttribute(self, item)
         else:
             return object.__getattribute__(self, item)
 
+    def __getattr__(self, item):
+        # only called when the attribute was not found - a nested object that was not instantiated yet or a dotted attribute of a fast entity
+        lazyObjects = object.__getattribute__(self, '__dict__').get(LAZY_OBJECTS_ATTR)
+        if lazyObjects and item in lazyObjects:
+            return self.__instantiateLazyObject(lazyObjects, item)
+
+        if '.' in item:
+            return Entity.__getDottedAttribute(self, item)
+
+        raise AttributeError("'{0}' object has no attribute '{1}'".format(type(self).__name__, item))
+
+    def __getDottedAttribute(self, item):
+        parts = item.split('.')
+        # getattr (and not Entity.__getattribute__) so that a nested object that was not instantiated yet will be
+        field = getattr(self, parts[0])
+        if isinstance(field, list):
+            array = field
+            return [getattr(a, parts[1]) for a in array]
+        else:
+            return getattr(field, parts[1])
+
     def __eq__(self, other):
-        if isinstance(other, self.__class__):
+        # an entity is equal to the same entity created with the fast class
+        if isinstance(other, self.__class__) or isinstance(self, other.__class__):
             selfDict = Entity.myToDict(self)
             otherDict = Entity.myToDict(other)
             return selfDict == otherDict
@@ -43,32 +108,182 @@ class Entity(object):
 
     @staticmethod
     def myToDict(obj):
-        return json.loads(json.dumps(obj.__dict__ if not isinstance(obj, dict) else obj, default=lambda x: x.__dict__))
+        """**Returns a copy of obj (an entity or a dict) made only of dicts, lists and json primitives**
+
+        The result is the same as a json dumps and loads round-trip of the entity, except that str values are not converted to unicode,
+        so json.dumps of the result is identical.
+        """
+        return toDict(obj)
+
+    @staticmethod
+    def getObjectAttributes(obj):
+        if isinstance(obj, Entity):
+            return obj.getAttributes()
+
+        return obj.__dict__
+
+    def getAttributes(self):
+        """**Returns a dict of the attributes that are set on the entity**"""
+        attributes = object.__getattribute__(self, '__dict__')
+        if LAZY_OBJECTS_ATTR in attributes:
+            self.instantiateLazyObjects()
+
+        return attributes
+
+    @classmethod
+    def getFastClass(cls):
+        """**Returns a __slots__ based subclass of the entity class which is faster to create and uses less memory**
+
+        The constructor arguments of the entity are stored in slots and are accessed without the dotted attribute lookup of Entity,
+        which is only used as a fallback for attributes that were not found (e.g. getattr(volume, 'chunks._id')).
+        Attributes that are not constructor arguments (e.g. fields added by a newer management) are still stored in the instance __dict__,
+        as are constructor arguments with the name of a class attribute (e.g. Volume.VSGs), since a slot would replace the class attribute.
+        The fast class is a subclass of the entity class, so isinstance checks, AttributeRepresentation and MongoObj projections work the same.
+        """
+        if cls._isFastEntity:
+            return cls
+
+        fastClass = Entity.__fastClasses.get(cls)
+        if fastClass:
+            return fastClass
+
+        with Entity.__fastClassesLock:
+            return Entity.__fastClasses.setdefault(cls, cls.__createFastClass())
+
+    @classmethod
+    def __createFastClass(cls):
+        argSpec = cls.__init__.argSpec
+        initFunc = cls.__init__.initFunc
+        argNames = argSpec.args[1:]
+        argNamesSet = frozenset(argNames)
+        classAttributes = frozenset(dir(cls))
+        slotNames = tuple(name for name in argNames if name not in classAttributes)
+        nonNoneDefaults = [(name, default) for name, default in zip(reversed(argSpec.args), reversed(argSpec.defaults or ())) if default is not None]
+
+        def __init__(self, *args, **kwargs):
+            if args:
+                kwargs = dict(zip(argNames, args), **kwargs)
+
+            for name, value in kwargs.iteritems():
+                setattr(self, name, value)
+
+            for name, default in nonNoneDefaults:
+                if name not in kwargs:
+                    setattr(self, name, default)
+
+            initFunc(self, **{name: value for name, value in kwargs.iteritems() if name in argNamesSet})
+
+        def getAttributes(self):
+            if LAZY_OBJECTS_ATTR in self.__dict__:
+                self.instantiateLazyObjects()
+
+            attributes = {}
+            for name in slotNames:
+                try:
+                    attributes[name] = getattr(self, name)
+                except AttributeError:
+                    pass
+
+            attributes.update(self.__dict__)
+            return attributes
+
+        return type('Fast' + cls.__name__, (cls,), {
+            '__slots__': slotNames,
+            '__module__': cls.__module__,
+            '__init__': __init__,
+            # plain attributes don't pay for the dotted lookup, which is done by Entity.__getattr__ only when the attribute was not found
+            '__getattribute__': object.__getattribute__,
+            'getAttributes': getAttributes,
+            '_isFastEntity': True
+        })
 
     def serialize(self):
         return Entity.myToDict(self.filterNoneValues())
 
     def deserialize(self):
-        self.instantiate()
+        self.deferInstantiation()
+
+    def deferInstantiation(self):
+        """**Replaces the nested objects (e.g. volume chunks) with entities when they are first accessed, instead of now**"""
+        lazyObjects = None
+        for obj in self.getObjectsToInstantiate():
+            entityRep = getattr(self, obj)
+            try:
+                # object.__getattribute__ does not fall back to __getattr__, so a lazy object is not instantiated here
+                attrValue = object.__getattribute__(self, entityRep.dbKey)
+            except AttributeError:
+                continue
+
+            if not isinstance(attrValue, (dict, list)):
+                continue
+
+            if lazyObjects is None:
+                lazyObjects = object.__getattribute__(self, '__dict__').setdefault(LAZY_OBJECTS_ATTR, {})
+
+            lazyObjects[entityRep.dbKey] = (entityRep.type, attrValue)
+            delattr(self, entityRep.dbKey)
+
+        return self
+
+    def instantiateLazyObjects(self):
+        lazyObjects = object.__getattribute__(self, '__dict__').get(LAZY_OBJECTS_ATTR)
+        for dbKey in list(lazyObjects or []):
+            self.__instantiateLazyObject(lazyObjects, dbKey)
+
+    def __instantiateLazyObject(self, lazyObjects, dbKey):
+        # the raw value is removed only after the attribute was set, so a concurrent access will not miss the attribute
+        try:
+            entityType, attrValue = lazyObjects[dbKey]
+        except KeyError:
+            return getattr(self, dbKey)
+
+        value = self.__createNestedObject(entityType, attrValue, eager=False)
+        setattr(self, dbKey, value)
+        lazyObjects.pop(dbKey, None)
+        if not lazyObjects:
+            object.__getattribute__(self, '__dict__').pop(LAZY_OBJECTS_ATTR, None)
+
+        return value
+
+    def __createNestedObject(self, entityType, attrValue, eager):
+        if self._isFastEntity:
+            entityType = entityType.getFastClass()
+
+        if isinstance(attrValue, list):
+            listOfInstances = []
+            for element in attrValue:
+                if not issubclass(type(element), Entity):
+                    element = entityType(**element)
+
+                if element.getObjectsToInstantiate() != []:
+                    element = element.instantiate() if eager else element.deferInstantiation()
+
+                listOfInstances.append(element)
+
+            return listOfInstances
+        else:
+            return entityType(**attrValue)
 
     def instantiate(self):
+        """**Replaces the nested objects of the entity (and their nested objects) with entities now**"""
+        lazyObjects = object.__getattribute__(self, '__dict__').pop(LAZY_OBJECTS_ATTR, {})
         for obj in self.getObjectsToInstantiate():
             entityRep = getattr(self, obj)
-            if hasattr(self, entityRep.dbKey):
-                attrValue = getattr(self, entityRep.dbKey)
-                if isinstance(attrValue, list):
-                    listOfInstances = []
-                    for element in attrValue:
-                        element = entityRep.type(**element)
-                        listOfInstances.append(element.instantiate() if element.getObjectsToInstantiate() != [] else element)
-
-                    setattr(self, entityRep.dbKey, listOfInstances)
-                else:
-                    setattr(self, entityRep.dbKey, entityRep.type(**attrValue))
+            if entityRep.dbKey in lazyObjects:
+                attrValue = lazyObjects[entityRep.dbKey][1]
+            else:
+                try:
+                    attrValue = object.__getattribute__(self, entityRep.dbKey)
+                except AttributeError:
+                    continue
+
+            if isinstance(attrValue, (dict, list)):
+                setattr(self, entityRep.dbKey, self.__createNestedObject(entityRep.type, attrValue, eager=True))
+
         return self
 
     def filterNoneValues(self):
-        return {k: v for k, v in self.__dict__.iteritems() if v is not None}
+        return {k: v for k, v in type(self).getAttributes(self).iteritems() if v is not None}
 
     def getObjectsToInstantiate(self):
         return []
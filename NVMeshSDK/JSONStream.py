@@ -0,0 +1,89 @@
+import json
+import re
+
+WHITESPACE = re.compile(r'\s*')
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class JSONStreamError(ValueError):
+    pass
+
+
+def iterJSONArray(chunks):
+    """**Yields the items of a json array from an iterable of string chunks (e.g. an HTTP response stream) as soon as each item was received**
+
+    Only the item being decoded and the undecoded rest of the current chunk are kept in memory, instead of the whole response.
+    A response that is not a json array is yielded as a single item.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buffer = ''
+    position = 0
+    isEndOfStream = False
+
+    def readMore(buffer, position, minLength=1):
+        """Reads chunks until at least minLength characters are not yet decoded (None - until the end of the stream)"""
+        parts = [buffer[position:]]
+        length = len(parts[0])
+        for chunk in chunks:
+            if chunk:
+                parts.append(chunk)
+                length += len(chunk)
+                if minLength is not None and length >= minLength:
+                    return ''.join(parts), 0, False
+
+        return ''.join(parts), 0, True
+
+    def skipWhitespace(buffer, position, isEndOfStream):
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position < len(buffer) or isEndOfStream:
+                return buffer, position, isEndOfStream
+
+            buffer, position, isEndOfStream = readMore(buffer, position)
+
+    buffer, position, isEndOfStream = skipWhitespace(buffer, position, isEndOfStream)
+    if position == len(buffer):
+        return
+
+    if buffer[position] != '[':
+        # not an array, the whole response is decoded as a single value
+        if not isEndOfStream:
+            buffer, position, isEndOfStream = readMore(buffer, position, None)
+
+        yield json.loads(buffer[position:])
+        return
+
+    position += 1
+    isFirstItem = True
+    while True:
+        buffer, position, isEndOfStream = skipWhitespace(buffer, position, isEndOfStream)
+        if position == len(buffer):
+            raise JSONStreamError('Unexpected end of json array')
+
+        if buffer[position] == ']':
+            return
+
+        if not isFirstItem:
+            if buffer[position] != ',':
+                raise JSONStreamError('Expected "," at position {0} of json array'.format(position))
+
+            buffer, position, isEndOfStream = skipWhitespace(buffer, position + 1, isEndOfStream)
+
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+                # a number at the end of the buffer might continue in the next chunk
+                if end < len(buffer) or isEndOfStream:
+                    break
+            except ValueError:
+                if isEndOfStream:
+                    raise
+
+            # the undecoded data is at least doubled before decoding again, so an item that spans many chunks
+            # is decoded a logarithmic number of times instead of once for each chunk
+            buffer, position, isEndOfStream = readMore(buffer, position, 2 * (len(buffer) - position))
+
+        yield item
+        position = end
+        isFirstItem = False
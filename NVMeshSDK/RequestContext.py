@@ -0,0 +1,119 @@
+import threading
+import time
+from functools import wraps
+
+MIN_HTTP_TIMEOUT = 0.01
+
+
+class RequestAbortedError(Exception):
+    def __init__(self, msg, isCancelled=False):
+        Exception.__init__(self, msg)
+        self.isCancelled = isCancelled
+
+
+class RequestContext(object):
+    """**Deadline and cancellation of the request that the current thread is working on**
+
+    A RequestContext is attached to the current thread using RequestContext.scope(), all SDK calls made by the thread will
+    limit their HTTP timeouts to the time remaining and will stop retrying once the request was cancelled or its deadline has passed.
+
+    - Example::
+
+            with RequestContext.scope(timeRemaining=10, isCancelled=lambda: not grpcContext.is_active()):
+                err, volumes = volumeAPI.get()
+    """
+    __local = threading.local()
+
+    def __init__(self, timeRemaining=None, isCancelled=None):
+        self.deadline = time.time() + timeRemaining if timeRemaining is not None else None
+        self.isCancelledFunc = isCancelled
+
+    def getTimeRemaining(self):
+        if self.deadline is None:
+            return None
+
+        return self.deadline - time.time()
+
+    def isExpired(self):
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def isCancelled(self):
+        return bool(self.isCancelledFunc and self.isCancelledFunc())
+
+    def raiseIfAborted(self):
+        # the deadline is checked first since a request that passed its deadline is also reported as cancelled
+        if self.isExpired():
+            raise RequestAbortedError('Request deadline exceeded')
+
+        if self.isCancelled():
+            raise RequestAbortedError('Request was cancelled', isCancelled=True)
+
+    @staticmethod
+    def getCurrent():
+        return getattr(RequestContext.__local, 'context', None)
+
+    @staticmethod
+    def setCurrent(context):
+        RequestContext.__local.context = context
+
+    @staticmethod
+    def scope(timeRemaining=None, isCancelled=None, context=None):
+        return _RequestContextScope(context or RequestContext(timeRemaining, isCancelled))
+
+    @staticmethod
+    def checkCurrent(waitSeconds=0):
+        """Raises RequestAbortedError if the current request was aborted, or will pass its deadline within waitSeconds"""
+        context = RequestContext.getCurrent()
+        if not context:
+            return
+
+        context.raiseIfAborted()
+        timeRemaining = context.getTimeRemaining()
+        if waitSeconds and timeRemaining is not None and timeRemaining < waitSeconds:
+            raise RequestAbortedError('Request deadline will be exceeded before the next retry')
+
+    @staticmethod
+    def getTimeout(defaultTimeout):
+        """Returns defaultTimeout limited to the time remaining for the current request"""
+        context = RequestContext.getCurrent()
+        timeRemaining = context.getTimeRemaining() if context else None
+        if timeRemaining is None:
+            return defaultTimeout
+
+        # requests does not accept a timeout of 0
+        if defaultTimeout is None:
+            return max(timeRemaining, MIN_HTTP_TIMEOUT)
+
+        return max(min(defaultTimeout, timeRemaining), MIN_HTTP_TIMEOUT)
+
+    @staticmethod
+    def sleep(seconds):
+        """Sleeps for the given seconds, raises RequestAbortedError if the current request would pass its deadline while sleeping"""
+        RequestContext.checkCurrent(waitSeconds=seconds)
+        time.sleep(seconds)
+
+    @staticmethod
+    def bindToCurrent(func):
+        """Returns a function that runs func with the context of the calling thread, used to pass the context to worker threads"""
+        context = RequestContext.getCurrent()
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with RequestContext.scope(context=context):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+class _RequestContextScope(object):
+    def __init__(self, context):
+        self.context = context
+        self.previousContext = None
+
+    def __enter__(self):
+        self.previousContext = RequestContext.getCurrent()
+        RequestContext.setCurrent(self.context)
+        return self.context
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        RequestContext.setCurrent(self.previousContext)
@@ -0,0 +1,70 @@
+import collections
+import threading
+
+LATENCY_WINDOW_SIZE = 200
+MIN_LATENCY_SAMPLES = 20
+
+
+class LatencyWindow(object):
+    """**The latencies of the last size requests**"""
+    def __init__(self, size=LATENCY_WINDOW_SIZE):
+        self.samples = collections.deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def getPercentile(self, percentile):
+        """Returns the latency below which percentile percent of the samples fall, or None if there are not enough samples"""
+        with self.lock:
+            if len(self.samples) < MIN_LATENCY_SAMPLES:
+                return None
+
+            samples = sorted(self.samples)
+
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100.0))
+        return samples[index]
+
+
+class HedgingPolicy(object):
+    """**Decides when a GET request is sent again to a second management server**
+
+    When a GET did not complete within the percentile latency of the recent GET requests, the same GET is sent to another healthy server
+    and the first response is used, so a single slow management server (GC pause, slow DB secondary) does not show up in the tail latency.
+    Until there are enough samples initialDelay is used. The delay is never shorter than minDelay, to avoid sending every request twice.
+    """
+    def __init__(self, enabled=False, percentile=95, minDelay=0.05, initialDelay=1, maxConcurrentAttempts=20):
+        self.enabled = enabled
+        # the number of threads that send hedged GET attempts, a GET that finds them all busy is sent without hedging
+        self.maxConcurrentAttempts = maxConcurrentAttempts
+        self.percentile = percentile
+        self.minDelay = minDelay
+        self.initialDelay = initialDelay
+        self.latencies = LatencyWindow()
+
+    @staticmethod
+    def fromConfig(configs):
+        policy = HedgingPolicy()
+        if 'HEDGED_GET_REQUESTS' in configs:
+            policy.enabled = configs['HEDGED_GET_REQUESTS'] == 'Yes'
+        if 'HEDGE_DELAY_PERCENTILE' in configs:
+            policy.percentile = float(configs['HEDGE_DELAY_PERCENTILE'])
+        if 'HEDGE_MIN_DELAY' in configs:
+            policy.minDelay = float(configs['HEDGE_MIN_DELAY'])
+        if 'HEDGE_INITIAL_DELAY' in configs:
+            policy.initialDelay = float(configs['HEDGE_INITIAL_DELAY'])
+        if 'HEDGE_MAX_CONCURRENT_ATTEMPTS' in configs:
+            policy.maxConcurrentAttempts = int(configs['HEDGE_MAX_CONCURRENT_ATTEMPTS'])
+
+        return policy
+
+    def recordLatency(self, seconds):
+        self.latencies.add(seconds)
+
+    def getHedgeDelay(self):
+        delay = self.latencies.getPercentile(self.percentile)
+        if delay is None:
+            delay = self.initialDelay
+
+        return max(delay, self.minDelay)
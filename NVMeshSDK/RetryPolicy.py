@@ -0,0 +1,120 @@
+import random
+import threading
+import time
+from email.utils import parsedate_tz, mktime_tz
+
+
+class RetryPolicy(object):
+    """**Decides if and when a failed management request is retried**
+
+    Retries use exponential backoff with full jitter - the delay before retry n is a random value between 0 and min(maxDelay, baseDelay * 2^n).
+    Responses with a status code in retryStatusCodes (429 Too Many Requests, 503 Service Unavailable) are retried as well,
+    after the delay requested in their Retry-After header if there is one (up to maxRetryAfter seconds).
+    A request is never retried after totalTimeout seconds from its first attempt.
+    """
+    RETRY_STATUS_CODES = (429, 503)
+
+    def __init__(self, maxRetries=3, baseDelay=0.5, maxDelay=10, maxRetryAfter=30, totalTimeout=None, retryStatusCodes=RETRY_STATUS_CODES):
+        self.maxRetries = maxRetries
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+        self.maxRetryAfter = maxRetryAfter
+        self.totalTimeout = totalTimeout
+        self.retryStatusCodes = retryStatusCodes
+
+    @staticmethod
+    def fromConfig(configs):
+        policy = RetryPolicy()
+        if 'MAX_HTTP_REQUEST_RETRIES' in configs:
+            policy.maxRetries = int(configs['MAX_HTTP_REQUEST_RETRIES'])
+        if 'RETRY_BASE_DELAY' in configs:
+            policy.baseDelay = float(configs['RETRY_BASE_DELAY'])
+        if 'RETRY_MAX_DELAY' in configs:
+            policy.maxDelay = float(configs['RETRY_MAX_DELAY'])
+        if 'RETRY_MAX_RETRY_AFTER' in configs:
+            policy.maxRetryAfter = float(configs['RETRY_MAX_RETRY_AFTER'])
+        if configs.get('REQUEST_TOTAL_TIMEOUT'):
+            policy.totalTimeout = float(configs['REQUEST_TOTAL_TIMEOUT'])
+
+        return policy
+
+    def isRetryableStatus(self, statusCode):
+        return statusCode in self.retryStatusCodes
+
+    def getBackoffDelay(self, retryNumber):
+        return random.uniform(0, min(self.maxDelay, self.baseDelay * (2 ** retryNumber)))
+
+    def getRetryDelay(self, retryNumber, retryAfterHeader=None):
+        retryAfter = RetryPolicy.parseRetryAfter(retryAfterHeader)
+        if retryAfter is not None:
+            return min(retryAfter, self.maxRetryAfter)
+
+        return self.getBackoffDelay(retryNumber)
+
+    def hasTimeForRetry(self, startTime, delay):
+        return not self.totalTimeout or time.time() + delay - startTime < self.totalTimeout
+
+    @staticmethod
+    def parseRetryAfter(value):
+        """Returns the number of seconds to wait from a Retry-After header value (delay in seconds or an HTTP date) or None"""
+        if not value:
+            return None
+
+        try:
+            return max(0, float(value))
+        except ValueError:
+            pass
+
+        parsedDate = parsedate_tz(value)
+        if not parsedDate:
+            return None
+
+        return max(0, mktime_tz(parsedDate) - time.time())
+
+
+class RetryBudget(object):
+    """**Limits the number of retries made by a connection to a fraction of its requests**
+
+    Every request deposits ratio tokens and every retry withdraws one token, so when a management fails all requests
+    the connection makes at most ratio retries per request instead of maxRetries, which prevents retry storms.
+    The bucket is also refilled with minRetriesPerSecond tokens every second so that a connection with little traffic can still retry.
+    """
+    def __init__(self, ratio=0.2, minRetriesPerSecond=1, maxTokens=10):
+        self.ratio = ratio
+        self.minRetriesPerSecond = minRetriesPerSecond
+        self.maxTokens = maxTokens
+        self.tokens = maxTokens
+        self.lastRefill = time.time()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def fromConfig(configs):
+        budget = RetryBudget()
+        if 'RETRY_BUDGET_RATIO' in configs:
+            budget.ratio = float(configs['RETRY_BUDGET_RATIO'])
+        if 'RETRY_BUDGET_MIN_PER_SECOND' in configs:
+            budget.minRetriesPerSecond = float(configs['RETRY_BUDGET_MIN_PER_SECOND'])
+        if 'RETRY_BUDGET_MAX_TOKENS' in configs:
+            budget.maxTokens = float(configs['RETRY_BUDGET_MAX_TOKENS'])
+            budget.tokens = budget.maxTokens
+
+        return budget
+
+    def recordRequest(self):
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.maxTokens, self.tokens + self.ratio)
+
+    def tryAcquireRetry(self):
+        with self.lock:
+            self._refill()
+            if self.tokens < 1:
+                return False
+
+            self.tokens -= 1
+            return True
+
+    def _refill(self):
+        now = time.time()
+        self.tokens = min(self.maxTokens, self.tokens + (now - self.lastRefill) * self.minRetriesPerSecond)
+        self.lastRefill = now
@@ -33,6 +33,7 @@ class Utils:
             func(self, *args, **filteredKargs)
 
         wrapper.argSpec = argSpec
+        wrapper.initFunc = func
 
         return wrapper
 
@@ -59,6 +60,44 @@ class Utils:
 
         return query
 
+    @staticmethod
+    def getURLEncodedLength(value):
+        """Returns the length of value after URL encoding, an upper bound for the length it adds to a request URL"""
+        return len(urllib.quote(value, safe=''))
+
+    @staticmethod
+    def splitValuesForQuery(values, fixedQueryLength, maxQueryLength):
+        """**Splits values into lists of consecutive values, such that the json list of each one fits in a query string of maxQueryLength characters**
+
+        :param values: json serializable values
+        :type values: list
+        :param fixedQueryLength: the URL encoded length of the query without the values
+        :type fixedQueryLength: int
+        :param maxQueryLength: the maximal URL encoded length of the query with the values
+        :type maxQueryLength: int
+        :return: list of lists of values, a value that does not fit in the query with any other value gets a list of its own
+        :rtype: list
+        """
+        separatorLength = Utils.getURLEncodedLength(', ')
+        chunks = []
+        chunk = []
+        queryLength = fixedQueryLength
+
+        for value in values:
+            valueLength = Utils.getURLEncodedLength(json.dumps(value))
+            if chunk and queryLength + separatorLength + valueLength > maxQueryLength:
+                chunks.append(chunk)
+                chunk = []
+                queryLength = fixedQueryLength
+
+            queryLength += valueLength + (separatorLength if chunk else 0)
+            chunk.append(value)
+
+        if chunk:
+            chunks.append(chunk)
+
+        return chunks
+
     @staticmethod
     def convertUnitCapacityToBytes(unitCapacity):
         def getMultipleOfBytesType(unitCapacity):
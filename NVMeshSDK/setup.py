@@ -17,6 +17,7 @@ setup(
     packages=['NVMeshSDK','NVMeshSDK.APIs','NVMeshSDK.Entities'],
     install_requires=[
                       'requests',
+                      'futures',
                       'urllib3'],
 
 )
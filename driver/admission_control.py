@@ -0,0 +1,148 @@
+import logging
+import threading
+import time
+
+from grpc import StatusCode
+
+from NVMeshSDK.RequestContext import RequestContext
+from common import DriverError
+from config import Config
+
+logger = logging.getLogger('admission-control')
+
+DEFAULT_QUEUE_SIZE = 50
+DEFAULT_QUEUE_TIMEOUT_SECONDS = 10
+# how often a waiting request checks if its gRPC call was cancelled
+CANCELLATION_CHECK_INTERVAL_SECONDS = 1
+
+
+class AdmissionLimiter(object):
+	'''
+	Allows up to max_concurrent requests at a time, up to max_queue_size more requests wait for up to queue_timeout seconds for a free slot.
+	Requests that can not be queued or that waited too long are rejected with RESOURCE_EXHAUSTED so the caller (the CO sidecar) will back off.
+	A waiting request also stops waiting (with RequestAbortedError) when the RequestContext of its thread was cancelled or passed its deadline.
+	'''
+	def __init__(self, name, max_concurrent, max_queue_size, queue_timeout):
+		self.name = name
+		self.max_concurrent = max_concurrent
+		self.max_queue_size = max_queue_size
+		self.queue_timeout = queue_timeout
+		self.condition = threading.Condition()
+		self.in_flight = 0
+		self.waiting = 0
+		self.rejected = 0
+
+	def acquire(self):
+		with self.condition:
+			if self.in_flight < self.max_concurrent:
+				self.in_flight += 1
+				return
+
+			if self.waiting >= self.max_queue_size:
+				self._reject('{} requests are in progress and {} are waiting'.format(self.in_flight, self.waiting))
+
+			self.waiting += 1
+			try:
+				deadline = time.time() + self.queue_timeout
+				context = RequestContext.getCurrent()
+				while self.in_flight >= self.max_concurrent:
+					RequestContext.checkCurrent()
+					time_left = deadline - time.time()
+					if time_left <= 0:
+						self._reject('waited {} seconds for one of {} requests in progress to finish'.format(self.queue_timeout, self.in_flight))
+
+					if context:
+						context_time_left = context.getTimeRemaining()
+						if context_time_left is not None:
+							time_left = min(time_left, context_time_left)
+
+						time_left = min(time_left, CANCELLATION_CHECK_INTERVAL_SECONDS)
+
+					self.condition.wait(max(time_left, 0))
+
+				self.in_flight += 1
+			finally:
+				self.waiting -= 1
+
+	def release(self):
+		with self.condition:
+			self.in_flight -= 1
+			self.condition.notify()
+
+	def get_metrics(self):
+		with self.condition:
+			return {'in_flight': self.in_flight, 'waiting': self.waiting, 'rejected': self.rejected, 'max_concurrent': self.max_concurrent}
+
+	def _reject(self, reason):
+		# must be called with self.condition held
+		self.rejected += 1
+		logger.warning('Rejected a request to {}: {}'.format(self.name, reason))
+		raise DriverError(StatusCode.RESOURCE_EXHAUSTED, 'Too many concurrent requests to {}, please retry later ({})'.format(self.name, reason))
+
+	def __enter__(self):
+		self.acquire()
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.release()
+
+
+class NoLimit(object):
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		pass
+
+
+class ZoneAdmissionControl(object):
+	'''
+	Limits the number of concurrent requests of each type (save, delete, ...) that are sent to the management of each zone.
+	The limits are taken from Config.MANAGEMENT_CONCURRENCY_LIMITS, for example:
+		{"save": 10, "delete": 10, "zones": {"zone_1": {"save": 4}}}
+	An RPC type without a limit is not limited.
+	Since waiting requests are bounded as well, a slow zone can hold at most (limit + queue size) gRPC worker threads for each RPC type.
+	'''
+	__lock = threading.Lock()
+	__limiters = {}
+
+	@staticmethod
+	def admit(zone, rpc_type):
+		'''
+		Returns a context manager that holds a slot for a request of rpc_type to the zone.
+		Raises DriverError(RESOURCE_EXHAUSTED) if the request was not admitted
+		'''
+		limit = ZoneAdmissionControl.get_limit(zone, rpc_type)
+		if not limit:
+			return NoLimit()
+
+		key = (zone, rpc_type)
+		with ZoneAdmissionControl.__lock:
+			limiter = ZoneAdmissionControl.__limiters.get(key)
+			if not limiter or limiter.max_concurrent != limit:
+				limiter = AdmissionLimiter(
+					'{} requests to zone {}'.format(rpc_type, zone),
+					limit,
+					Config.MANAGEMENT_QUEUE_SIZE if Config.MANAGEMENT_QUEUE_SIZE is not None else DEFAULT_QUEUE_SIZE,
+					Config.MANAGEMENT_QUEUE_TIMEOUT_SECONDS or DEFAULT_QUEUE_TIMEOUT_SECONDS)
+				ZoneAdmissionControl.__limiters[key] = limiter
+
+			return limiter
+
+	@staticmethod
+	def get_limit(zone, rpc_type):
+		limits = Config.MANAGEMENT_CONCURRENCY_LIMITS or {}
+		zone_limits = limits.get('zones', {}).get(zone, {})
+		return zone_limits.get(rpc_type, limits.get(rpc_type))
+
+	@staticmethod
+	def get_metrics():
+		with ZoneAdmissionControl.__lock:
+			limiters = dict(ZoneAdmissionControl.__limiters)
+
+		return dict(('{}/{}'.format(zone, rpc_type), limiter.get_metrics()) for (zone, rpc_type), limiter in limiters.items())
+
+	@staticmethod
+	def clear():
+		with ZoneAdmissionControl.__lock:
+			ZoneAdmissionControl.__limiters.clear()
@@ -0,0 +1,145 @@
+import logging
+import threading
+
+from NVMeshSDK.RequestContext import RequestContext
+
+logger = logging.getLogger('bulk-requests')
+
+
+class BatchItem(object):
+	def __init__(self, key, payload):
+		self.key = key
+		self.payload = payload
+		# the context of the request that submitted the item
+		self.context = RequestContext.getCurrent()
+		self.result = None
+		self.error = None
+		self.is_done = False
+
+	def set_result(self, result):
+		self.result = result
+		self.is_done = True
+
+	def set_error(self, error):
+		self.error = error
+		self.is_done = True
+
+
+class Batch(object):
+	def __init__(self):
+		self.items = []
+		self.full_event = threading.Event()
+		self.done_event = threading.Event()
+
+
+class ZoneRequestBatcher(object):
+	'''
+	ZoneRequestBatcher coalesces concurrent requests to the same zone into a single bulk request to the management.
+	The first thread that submits an item for a zone becomes the batch leader, it waits up to window_ms for other threads to join
+	(or until the batch is full), calls execute_func(zone, items) once for the entire batch and then wakes up all other threads.
+	execute_func is expected to call set_result() or set_error() on each of the items.
+	execute_func runs on behalf of all the items, so it is not limited by the RequestContext of the leader - its deadline is the latest
+	deadline of the items and it is cancelled only when the requests of all the items were cancelled.
+	'''
+	def __init__(self, name, execute_func, window_ms, max_batch_size):
+		self.name = name
+		self.execute_func = execute_func
+		self.window_seconds = float(window_ms or 0) / 1000
+		self.max_batch_size = int(max_batch_size or 1)
+		self.logger = logger.getChild(name)
+		self._lock = threading.Lock()
+		self._open_batches = {}
+
+	def is_enabled(self):
+		return self.window_seconds > 0 and self.max_batch_size > 1
+
+	def submit(self, zone, key, payload):
+		item = BatchItem(key, payload)
+
+		with self._lock:
+			batch = self._open_batches.get(zone)
+			is_leader = batch is None
+			if is_leader:
+				batch = Batch()
+				self._open_batches[zone] = batch
+
+			batch.items.append(item)
+
+			if len(batch.items) >= self.max_batch_size:
+				# close the batch, the next item for this zone will open a new batch
+				del self._open_batches[zone]
+				batch.full_event.set()
+
+		if is_leader:
+			batch.full_event.wait(self.window_seconds)
+
+			with self._lock:
+				if self._open_batches.get(zone) is batch:
+					del self._open_batches[zone]
+
+			self._execute(zone, batch)
+		else:
+			batch.done_event.wait()
+
+		if item.error:
+			raise item.error
+
+		return item.result
+
+	def _execute(self, zone, batch):
+		self.logger.debug('Sending {} items to zone {} in a single request'.format(len(batch.items), zone))
+		try:
+			with RequestContext.scope(context=ZoneRequestBatcher.create_batch_context(batch.items)):
+				self.execute_func(zone, batch.items)
+		except Exception as ex:
+			for item in batch.items:
+				if not item.is_done:
+					item.set_error(ex)
+		finally:
+			for item in batch.items:
+				if not item.is_done:
+					item.set_error(ValueError('No result for {} in the bulk response from zone {}'.format(item.key, zone)))
+
+			batch.done_event.set()
+
+	@staticmethod
+	def create_batch_context(items):
+		contexts = [item.context for item in items]
+		if not all(contexts):
+			# at least one of the requests is not limited, so the batch is not limited either
+			return None
+
+		times_remaining = [context.getTimeRemaining() for context in contexts]
+		time_remaining = None if None in times_remaining else max(times_remaining)
+		return RequestContext(time_remaining, isCancelled=lambda: all(context.isCancelled() for context in contexts))
+
+	@staticmethod
+	def map_results_by_id(keys, results, id_field='_id'):
+		'''
+		Matches each key to its result in the management response.
+		Results are matched by the id field, if the response does not contain ids they are matched by position.
+		Returns a list of results where the index matches the index of the key in keys (or None if not found)
+		'''
+		if not isinstance(results, list):
+			return [None] * len(keys)
+
+		results_by_id = {}
+		for result in results:
+			if isinstance(result, dict) and result.get(id_field) is not None:
+				results_by_id[result.get(id_field)] = result
+
+		if not results_by_id and len(results) == len(keys):
+			return list(results)
+
+		return [results_by_id.get(key) for key in keys]
+
+	@staticmethod
+	def unique_keys(items):
+		# the same key can be submitted by more than one thread (i.e a retry while the first request is still in progress)
+		keys = []
+		seen = set()
+		for item in items:
+			if item.key not in seen:
+				seen.add(item.key)
+				keys.append(item.key)
+		return keys
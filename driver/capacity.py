@@ -0,0 +1,273 @@
+import logging
+import random
+import threading
+import time
+
+from NVMeshSDK.APIs.ClusterAPI import ClusterAPI
+
+import consts as Consts
+from config import Config
+from topology_utils import TopologyUtils, ZonePicker, ZoneSelectionManager
+
+logger = logging.getLogger('capacity')
+
+DEFAULT_CAPACITY_CACHE_TTL_SECONDS = 90
+
+
+class ZoneCapacity(object):
+	def __init__(self, zone, total_space, free_space):
+		self.zone = zone
+		self.total_space = total_space or 0
+		self.free_space = free_space or 0
+		self.timestamp = time.time()
+
+	def age(self):
+		return time.time() - self.timestamp
+
+	def __repr__(self):
+		return 'ZoneCapacity(zone={}, total_space={}, free_space={}, age={:.1f}s)'.format(self.zone, self.total_space, self.free_space, self.age())
+
+
+class ZoneCapacityCache(object):
+	'''
+	In-memory cache of the total and free space of every zone.
+	The cache is updated by the ZoneCapacityPollerThread and can also be refreshed on-demand for a single zone if the cached value is too old.
+	'''
+	__lock = threading.Lock()
+	__entries = {}
+	__zone_locks = {}
+	__cluster_apis = {}
+
+	@staticmethod
+	def get_ttl():
+		return Config.CAPACITY_CACHE_TTL_SECONDS or DEFAULT_CAPACITY_CACHE_TTL_SECONDS
+
+	@staticmethod
+	def get(zone):
+		with ZoneCapacityCache.__lock:
+			return ZoneCapacityCache.__entries.get(zone)
+
+	@staticmethod
+	def set(zone, total_space, free_space):
+		entry = ZoneCapacity(zone, total_space, free_space)
+		with ZoneCapacityCache.__lock:
+			ZoneCapacityCache.__entries[zone] = entry
+
+		return entry
+
+	@staticmethod
+	def consume(zone, size_in_bytes):
+		# update the cached free space after a volume was created, until the next poll will bring the real value
+		with ZoneCapacityCache.__lock:
+			entry = ZoneCapacityCache.__entries.get(zone)
+			if entry:
+				entry.free_space = max(0, entry.free_space - size_in_bytes)
+
+	@staticmethod
+	def clear():
+		with ZoneCapacityCache.__lock:
+			ZoneCapacityCache.__entries.clear()
+			ZoneCapacityCache.__cluster_apis.clear()
+
+	@staticmethod
+	def get_or_refresh(zone, log=None):
+		log = log or logger
+		entry = ZoneCapacityCache.get(zone)
+		if entry and entry.age() < ZoneCapacityCache.get_ttl():
+			return entry
+
+		with ZoneCapacityCache._get_zone_lock(zone):
+			# another thread might have refreshed this zone while we were waiting for the lock
+			entry = ZoneCapacityCache.get(zone)
+			if entry and entry.age() < ZoneCapacityCache.get_ttl():
+				return entry
+
+			try:
+				return ZoneCapacityCache.refresh(zone)
+			except Exception as ex:
+				if not entry:
+					raise
+
+				log.warning('Failed to refresh capacity for zone {}, using a cached value from {:.0f} seconds ago. Error: {}'.format(zone, entry.age(), ex))
+				return entry
+
+	@staticmethod
+	def refresh(zone):
+		total_space, free_space = ZoneCapacityCache._fetch_zone_capacity(zone)
+		entry = ZoneCapacityCache.set(zone, total_space, free_space)
+		logger.debug('Updated capacity for zone {}: {}'.format(zone, entry))
+		return entry
+
+	@staticmethod
+	def _fetch_zone_capacity(zone):
+		cluster_api = ZoneCapacityCache._get_cluster_api(zone)
+		err, status = cluster_api.status()
+		if err:
+			# drop the API object so we will reconnect on the next attempt
+			with ZoneCapacityCache.__lock:
+				ZoneCapacityCache.__cluster_apis.pop(zone, None)
+
+			raise ValueError('Failed to get cluster status from zone {}. Error: {}'.format(zone, err))
+
+		return status.totalSpace, status.freeSpace
+
+	@staticmethod
+	def _get_cluster_api(zone):
+		with ZoneCapacityCache.__lock:
+			api = ZoneCapacityCache.__cluster_apis.get(zone)
+
+		if not api:
+			api = ClusterAPI(**TopologyUtils.get_api_params(zone))
+			with ZoneCapacityCache.__lock:
+				ZoneCapacityCache.__cluster_apis[zone] = api
+
+		return api
+
+	@staticmethod
+	def _get_zone_lock(zone):
+		with ZoneCapacityCache.__lock:
+			if zone not in ZoneCapacityCache.__zone_locks:
+				ZoneCapacityCache.__zone_locks[zone] = threading.Lock()
+
+			return ZoneCapacityCache.__zone_locks[zone]
+
+
+class ZoneReservations(object):
+	'''
+	Tracks the capacity of volumes that are currently being created in each zone.
+	The free space in the ZoneCapacityCache does not include these volumes until they are created and the zone is polled again.
+	'''
+	__lock = threading.Lock()
+	__reserved = {}
+
+	@staticmethod
+	def reserve(zone, size_in_bytes):
+		with ZoneReservations.__lock:
+			ZoneReservations.__reserved[zone] = ZoneReservations.__reserved.get(zone, 0) + size_in_bytes
+
+	@staticmethod
+	def release(zone, size_in_bytes):
+		with ZoneReservations.__lock:
+			reserved = ZoneReservations.__reserved.get(zone, 0) - size_in_bytes
+			if reserved > 0:
+				ZoneReservations.__reserved[zone] = reserved
+			else:
+				ZoneReservations.__reserved.pop(zone, None)
+
+	@staticmethod
+	def get_reserved(zone):
+		with ZoneReservations.__lock:
+			return ZoneReservations.__reserved.get(zone, 0)
+
+	@staticmethod
+	def clear():
+		with ZoneReservations.__lock:
+			ZoneReservations.__reserved.clear()
+
+
+def get_effective_free_space(zone):
+	# returns None if the capacity of the zone was never polled
+	entry = ZoneCapacityCache.get(zone)
+	if not entry:
+		return None
+
+	return max(0, entry.free_space - ZoneReservations.get_reserved(zone))
+
+
+class MostFreeSpaceZonePicker(ZonePicker):
+	'''
+	Picks the allowed zone with the most free space (excluding in-flight creates).
+	Zones that were not polled yet are only used when there is no free space information for any of the allowed zones.
+	'''
+	def pick_zone(self, allowed_zones):
+		free_space_by_zone = {}
+		for zone in allowed_zones:
+			free_space = get_effective_free_space(zone)
+			if free_space:
+				free_space_by_zone[zone] = free_space
+
+		if not free_space_by_zone:
+			return random.choice(allowed_zones)
+
+		max_free_space = max(free_space_by_zone.values())
+		# break ties randomly so equal zones will share the load
+		return random.choice([zone for zone, free_space in free_space_by_zone.items() if free_space == max_free_space])
+
+
+class WeightedZonePicker(ZonePicker):
+	'''
+	Picks a random allowed zone where the probability of each zone is proportional to its free space (excluding in-flight creates).
+	Zones that were not polled yet get the average weight of the other zones.
+	'''
+	def pick_zone(self, allowed_zones):
+		free_space_by_zone = dict((zone, get_effective_free_space(zone)) for zone in allowed_zones)
+
+		known_free_spaces = [free_space for free_space in free_space_by_zone.values() if free_space is not None]
+		average_free_space = sum(known_free_spaces) / len(known_free_spaces) if known_free_spaces else 1
+
+		weights = []
+		for zone in allowed_zones:
+			free_space = free_space_by_zone[zone]
+			weights.append(average_free_space if free_space is None else free_space)
+
+		total_weight = sum(weights)
+		if total_weight <= 0:
+			return random.choice(allowed_zones)
+
+		point = random.uniform(0, total_weight)
+		selected_zone = None
+		for zone, weight in zip(allowed_zones, weights):
+			if weight <= 0:
+				continue
+
+			selected_zone = zone
+			point -= weight
+			if point <= 0:
+				break
+
+		return selected_zone
+
+
+ZoneSelectionManager.register_policy(Consts.ZoneSelectionPolicy.MOST_FREE_SPACE, MostFreeSpaceZonePicker)
+ZoneSelectionManager.register_policy(Consts.ZoneSelectionPolicy.WEIGHTED, WeightedZonePicker)
+
+# policies that need ZoneCapacityCache to be filled, without it they pick zones randomly
+CAPACITY_AWARE_POLICIES = [Consts.ZoneSelectionPolicy.MOST_FREE_SPACE, Consts.ZoneSelectionPolicy.WEIGHTED]
+
+
+def get_all_zones():
+	if Config.TOPOLOGY_TYPE == Consts.TopologyType.SINGLE_ZONE_CLUSTER:
+		return [Consts.SINGLE_CLUSTER_ZONE_NAME]
+
+	return TopologyUtils.get_all_zones_from_topology()
+
+
+class ZoneCapacityPollerThread(threading.Thread):
+	'''
+	Periodically polls the cluster status of every zone and updates the ZoneCapacityCache
+	'''
+	def __init__(self, stop_event, interval_seconds):
+		threading.Thread.__init__(self)
+		self.name = 'zone-capacity-poller'
+		self.daemon = True
+		self.stop_event = stop_event
+		self.interval_seconds = interval_seconds
+		self.logger = logger.getChild('poller')
+
+	def run(self):
+		self.logger.info('Polling zones capacity every {} seconds'.format(self.interval_seconds))
+		while not self.stop_event.is_set():
+			self.poll_all_zones()
+			self.stop_event.wait(self.interval_seconds)
+
+		self.logger.info('Zone capacity poller stopped')
+
+	def poll_all_zones(self):
+		for zone in get_all_zones():
+			if self.stop_event.is_set():
+				return
+
+			try:
+				ZoneCapacityCache.refresh(zone)
+			except Exception as ex:
+				self.logger.warning('Failed to poll capacity for zone {}. Error: {}'.format(zone, ex))
@@ -0,0 +1,258 @@
+import collections
+import logging
+import threading
+import time
+
+import requests
+
+from config import Config
+from topology_utils import TopologyUtils
+
+logger = logging.getLogger('circuit-breaker')
+
+DEFAULT_FAILURE_RATE_THRESHOLD = 0.5
+DEFAULT_MINIMUM_REQUESTS = 3
+DEFAULT_WINDOW_SECONDS = 60
+DEFAULT_OPEN_TIMEOUT_SECONDS = 15
+DEFAULT_MAX_OPEN_TIMEOUT_SECONDS = 120
+PROBE_HTTP_TIMEOUT_SECONDS = 5
+
+
+class CircuitState(object):
+	CLOSED = 'closed'
+	OPEN = 'open'
+	HALF_OPEN = 'half-open'
+
+
+class ZoneCircuitBreaker(object):
+	'''
+	Per-zone circuit breaker.
+	CLOSED - requests are allowed, failures are counted in a sliding time window. When the failure rate in the window
+		crosses the threshold (and there are at least minimum_requests in the window) the circuit is opened.
+	OPEN - requests are not sent to the zone. After open_timeout seconds the ZoneCircuitBreakerProber checks /isAlive on the zone,
+		if the management responds the circuit moves to HALF_OPEN, otherwise it stays OPEN and the timeout is doubled (up to max_open_timeout).
+	HALF_OPEN - a single trial request is allowed, if it succeeds the circuit is CLOSED, if it fails the circuit is OPEN again.
+		a trial that ended without reporting a success or a failure (e.g. an invalid request) is given back when its permit is exited.
+	'''
+	def __init__(self, zone, failure_rate_threshold=None, minimum_requests=None, window_seconds=None, open_timeout=None, max_open_timeout=None):
+		self.zone = zone
+		self.failure_rate_threshold = failure_rate_threshold or DEFAULT_FAILURE_RATE_THRESHOLD
+		self.minimum_requests = minimum_requests or DEFAULT_MINIMUM_REQUESTS
+		self.window_seconds = window_seconds or DEFAULT_WINDOW_SECONDS
+		self.initial_open_timeout = open_timeout or DEFAULT_OPEN_TIMEOUT_SECONDS
+		self.max_open_timeout = max_open_timeout or DEFAULT_MAX_OPEN_TIMEOUT_SECONDS
+
+		self.lock = threading.Lock()
+		self.state = CircuitState.CLOSED
+		self.outcomes = collections.deque()
+		self.open_timeout = self.initial_open_timeout
+		self.opened_at = None
+		self.trial_started_at = None
+		self.transitions = collections.defaultdict(int)
+		self.logger = logger.getChild(str(zone))
+
+	def allow_request(self):
+		'''
+		Returns a ZoneRequestPermit which is True if a request can be sent to the zone.
+		The request should run inside the permit's context, so a trial request of a half-open circuit is released however the request ends.
+		'''
+		# this is called before every request to the zone and must not do any network calls
+		with self.lock:
+			if self.state == CircuitState.CLOSED:
+				return ZoneRequestPermit(self, True)
+
+			if self.state == CircuitState.HALF_OPEN:
+				# allow only one trial request at a time, unless the previous trial never reported back
+				trial_expired = self.trial_started_at and time.time() - self.trial_started_at > self.open_timeout
+				if not self.trial_started_at or trial_expired:
+					self.trial_started_at = time.time()
+					return ZoneRequestPermit(self, True, self.trial_started_at)
+
+			return ZoneRequestPermit(self, False)
+
+	def release_trial(self, trial_started_at):
+		with self.lock:
+			# the trial did not report its outcome, the next request will be the trial
+			if self.state == CircuitState.HALF_OPEN and self.trial_started_at == trial_started_at:
+				self.trial_started_at = None
+
+	def is_open(self):
+		with self.lock:
+			return self.state == CircuitState.OPEN
+
+	def get_state(self):
+		with self.lock:
+			return self.state
+
+	def record_success(self):
+		with self.lock:
+			if self.state == CircuitState.CLOSED:
+				self._add_outcome(is_failure=False)
+			else:
+				self._transition(CircuitState.CLOSED, 'request succeeded')
+
+	def record_failure(self, reason=None):
+		with self.lock:
+			if self.state == CircuitState.HALF_OPEN:
+				self._open_with_backoff('trial request failed: {}'.format(reason))
+			elif self.state == CircuitState.CLOSED:
+				self._add_outcome(is_failure=True)
+				total, failures = self._get_window_counts()
+				if total >= self.minimum_requests and float(failures) / total >= self.failure_rate_threshold:
+					self._transition(CircuitState.OPEN, '{} of the last {} requests failed. last error: {}'.format(failures, total, reason))
+
+	def force_open(self, reason):
+		with self.lock:
+			# if the circuit is already open keep the current timers, so the prober can close it on time
+			if self.state != CircuitState.OPEN:
+				self._transition(CircuitState.OPEN, reason)
+
+	def force_close(self, reason):
+		with self.lock:
+			if self.state != CircuitState.CLOSED:
+				self._transition(CircuitState.CLOSED, reason)
+
+	def is_probe_due(self):
+		with self.lock:
+			return self.state == CircuitState.OPEN and time.time() - self.opened_at >= self.open_timeout
+
+	def on_probe_result(self, is_alive, reason=None):
+		with self.lock:
+			if self.state != CircuitState.OPEN:
+				return
+
+			if is_alive:
+				self._transition(CircuitState.HALF_OPEN, 'management is alive')
+			else:
+				self._open_with_backoff('probe failed: {}'.format(reason))
+
+	def get_stats(self):
+		with self.lock:
+			total, failures = self._get_window_counts()
+			return {
+				'zone': self.zone,
+				'state': self.state,
+				'requests_in_window': total,
+				'failures_in_window': failures,
+				'open_timeout': self.open_timeout,
+				'transitions': dict(('{}->{}'.format(*key), count) for key, count in self.transitions.items())
+			}
+
+	def _open_with_backoff(self, reason):
+		self.open_timeout = min(self.open_timeout * 2, self.max_open_timeout)
+		self._transition(CircuitState.OPEN, reason)
+
+	def _transition(self, new_state, reason):
+		old_state = self.state
+		self.state = new_state
+		self.transitions[(old_state, new_state)] += 1
+		self.trial_started_at = None
+
+		if new_state == CircuitState.OPEN:
+			self.opened_at = time.time()
+			self.logger.warning('zone {} circuit changed from {} to {} ({}). next probe in {} seconds'.format(self.zone, old_state, new_state, reason, self.open_timeout))
+			return
+
+		if new_state == CircuitState.CLOSED:
+			self.outcomes.clear()
+			self.open_timeout = self.initial_open_timeout
+
+		self.logger.info('zone {} circuit changed from {} to {} ({})'.format(self.zone, old_state, new_state, reason))
+
+	def _add_outcome(self, is_failure):
+		self.outcomes.append((time.time(), is_failure))
+		self._trim_window()
+
+	def _trim_window(self):
+		min_timestamp = time.time() - self.window_seconds
+		while self.outcomes and self.outcomes[0][0] < min_timestamp:
+			self.outcomes.popleft()
+
+	def _get_window_counts(self):
+		self._trim_window()
+		failures = sum(1 for _, is_failure in self.outcomes if is_failure)
+		return len(self.outcomes), failures
+
+
+class ZoneRequestPermit(object):
+	'''
+	The answer of ZoneCircuitBreaker.allow_request, evaluates to True if the request is allowed.
+	When used as a context manager, a trial request that did not record a success or a failure is released on exit.
+	'''
+	def __init__(self, breaker, is_allowed, trial_started_at=None):
+		self.breaker = breaker
+		self.is_allowed = is_allowed
+		self.trial_started_at = trial_started_at
+
+	def __nonzero__(self):
+		return self.is_allowed
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		if self.trial_started_at:
+			self.breaker.release_trial(self.trial_started_at)
+
+
+def create_zone_circuit_breaker(zone):
+	return ZoneCircuitBreaker(
+		zone,
+		failure_rate_threshold=Config.CIRCUIT_BREAKER_FAILURE_RATE_THRESHOLD,
+		minimum_requests=Config.CIRCUIT_BREAKER_MINIMUM_REQUESTS,
+		window_seconds=Config.CIRCUIT_BREAKER_WINDOW_SECONDS,
+		open_timeout=Config.CIRCUIT_BREAKER_OPEN_TIMEOUT_SECONDS,
+		max_open_timeout=Config.ZONE_MAX_DISABLED_TIME_IN_SECONDS)
+
+
+def is_management_alive(zone):
+	api_params = TopologyUtils.get_api_params(zone)
+	protocol = api_params.get('managementProtocol', 'https')
+
+	last_error = None
+	for server in api_params['managementServers'].split(','):
+		url = '{}://{}/isAlive'.format(protocol, server.strip())
+		try:
+			res = requests.get(url, verify=False, timeout=PROBE_HTTP_TIMEOUT_SECONDS)
+			if res.status_code == 200:
+				return True, None
+
+			last_error = '{} returned status code {}'.format(url, res.status_code)
+		except Exception as ex:
+			last_error = '{}: {}'.format(url, ex)
+
+	return False, last_error
+
+
+class ZoneCircuitBreakerProber(threading.Thread):
+	'''
+	Probes /isAlive on zones that have an OPEN circuit when their open timeout expires
+	'''
+	def __init__(self, topology, stop_event, interval_seconds=1):
+		threading.Thread.__init__(self)
+		self.name = 'zone-circuit-breaker-prober'
+		self.daemon = True
+		self.topology = topology
+		self.stop_event = stop_event
+		self.interval_seconds = interval_seconds
+
+	def run(self):
+		while not self.stop_event.is_set():
+			for breaker in self.topology.get_circuit_breakers():
+				if self.stop_event.is_set():
+					break
+
+				if breaker.is_probe_due():
+					self.probe(breaker)
+
+			self.stop_event.wait(self.interval_seconds)
+
+		logger.info('Circuit breaker prober stopped')
+
+	def probe(self, breaker):
+		try:
+			is_alive, error = is_management_alive(breaker.zone)
+		except Exception as ex:
+			is_alive, error = False, ex
+
+		breaker.on_probe_result(is_alive, error)
@@ -6,6 +6,7 @@ import time
 from datetime import datetime, timedelta
 from subprocess import Popen, PIPE
 import grpc
+from NVMeshSDK.RequestContext import RequestContext, RequestAbortedError
 
 from config import Config
 import consts as Consts
@@ -56,7 +57,12 @@ class LoggerUtils(object):
 def CatchServerErrors(func):
 	def func_wrapper(self, request, context):
 		try:
-			return func(self, request, context)
+			# SDK calls and backoff loops made by this thread will stop when the caller's deadline passes or the call is cancelled
+			with RequestContext.scope(timeRemaining=context.time_remaining(), isCancelled=lambda: not context.is_active()):
+				return func(self, request, context)
+		except RequestAbortedError as ex:
+			self.logger.warning("gRPC call {} aborted - {}".format(func.__name__, ex))
+			context.abort(grpc.StatusCode.CANCELLED if ex.isCancelled else grpc.StatusCode.DEADLINE_EXCEEDED, str(ex))
 		except DriverError as drvErr:
 			self.logger.warning("Driver Error caught in gRPC call {} - Code: {} Message:{}".format(func.__name__, str(drvErr.code), str(drvErr.message)))
 			self.logger.exception("Driver Error with stack trace")
@@ -416,7 +422,7 @@ class BackoffDelay(object):
 			raise BackoffTimeoutError('Backoff timed out reached')
 
 		self.num_of_backoffs += 1
-		time.sleep(self.current_delay)
+		RequestContext.sleep(self.current_delay)
 		self.calculate_next_delay()
 
 	def get_total_time_seconds(self):
@@ -449,6 +455,9 @@ class BackoffDelayWithStopEvent(BackoffDelay):
 		if self.max_timeout and self.get_total_time_seconds() + self.current_delay > self.max_timeout:
 			raise BackoffTimeoutError('Backoff timed out reached')
 
+		# stop waiting if the gRPC request this thread is working on was cancelled or will pass its deadline
+		RequestContext.checkCurrent(waitSeconds=self.current_delay)
+
 		self.num_of_backoffs += 1
 		event_flag = self.event.wait(self.current_delay)
 		self.calculate_next_delay()
@@ -35,6 +35,33 @@ class Config(object):
 	USE_PREEMPT = None
 	SDK_HTTP_REQUEST_TIMEOUT = None
 	GRPC_MAX_WORKERS = None
+	CREATE_VOLUME_BATCH_WINDOW_MS = None
+	DELETE_VOLUME_BATCH_WINDOW_MS = None
+	MAX_VOLUMES_PER_BATCH = None
+	CAPACITY_POLL_INTERVAL_SECONDS = None
+	CAPACITY_CACHE_TTL_SECONDS = None
+	CIRCUIT_BREAKER_FAILURE_RATE_THRESHOLD = None
+	CIRCUIT_BREAKER_MINIMUM_REQUESTS = None
+	CIRCUIT_BREAKER_WINDOW_SECONDS = None
+	CIRCUIT_BREAKER_OPEN_TIMEOUT_SECONDS = None
+	LIST_VOLUMES_MAX_PARALLEL_ZONES = None
+	VOLUMES_CACHE_MAX_ENTRIES = None
+	VOLUMES_CACHE_TTL_SECONDS = None
+	VOLUMES_CACHE_SNAPSHOT_PATH = None
+	VOLUMES_CACHE_SNAPSHOT_INTERVAL_SECONDS = None
+	REBUILD_VOLUMES_CACHE_ON_STARTUP = None
+	REBUILD_VOLUMES_CACHE_PAGE_SIZE = None
+	MANAGEMENT_PAGE_SIZE = None
+	WARM_VOLUME_POOLS = None
+	WARM_VOLUME_POOL_REFILL_INTERVAL_SECONDS = None
+	ASYNC_CREATE_VOLUME = None
+	ASYNC_CREATE_VOLUME_MAX_WORKERS = None
+	ASYNC_CREATE_VOLUME_WAIT_SECONDS = None
+	MANAGEMENT_CONCURRENCY_LIMITS = None
+	MANAGEMENT_QUEUE_SIZE = None
+	MANAGEMENT_QUEUE_TIMEOUT_SECONDS = None
+	HEDGE_MANAGEMENT_GET_REQUESTS = None
+	HEDGE_MANAGEMENT_GET_REQUESTS_PERCENTILE = None
 
 
 class Parsers(object):
@@ -120,6 +147,33 @@ class ConfigLoader(object):
 		Config.USE_PREEMPT = _get_boolean_config_map_param('usePreempt')
 		Config.SDK_HTTP_REQUEST_TIMEOUT = _get_config_map_param('sdkHttpRequestTimeout', 30)
 		Config.GRPC_MAX_WORKERS = _get_config_map_param('grpcMaxWorkers', 50)
+		Config.CREATE_VOLUME_BATCH_WINDOW_MS = int(_get_config_map_param('createVolumeBatchWindowMS', 0))
+		Config.DELETE_VOLUME_BATCH_WINDOW_MS = int(_get_config_map_param('deleteVolumeBatchWindowMS', 0))
+		Config.MAX_VOLUMES_PER_BATCH = int(_get_config_map_param('maxVolumesPerBatch', 50))
+		Config.CAPACITY_POLL_INTERVAL_SECONDS = int(_get_config_map_param('capacityPollIntervalSeconds', 0))
+		Config.CAPACITY_CACHE_TTL_SECONDS = int(_get_config_map_param('capacityCacheTTLSeconds', 90))
+		Config.CIRCUIT_BREAKER_FAILURE_RATE_THRESHOLD = float(_get_config_map_param('circuitBreakerFailureRateThreshold', 0.5))
+		Config.CIRCUIT_BREAKER_MINIMUM_REQUESTS = int(_get_config_map_param('circuitBreakerMinimumRequests', 3))
+		Config.CIRCUIT_BREAKER_WINDOW_SECONDS = int(_get_config_map_param('circuitBreakerWindowSeconds', 60))
+		Config.CIRCUIT_BREAKER_OPEN_TIMEOUT_SECONDS = int(_get_config_map_param('circuitBreakerOpenTimeoutSeconds', 15))
+		Config.LIST_VOLUMES_MAX_PARALLEL_ZONES = int(_get_config_map_param('listVolumesMaxParallelZones', 10))
+		Config.VOLUMES_CACHE_MAX_ENTRIES = int(_get_config_map_param('volumesCacheMaxEntries', 10000))
+		Config.VOLUMES_CACHE_TTL_SECONDS = int(_get_config_map_param('volumesCacheTTLSeconds', 24 * 3600))
+		Config.VOLUMES_CACHE_SNAPSHOT_PATH = _get_config_map_param('volumesCacheSnapshotPath', None)
+		Config.VOLUMES_CACHE_SNAPSHOT_INTERVAL_SECONDS = int(_get_config_map_param('volumesCacheSnapshotIntervalSeconds', 10))
+		Config.REBUILD_VOLUMES_CACHE_ON_STARTUP = _get_boolean_config_map_param('rebuildVolumesCacheOnStartup')
+		Config.REBUILD_VOLUMES_CACHE_PAGE_SIZE = int(_get_config_map_param('rebuildVolumesCachePageSize', 1000))
+		Config.MANAGEMENT_PAGE_SIZE = int(_get_config_map_param('managementPageSize', 1000))
+		Config.WARM_VOLUME_POOLS = _get_config_map_param('warmVolumePools', None)
+		Config.WARM_VOLUME_POOL_REFILL_INTERVAL_SECONDS = int(_get_config_map_param('warmVolumePoolRefillIntervalSeconds', 30))
+		Config.ASYNC_CREATE_VOLUME = _get_boolean_config_map_param('asyncCreateVolume')
+		Config.ASYNC_CREATE_VOLUME_MAX_WORKERS = int(_get_config_map_param('asyncCreateVolumeMaxWorkers', 10))
+		Config.ASYNC_CREATE_VOLUME_WAIT_SECONDS = float(_get_config_map_param('asyncCreateVolumeWaitSeconds', 1))
+		Config.MANAGEMENT_CONCURRENCY_LIMITS = _get_config_map_param('managementConcurrencyLimits', None)
+		Config.MANAGEMENT_QUEUE_SIZE = int(_get_config_map_param('managementQueueSize', 50))
+		Config.MANAGEMENT_QUEUE_TIMEOUT_SECONDS = float(_get_config_map_param('managementQueueTimeoutSeconds', 10))
+		Config.HEDGE_MANAGEMENT_GET_REQUESTS = _get_boolean_config_map_param('hedgeManagementGetRequests')
+		Config.HEDGE_MANAGEMENT_GET_REQUESTS_PERCENTILE = float(_get_config_map_param('hedgeManagementGetRequestsPercentile', 95))
 
 		if not Config.TOPOLOGY:
 			Config.MANAGEMENT_SERVERS = _get_config_map_param('management.servers') or _get_env_var('MANAGEMENT_SERVERS')
@@ -148,6 +202,18 @@ class ConfigValidator(object):
 
 		ConfigValidator.validate_and_set_topology()
 
+		if Config.WARM_VOLUME_POOLS:
+			try:
+				Config.WARM_VOLUME_POOLS = json.loads(Config.WARM_VOLUME_POOLS)
+			except ValueError as ex:
+				raise ConfigError('Failed to parse config.warmVolumePools. Error %s. originalValue:\n%s' % (ex, Config.WARM_VOLUME_POOLS))
+
+		if Config.MANAGEMENT_CONCURRENCY_LIMITS:
+			try:
+				Config.MANAGEMENT_CONCURRENCY_LIMITS = json.loads(Config.MANAGEMENT_CONCURRENCY_LIMITS)
+			except ValueError as ex:
+				raise ConfigError('Failed to parse config.managementConcurrencyLimits. Error %s. originalValue:\n%s' % (ex, Config.MANAGEMENT_CONCURRENCY_LIMITS))
+
 	@staticmethod
 	def validate_and_set_topology():
 		if not Config.TOPOLOGY:
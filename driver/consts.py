@@ -32,6 +32,15 @@ class TopologyKey(object):
 class ZoneSelectionPolicy(object):
 	RANDOM = 'random'
 	ROUND_ROBIN = 'round-robin'
+	MOST_FREE_SPACE = 'most-free-space'
+	WEIGHTED = 'weighted'
+	LATENCY_AWARE = 'latency-aware'
+
+class ManagementRPC(object):
+	SAVE = 'save'
+	DELETE = 'delete'
+	UPDATE = 'update'
+	EXTEND = 'extend'
 
 class NVMeshAccessMode(object):
 	EXCLUSIVE_READ_WRITE = 'EXCLUSIVE_READ_WRITE'
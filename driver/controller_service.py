@@ -1,28 +1,38 @@
 import datetime
+import itertools
 import time
 import json
 import logging
 import uuid
+from concurrent import futures
 from threading import Thread
 
 from google.protobuf.json_format import MessageToJson, MessageToDict
 from grpc import StatusCode
 
 from NVMeshSDK import ConnectionManager
+from NVMeshSDK.APIs.BaseClassAPI import IterateError
 from NVMeshSDK.ConnectionManager import ManagementTimeout
 from NVMeshSDK.Entities.Volume import Volume as NVMeshVolume
 from NVMeshSDK.Consts import RAIDLevels, EcSeparationTypes
 from NVMeshSDK.MongoObj import MongoObj
+from NVMeshSDK.RequestContext import RequestContext
+from admission_control import ZoneAdmissionControl
+from bulk_requests import ZoneRequestBatcher
+from circuit_breaker import ZoneCircuitBreakerProber
+from capacity import CAPACITY_AWARE_POLICIES, ZoneCapacityCache, ZoneCapacityPollerThread, ZoneReservations, get_all_zones
 from common import CatchServerErrors, DriverError, Utils
 import consts as Consts
-from csi.csi_pb2 import Volume, CreateVolumeResponse, DeleteVolumeResponse, ValidateVolumeCapabilitiesResponse, ListVolumesResponse, ControllerGetCapabilitiesResponse, ControllerServiceCapability, ControllerExpandVolumeResponse, Topology
+from csi.csi_pb2 import Volume, CreateVolumeResponse, DeleteVolumeResponse, ValidateVolumeCapabilitiesResponse, ListVolumesResponse, ControllerGetCapabilitiesResponse, ControllerServiceCapability, ControllerExpandVolumeResponse, GetCapacityResponse, Topology
 from csi.csi_pb2_grpc import ControllerServicer
 from config import Config, get_config_json
 from topology_service import TopologyService
-from persistency import VolumesCache
+from persistency import VolumesCache, VolumesCacheSnapshotThread
 from sdk_helper import NVMeshSDKHelper
-from topology_utils import TopologyUtils, VolumeAPIPool, ZoneSelectionManager
+from topology_utils import TopologyUtils, VolumeAPIPool, ZoneSelectionManager, ZoneLatencyTracker
 from version_compatibility import CompatibilityValidator, VersionMatrix, VersionFetcher
+from volume_listing import InvalidListVolumesToken, ListVolumesToken, MultiZoneVolumeLister
+from warm_pool import POOL_VOLUME_NAME_PREFIX, WarmVolumePoolManager, WarmVolumePoolRefillThread, parse_warm_pool_definitions
 
 class NVMeshControllerService(ControllerServicer):
 	def __init__(self, logger, stop_event):
@@ -33,10 +43,34 @@ class NVMeshControllerService(ControllerServicer):
 		self.logger.info('Config: {}'.format(get_config_json()))
 
 		ConnectionManager.defaultConfig['HTTP_REQUEST_TIMEOUT'] = Config.SDK_HTTP_REQUEST_TIMEOUT
+		# every gRPC worker thread may use the connection to the same management at the same time
+		ConnectionManager.defaultConfig['HTTP_POOL_MAXSIZE'] = int(Config.GRPC_MAX_WORKERS)
+		ConnectionManager.defaultConfig['HEDGED_GET_REQUESTS'] = 'Yes' if Config.HEDGE_MANAGEMENT_GET_REQUESTS else 'No'
+		ConnectionManager.defaultConfig['HEDGE_DELAY_PERCENTILE'] = Config.HEDGE_MANAGEMENT_GET_REQUESTS_PERCENTILE
 
-		self.volume_to_zone_mapping = VolumesCache()
+		self.volume_to_zone_mapping = VolumesCache(max_entries=Config.VOLUMES_CACHE_MAX_ENTRIES, ttl_seconds=Config.VOLUMES_CACHE_TTL_SECONDS)
+		self.volumes_cache_snapshot_thread = None
 		self.topology_service = TopologyService()
 		self.topology_service_thread = None
+		self.capacity_poller_thread = None
+		self.circuit_breaker_prober_thread = None
+		self.warm_pool_refill_thread = None
+		self.warm_pool_manager = WarmVolumePoolManager(
+			parse_warm_pool_definitions(Config.WARM_VOLUME_POOLS),
+			self._build_warm_pool_volume,
+			is_zone_healthy=lambda zone: self.topology_service.topology.is_zone_healthy(zone))
+		self.list_volumes_executor = futures.ThreadPoolExecutor(max_workers=Config.LIST_VOLUMES_MAX_PARALLEL_ZONES or 10)
+		self.create_volume_executor = futures.ThreadPoolExecutor(max_workers=Config.ASYNC_CREATE_VOLUME_MAX_WORKERS or 10)
+		self.create_volume_batcher = ZoneRequestBatcher(
+			'CreateVolume',
+			self._save_volumes_batch,
+			window_ms=Config.CREATE_VOLUME_BATCH_WINDOW_MS,
+			max_batch_size=Config.MAX_VOLUMES_PER_BATCH)
+		self.delete_volume_batcher = ZoneRequestBatcher(
+			'DeleteVolume',
+			self._delete_volumes_batch,
+			window_ms=Config.DELETE_VOLUME_BATCH_WINDOW_MS,
+			max_batch_size=Config.MAX_VOLUMES_PER_BATCH)
 
 	def init(self):
 		if Config.TOPOLOGY_TYPE == Consts.TopologyType.SINGLE_ZONE_CLUSTER:
@@ -47,6 +81,12 @@ class NVMeshControllerService(ControllerServicer):
 		else:
 			self.start_topology_service_thread()
 
+		self.load_volumes_cache_snapshot()
+		self.rebuild_volumes_cache_in_background()
+		self.start_capacity_poller_thread()
+		self.start_circuit_breaker_prober_thread()
+		self.start_warm_pool_refill_thread()
+
 	def validate_mgmt_version(self, mgmt_version):
 		# fetch compatibility matrix from configmap
 		ver_mat = VersionMatrix()
@@ -62,36 +102,109 @@ class NVMeshControllerService(ControllerServicer):
 		nvmesh_vol_name = Utils.volume_id_to_nvmesh_name(request_name)
 		log = self.logger.getChild("CreateVolume:%s(request:%s)" % (request_name, request_uuid))
 
+		volume_cache = self.volume_to_zone_mapping.get_or_create_new(nvmesh_vol_name)
+
+		try:
+			if Config.ASYNC_CREATE_VOLUME:
+				return self._create_volume_async(volume_cache, nvmesh_vol_name, request, request_uuid, log)
+
+			if volume_cache.lock.locked():
+				log.debug("volume already has a request in a progress, waiting for lock to be released")
+
+			with volume_cache.lock:
+				log.debug("processing request")
+				response = self._get_cached_create_volume_response(volume_cache, nvmesh_vol_name, request, log)
+				if response:
+					return response
+
+				csiVolume = self._create_volume_and_update_cache(volume_cache, nvmesh_vol_name, request, request_uuid, log)
+				return CreateVolumeResponse(volume=csiVolume)
+		finally:
+			self.volume_to_zone_mapping.release(volume_cache)
+
+	def _get_cached_create_volume_response(self, volume_cache, nvmesh_vol_name, request, log):
+		if not volume_cache.csi_volume:
+			return None
+
+		if volume_cache.csi_volume.capacity_bytes != self._parse_required_capacity(request.capacity_range):
+			raise DriverError(StatusCode.FAILED_PRECONDITION, 'Volume already exists with different capacity')
+
+		log.info('Returning volume {} from cache'.format(nvmesh_vol_name))
+		return CreateVolumeResponse(volume=volume_cache.csi_volume)
+
+	def _create_volume_and_update_cache(self, volume_cache, nvmesh_vol_name, request, request_uuid, log):
 		time_start = time.time()
+		is_retry = volume_cache.creation_attempts > 0
+		volume_cache.creation_attempts += 1
+		csiVolume, nvmeshVolume, zone = self.do_create_volume(log, nvmesh_vol_name, request, request_uuid, is_retry)
 
-		volume_cache = self.volume_to_zone_mapping.get_or_create_new(nvmesh_vol_name)
+		time_duration = int((time.time() - time_start) * 100) / 100.0
 
-		if volume_cache.lock.locked():
-			log.debug("volume already has a request in a progress, waiting for lock to be released")
+		volume_cache.csi_volume = csiVolume
 
-		with volume_cache.lock:
-			log.debug("processing request")
-			if volume_cache.csi_volume:
-				if volume_cache.csi_volume.capacity_bytes != self._parse_required_capacity(request.capacity_range):
-					raise DriverError(StatusCode.FAILED_PRECONDITION, 'Volume already exists with different capacity')
+		csi_md = nvmeshVolume.csi_metadata
+		pvc_ns_name = csi_md.get("csi-storage-k8s-io/pvc/namespace") + "/" + csi_md.get("csi-storage-k8s-io/pvc/name")
+		log.info('Volume {} created successfully for pvc {} on zone {}  (took {} seconds)'.format(nvmesh_vol_name, pvc_ns_name, zone, time_duration))
+		log.debug('NVMesh Volume: {}'.format(nvmeshVolume))
 
-				log.info('Returning volume {} from cache'.format(nvmesh_vol_name))
-				return CreateVolumeResponse(volume=volume_cache.csi_volume)
+		return csiVolume
 
-			csiVolume, nvmeshVolume, zone = self.do_create_volume(log, nvmesh_vol_name, request, request_uuid)
+	def _create_volume_async(self, volume_cache, nvmesh_vol_name, request, request_uuid, log):
+		'''
+		Creates the volume in the background so the gRPC worker thread is not held while the management allocates the volume.
+		The first request starts the creation and returns ABORTED (operation pending) unless the volume was created within ASYNC_CREATE_VOLUME_WAIT_SECONDS,
+		retries of the same request get the result from the cache once the background creation is done.
+		'''
+		# the lock is held by the background task until the creation is finished
+		if not volume_cache.lock.acquire(False):
+			raise DriverError(StatusCode.ABORTED, 'Volume {} is being created'.format(nvmesh_vol_name))
 
-			time_duration = int((time.time() - time_start) * 100) / 100.0
+		try:
+			response = self._get_cached_create_volume_response(volume_cache, nvmesh_vol_name, request, log)
+			if response:
+				return response
+
+			if volume_cache.error:
+				# report the error of the previous attempt, the next retry will start a new attempt
+				error = volume_cache.error
+				volume_cache.error = None
+				raise error
 
-			volume_cache.csi_volume = csiVolume
+			# the background task takes its own reference to the cache entry so it will not be evicted before the result is saved
+			self.volume_to_zone_mapping.get_or_create_new(nvmesh_vol_name)
+			future = self.create_volume_executor.submit(self._create_volume_in_background, volume_cache, nvmesh_vol_name, request, request_uuid, log)
+		except Exception:
+			volume_cache.lock.release()
+			raise
 
-			csi_md = nvmeshVolume.csi_metadata
-			pvc_ns_name = csi_md.get("csi-storage-k8s-io/pvc/namespace") + "/" + csi_md.get("csi-storage-k8s-io/pvc/name")
-			log.info('Volume {} created successfully for pvc {} on zone {}  (took {} seconds)'.format(nvmesh_vol_name, pvc_ns_name, zone, time_duration))
-			log.debug('NVMesh Volume: {}'.format(nvmeshVolume))
+		log.debug('Volume creation started in the background')
 
-			return CreateVolumeResponse(volume=csiVolume)
+		try:
+			csiVolume = future.result(timeout=Config.ASYNC_CREATE_VOLUME_WAIT_SECONDS)
+		except futures.TimeoutError:
+			raise DriverError(StatusCode.ABORTED, 'Volume {} is being created'.format(nvmesh_vol_name))
 
-	def do_create_volume(self, log, nvmesh_vol_name, request, request_uuid):
+		if not csiVolume:
+			# the background task failed, this request will report the error instead of the next retry
+			error = volume_cache.error
+			volume_cache.error = None
+			raise error or DriverError(StatusCode.ABORTED, 'Volume {} creation failed, please retry'.format(nvmesh_vol_name))
+
+		return CreateVolumeResponse(volume=csiVolume)
+
+	def _create_volume_in_background(self, volume_cache, nvmesh_vol_name, request, request_uuid, log):
+		# runs with volume_cache.lock that was acquired by the request that started the creation
+		try:
+			return self._create_volume_and_update_cache(volume_cache, nvmesh_vol_name, request, request_uuid, log)
+		except Exception as ex:
+			log.warning('Background volume creation failed. Error: {}'.format(ex))
+			volume_cache.error = ex
+			return None
+		finally:
+			volume_cache.lock.release()
+			self.volume_to_zone_mapping.release(volume_cache)
+
+	def do_create_volume(self, log, nvmesh_vol_name, request, request_uuid, is_retry=False):
 		# UNUSED - secrets = request.secrets
 		# UNUSED - volume_content_source = request.volume_content_source
 		reqDict = MessageToDict(request)
@@ -112,8 +225,38 @@ class NVMeshControllerService(ControllerServicer):
 		allowed_zones = TopologyUtils.get_allowed_zones_from_topology(topology_requirements)
 
 		log.debug('Allowed zones: %s' % allowed_zones)
-		zone = self.create_volume_on_a_valid_zone(volume, allowed_zones, log)
 
+		claimed = None
+		if self.warm_pool_manager.is_enabled():
+			if is_retry:
+				claimed = self._find_claimed_volume(reqDict['parameters'], capacity, request.name, allowed_zones, log)
+
+			if not claimed:
+				claimed = self.warm_pool_manager.claim(reqDict['parameters'], capacity, csi_metadata, allowed_zones, log)
+
+		if claimed:
+			volume, zone = claimed
+			nvmesh_vol_name = volume.name
+		else:
+			zone = self.create_volume_on_a_valid_zone(volume, allowed_zones, log)
+
+		csiVolume = self._build_csi_volume(nvmesh_vol_name, zone, capacity, reqDict['parameters'], request_uuid)
+		return csiVolume, volume, zone
+
+	def _find_claimed_volume(self, parameters, capacity, csi_name, allowed_zones, log):
+		# a previous attempt of this request might have claimed a pool volume, which does not have the name derived from the request
+		try:
+			claimed = self.warm_pool_manager.find_claimed_volume(parameters, capacity, csi_name, allowed_zones, log)
+		except Exception as ex:
+			# claiming another volume could leave two volumes for the same request
+			raise DriverError(StatusCode.UNAVAILABLE, 'Failed to look for a volume already claimed for {}. Error: {}'.format(csi_name, ex))
+
+		if claimed:
+			log.info('Found volume {} that was already claimed for this request'.format(claimed[0].name))
+
+		return claimed
+
+	def _build_csi_volume(self, nvmesh_vol_name, zone, capacity, parameters, request_uuid=None):
 		# we return the zone:nvmesh_vol_name to the CO
 		# all subsequent requests for this volume will have volume_id of the zone:nvmesh_vol_name
 		volume_id_for_co = Utils.nvmesh_vol_name_to_co_id(nvmesh_vol_name, zone)
@@ -124,14 +267,25 @@ class NVMeshControllerService(ControllerServicer):
 		volume_context = {
 			'nvmesh-csi-driver/name': Config.DRIVER_NAME,
 			'nvmesh-csi-driver/version': Config.DRIVER_VERSION,
-			'request_uuid': request_uuid,
 			'zone': zone
 		}
 
+		if request_uuid:
+			volume_context['request_uuid'] = request_uuid
+
 		# Add all fields from the StorageClass parameters
-		volume_context.update(reqDict['parameters'])
-		csiVolume = Volume(volume_id=volume_id_for_co, capacity_bytes=capacity, accessible_topology=[volume_topology], volume_context=volume_context)
-		return csiVolume, volume, zone
+		volume_context.update(parameters)
+		return Volume(volume_id=volume_id_for_co, capacity_bytes=capacity, accessible_topology=[volume_topology], volume_context=volume_context)
+
+	def _build_warm_pool_volume(self, name, definition, csi_metadata):
+		reqDict = {'parameters': dict(definition.parameters)}
+		nvmesh_params = self._handle_volume_req_parameters(reqDict, self.logger)
+		return NVMeshVolume(
+			name=name,
+			capacity=definition.capacity,
+			csi_metadata=csi_metadata,
+			**nvmesh_params
+		)
 
 	def create_volume_on_a_valid_zone(self, volume, zones, log):
 		zones_left = set(zones)
@@ -141,12 +295,13 @@ class NVMeshControllerService(ControllerServicer):
 			zones_left.remove(selected_zone)
 
 			try:
-				is_zone_disabled = self.topology_service.topology.is_zone_disabled(selected_zone)
-				if is_zone_disabled and not only_one_zone:
-					raise DriverError(StatusCode.RESOURCE_EXHAUSTED, 'Zone {} is disabled. Skipping this zone'.format(selected_zone))
+				# the trial request of a half-open zone is released even if the request ends without a success or a failure of the zone
+				with self.topology_service.topology.allow_request_to_zone(selected_zone) as is_zone_allowed:
+					if not is_zone_allowed and not only_one_zone:
+						raise DriverError(StatusCode.RESOURCE_EXHAUSTED, 'Zone {} is disabled. Skipping this zone'.format(selected_zone))
 
-				self.create_volume_in_zone(volume, selected_zone, log)
-				return selected_zone
+					self.create_volume_in_zone(volume, selected_zone, log)
+					return selected_zone
 			except DriverError as ex:
 				if ex.code != StatusCode.RESOURCE_EXHAUSTED:
 					raise
@@ -166,10 +321,28 @@ class NVMeshControllerService(ControllerServicer):
 		log.info('Creating volume {} in zone {}'.format(volume.name, zone))
 		log.debug('Creating volume: {}'.format(str(volume)))
 
+		# reserve the capacity so capacity aware zone pickers will take this volume into account while it is being created
+		ZoneReservations.reserve(zone, volume.capacity)
+		try:
+			if self.create_volume_batcher.is_enabled():
+				err, data, mgmt_server = self.create_volume_batcher.submit(zone, volume.name, volume)
+			else:
+				err, data, mgmt_server = self._save_volumes_in_zone(zone, [volume], log)
+
+			log.debug('Create volume got response - err: {} data: {}'.format(err, data))
+			self._handle_create_volume_errors(err, data, volume, zone, mgmt_server, log)
+			ZoneCapacityCache.consume(zone, volume.capacity)
+		finally:
+			ZoneReservations.release(zone, volume.capacity)
+
+	def _save_volumes_in_zone(self, zone, volumes, log):
 		data = None
 		try:
 			volume_api = VolumeAPIPool.get_volume_api_for_zone(zone, log)
-			err, data = volume_api.save([volume])
+			with ZoneAdmissionControl.admit(zone, Consts.ManagementRPC.SAVE), ZoneLatencyTracker.measure(zone, batch_size=len(volumes)) as measurement:
+				err, data = volume_api.save(volumes)
+				measurement.is_error = bool(err)
+
 			# this is only required for printing informative logs
 			mgmt_server = volume_api.managementConnection.managementServer
 		except ManagementTimeout as ex:
@@ -177,8 +350,36 @@ class NVMeshControllerService(ControllerServicer):
 			api_params = TopologyUtils.get_api_params(zone)
 			mgmt_server = api_params['managementServers']
 
-		log.debug('Create volume got response - err: {} data: {}'.format(err, data))
-		self._handle_create_volume_errors(err, data, volume, zone, mgmt_server, log)
+		return err, data, mgmt_server
+
+	def _save_volumes_batch(self, zone, items):
+		log = self.logger.getChild('CreateVolumeBatch:%s' % zone)
+		volumes = [item.payload for item in items]
+		log.debug('Creating {} volumes in a single request: {}'.format(len(volumes), ', '.join([v.name for v in volumes])))
+
+		err, data, mgmt_server = self._save_volumes_in_zone(zone, volumes, log)
+
+		SCHEMA_ERROR = 422
+		if err and len(items) > 1 and hasattr(err, 'get') and err.get('code') in [SCHEMA_ERROR]:
+			# a schema error in one volume fails the entire request,
+			# so we save each volume on its own to report the error only to the request that caused it
+			log.debug('Bulk save failed with a schema error, saving each volume separately')
+			for item in items:
+				item.set_result(self._save_volumes_in_zone(zone, [item.payload], log))
+			return
+
+		if err:
+			for item in items:
+				item.set_result((err, data, mgmt_server))
+			return
+
+		item_results = ZoneRequestBatcher.map_results_by_id([item.key for item in items], data)
+		for item, item_result in zip(items, item_results):
+			if item_result is None:
+				msg = 'No result returned for this volume in the bulk response'
+				item_result = {'_id': item.key, 'success': False, 'error': msg, 'err': msg}
+
+			item.set_result((None, [item_result], mgmt_server))
 
 	def _handle_create_volume_errors(self, err, data, volume, zone, mgmt_server, log):
 		failed_to_create_msg = 'Failed to create volume {vol_name} in zone {zone} ({mgmt})'.format(
@@ -192,11 +393,11 @@ class NVMeshControllerService(ControllerServicer):
 				raise DriverError(StatusCode.INVALID_ARGUMENT, failed_to_create_msg + '. Response: {} Volume Requested: {}'.format(err, str(volume)))
 			else:
 				# Failed to Connect to Management, HTTP Request Timed-out or other HTTP Error
-				self.topology_service.topology.disable_zone(zone)
+				self.topology_service.topology.record_zone_failure(zone, err)
 				raise DriverError(StatusCode.RESOURCE_EXHAUSTED, '{} Error: {}'.format(failed_to_create_msg, err))
 		else:
 			# management returned a response
-			self.topology_service.topology.make_sure_zone_enabled(zone)
+			self.topology_service.topology.record_zone_success(zone)
 
 			if not type(data) == list or not data[0].get('success'):
 				volume_already_exists = ('id' in data[0].get('error') and data[0]['error']['id'] == Consts.MgmtMessageCodes.VOLUME_ALREADY_EXISTS) \
@@ -307,9 +508,11 @@ class NVMeshControllerService(ControllerServicer):
 		zone, nvmesh_vol_name = Utils.zone_and_vol_name_from_co_id(volume_id)
 		#secrets = request.secrets
 
-		volume_api = VolumeAPIPool.get_volume_api_for_zone(zone, log)
+		if self.delete_volume_batcher.is_enabled():
+			err, out = self.delete_volume_batcher.submit(zone, nvmesh_vol_name, nvmesh_vol_name)
+		else:
+			err, out = self._delete_volumes_in_zone(zone, [nvmesh_vol_name], log)
 
-		err, out = volume_api.delete([NVMeshVolume(_id=nvmesh_vol_name)])
 		if err:
 			log.error(err)
 			raise DriverError(StatusCode.INTERNAL, err)
@@ -330,8 +533,40 @@ class NVMeshControllerService(ControllerServicer):
 			log.debug("Volume %s deleted successfully from zone %s" % (nvmesh_vol_name, zone))
 
 		self.volume_to_zone_mapping.remove(nvmesh_vol_name)
+		if nvmesh_vol_name.startswith(POOL_VOLUME_NAME_PREFIX):
+			# a volume claimed from a warm pool is cached by the name derived from its CreateVolume request
+			self.volume_to_zone_mapping.remove_by_csi_volume_id(volume_id)
+
 		return DeleteVolumeResponse()
 
+	def _delete_volumes_in_zone(self, zone, nvmesh_vol_names, log):
+		volume_api = VolumeAPIPool.get_volume_api_for_zone(zone, log)
+		with ZoneAdmissionControl.admit(zone, Consts.ManagementRPC.DELETE), ZoneLatencyTracker.measure(zone, batch_size=len(nvmesh_vol_names)) as measurement:
+			err, out = volume_api.delete([NVMeshVolume(_id=nvmesh_vol_name) for nvmesh_vol_name in nvmesh_vol_names])
+			measurement.is_error = bool(err)
+
+		return err, out
+
+	def _delete_volumes_batch(self, zone, items):
+		log = self.logger.getChild('DeleteVolumeBatch:%s' % zone)
+		nvmesh_vol_names = ZoneRequestBatcher.unique_keys(items)
+		log.debug('Deleting {} volumes in a single request: {}'.format(len(nvmesh_vol_names), ', '.join(nvmesh_vol_names)))
+
+		err, out = self._delete_volumes_in_zone(zone, nvmesh_vol_names, log)
+
+		if err:
+			for item in items:
+				item.set_result((err, out))
+			return
+
+		results_by_name = dict(zip(nvmesh_vol_names, ZoneRequestBatcher.map_results_by_id(nvmesh_vol_names, out)))
+		for item in items:
+			item_result = results_by_name.get(item.key)
+			if item_result is None:
+				item_result = {'_id': item.key, 'success': False, 'error': 'No result returned for this volume in the bulk response'}
+
+			item.set_result((None, [item_result]))
+
 	@CatchServerErrors
 	def ValidateVolumeCapabilities(self, request, context):
 		Utils.validate_params_exists(request, ['volume_id', 'volume_capabilities'])
@@ -345,46 +580,91 @@ class NVMeshControllerService(ControllerServicer):
 	@CatchServerErrors
 	def ListVolumes(self, request, context):
 		max_entries = request.max_entries
-		starting_token = request.starting_token
+		log = self.logger.getChild('ListVolumes')
 
 		try:
-			page = int(starting_token or 0)
-		except ValueError:
-			raise DriverError(StatusCode.ABORTED, "Invalid starting_token")
+			cursors = ListVolumesToken.decode(request.starting_token, get_all_zones())
+		except InvalidListVolumesToken as ex:
+			raise DriverError(StatusCode.ABORTED, str(ex))
 
-		if starting_token and not max_entries:
-			raise DriverError(StatusCode.ABORTED, "Invalid starting_token")
+		# only volumes created by the driver, which excludes volumes that are waiting in a warm pool
+		filterObj = [MongoObj(field='csi_metadata.csi_name', value={'$exists': 1})]
 
-		count = max_entries or 0
+		def get_volumes_page(zone, after_id, limit):
+			return self._get_volumes_page_in_zone(zone, after_id, limit, filterObj=filterObj)
 
-		projection = [
+		# the zones are listed by worker threads, they should stop when this request is cancelled as well
+		lister = MultiZoneVolumeLister(RequestContext.bindToCurrent(get_volumes_page), self.list_volumes_executor)
+		volumes, next_cursors = lister.list_volumes(cursors, max_entries)
+
+		topology_key = TopologyUtils.get_topology_key()
+
+		def convertNVMeshVolumeToCSIVolume(zone, volume):
+			volume_id = Utils.nvmesh_vol_name_to_co_id(volume._id, zone)
+			volume_topology = Topology(segments={topology_key: zone})
+			vol = Volume(volume_id=volume_id, capacity_bytes=volume.capacity, accessible_topology=[volume_topology])
+			return ListVolumesResponse.Entry(volume=vol)
+
+		entries = [convertNVMeshVolumeToCSIVolume(zone, volume) for zone, volume in volumes]
+		next_token = ListVolumesToken.encode(next_cursors)
+		log.debug('returning {} volumes from {} zones, zones with more volumes: {}'.format(len(entries), len(cursors), ', '.join(next_cursors.keys())))
+
+		return ListVolumesResponse(entries=entries, next_token=next_token)
+
+	def _get_volumes_page_in_zone(self, zone, after_id, limit, projection=None, filterObj=None):
+		volumes = self._iterate_volumes_in_zone(zone, after_id, limit or Config.MANAGEMENT_PAGE_SIZE or 1000, projection=projection, filterObj=filterObj)
+		if limit:
+			# stop after the first page instead of fetching the next one
+			return list(itertools.islice(volumes, limit))
+
+		return list(volumes)
+
+	def _iterate_volumes_in_zone(self, zone, after_id, page_size, projection=None, filterObj=None):
+		projection = projection or [
 			MongoObj(field='_id', value=1),
 			MongoObj(field='capacity', value=1)
 		]
 
-		# TODO: we should probably iterate over all management servers and return all volumes while populating the volume.accessible_topology field
-		zone = ''
 		volume_api = VolumeAPIPool.get_volume_api_for_zone(zone, self.logger)
-		err, nvmeshVolumes = volume_api.get(projection=projection, page=page, count=count)
+		try:
+			for volume in volume_api.iterate(filter=filterObj, projection=projection, pageSize=page_size, afterId=after_id or None):
+				yield volume
+		except IterateError as ex:
+			raise DriverError(StatusCode.UNAVAILABLE, 'Failed to list volumes in zone {}. Error: {}'.format(zone, ex.err))
 
-		if err:
-			raise DriverError(StatusCode.INTERNAL, err)
+	@CatchServerErrors
+	def GetCapacity(self, request, context):
+		log = self.logger.getChild('GetCapacity')
 
-		def convertNVMeshVolumeToCSIVolume(volume):
-			vol = Volume(volume_id=volume._id, capacity_bytes=volume.capacity)
-			return ListVolumesResponse.Entry(volume=vol)
+		if request.HasField('accessible_topology'):
+			topology_key = TopologyUtils.get_topology_key()
+			zone = request.accessible_topology.segments.get(topology_key)
+			if not zone:
+				raise DriverError(StatusCode.INVALID_ARGUMENT, 'accessible_topology is missing the {} segment'.format(topology_key))
 
-		entries = map(convertNVMeshVolumeToCSIVolume, nvmeshVolumes)
-		next_token = str(page + 1)
+			zones = [zone]
+		else:
+			# no topology given - report the capacity of all zones
+			zones = get_all_zones()
 
-		if not len(entries):
-			DriverError(StatusCode.ABORTED, "No more Entries")
+		available_capacity = sum(self._get_available_capacity_in_zone(zone, log) for zone in zones)
+		log.debug('zones: {} available_capacity: {}'.format(', '.join(zones), available_capacity))
+		return GetCapacityResponse(available_capacity=available_capacity)
 
-		return ListVolumesResponse(entries=entries, next_token=next_token)
+	def _get_available_capacity_in_zone(self, zone, log):
+		if zone not in get_all_zones():
+			log.debug('Zone {} is not part of the topology, reporting 0 capacity'.format(zone))
+			return 0
 
-	@CatchServerErrors
-	def GetCapacity(self, request, context):
-		raise NotImplementedError('Method not implemented!')
+		if self.topology_service.topology.is_zone_disabled(zone):
+			# so the scheduler will avoid placing new volumes on this zone
+			log.debug('Zone {} is disabled, reporting 0 capacity'.format(zone))
+			return 0
+
+		try:
+			return ZoneCapacityCache.get_or_refresh(zone, log).free_space
+		except Exception as ex:
+			raise DriverError(StatusCode.UNAVAILABLE, 'Failed to get capacity for zone {}. Error: {}'.format(zone, ex))
 
 	@CatchServerErrors
 	def ControllerGetCapabilities(self, request, context):
@@ -392,19 +672,20 @@ class NVMeshControllerService(ControllerServicer):
 			return ControllerServiceCapability(rpc=ControllerServiceCapability.RPC(type=capabilityType))
 
 		create_delete_volume = buildCapability(ControllerServiceCapability.RPC.CREATE_DELETE_VOLUME)
-		#list_volumes = buildCapability(ControllerServiceCapability.RPC.LIST_VOLUMES)
+		list_volumes = buildCapability(ControllerServiceCapability.RPC.LIST_VOLUMES)
 		expand_volume = buildCapability(ControllerServiceCapability.RPC.EXPAND_VOLUME)
+		get_capacity = buildCapability(ControllerServiceCapability.RPC.GET_CAPACITY)
 
 		# Not Implemented
-		# get_capacity = buildCapability(ControllerServiceCapability.RPC.GET_CAPACITY)
 		# create_delete_snapshot = buildCapability(ControllerServiceCapability.RPC.CREATE_DELETE_SNAPSHOT)
 		# list_snapshots = buildCapability(ControllerServiceCapability.RPC.LIST_SNAPSHOTS)
 		# clone_volume = buildCapability(ControllerServiceCapability.RPC.CLONE_VOLUME)
 
 		capabilities = [
 			create_delete_volume,
-			#list_volumes,
-			expand_volume
+			list_volumes,
+			expand_volume,
+			get_capacity
 		]
 
 		return ControllerGetCapabilitiesResponse(capabilities=capabilities)
@@ -438,7 +719,9 @@ class NVMeshControllerService(ControllerServicer):
 		volume.capacity = capacity_in_bytes
 
 		self.logger.debug("ControllerExpandVolume volume={}".format(str(volume)))
-		err, out = volume_api.makePost(routes=['/extend'], objects=[volume])
+		with ZoneAdmissionControl.admit(zone, Consts.ManagementRPC.EXTEND), ZoneLatencyTracker.measure(zone) as measurement:
+			err, out = volume_api.makePost(routes=['/extend'], objects=[volume])
+			measurement.is_error = bool(err)
 
 		if err:
 			raise DriverError(StatusCode.NOT_FOUND, err)
@@ -529,6 +812,113 @@ class NVMeshControllerService(ControllerServicer):
 		self.topology_service_thread = Thread(name='topology-service-thread', target=self.topology_service.run)
 		self.topology_service_thread.start()
 
+	def rebuild_volumes_cache_in_background(self):
+		if not Config.REBUILD_VOLUMES_CACHE_ON_STARTUP:
+			return
+
+		t = Thread(name='volumes-cache-rebuild', target=self.rebuild_volumes_cache)
+		t.daemon = True
+		t.start()
+
+	def rebuild_volumes_cache(self):
+		'''
+		Fills the VolumesCache with all CSI volumes from all zones, so CreateVolume retries for volumes that were created
+		before the controller restarted will be answered from memory without a failing save and another GET
+		'''
+		log = self.logger.getChild('RebuildVolumesCache')
+		time_start = time.time()
+
+		zones = get_all_zones()
+		futures_by_zone = dict((zone, self.list_volumes_executor.submit(self._rebuild_volumes_cache_from_zone, zone, log)) for zone in zones)
+
+		total = 0
+		for zone, future in futures_by_zone.items():
+			try:
+				total += future.result()
+			except Exception as ex:
+				log.warning('Failed to load volumes from zone {}. Error: {}'.format(zone, ex))
+
+		log.info('Loaded {} volumes from {} zones into the cache (took {:.2f} seconds)'.format(total, len(zones), time.time() - time_start))
+
+	def _rebuild_volumes_cache_from_zone(self, zone, log):
+		projection = [
+			MongoObj(field='_id', value=1),
+			MongoObj(field='capacity', value=1),
+			MongoObj(field='csi_metadata', value=1)
+		]
+		filterObj = [MongoObj(field='csi_metadata.csi_name', value={'$exists': 1})]
+		page_size = Config.REBUILD_VOLUMES_CACHE_PAGE_SIZE or 1000
+
+		count = 0
+		for volume in self._iterate_volumes_in_zone(zone, None, page_size, projection=projection, filterObj=filterObj):
+			if self.stop_event.is_set():
+				break
+
+			if self._add_existing_volume_to_cache(volume, zone):
+				count += 1
+
+		log.debug('Loaded {} volumes from zone {}'.format(count, zone))
+		return count
+
+	def _add_existing_volume_to_cache(self, volume, zone):
+		csi_metadata = getattr(volume, 'csi_metadata', None) or {}
+		csi_name = csi_metadata.get('csi_name')
+		if not csi_name:
+			return False
+
+		# the cache is keyed by the name derived from the CreateVolume request name,
+		# which is not the volume name if the volume was claimed from a warm pool
+		volume_id = Utils.volume_id_to_nvmesh_name(csi_name)
+
+		# The StorageClass parameters were saved in csi_metadata (with sanitized keys) together with the driver's own fields
+		# the csi.storage.k8s.io/* parameters are removed from the parameters before the volume context is created
+		driver_fields = ['csi_name', 'zone', 'fsType', 'volumeMode']
+		parameters = dict((key, value) for key, value in csi_metadata.items() if key not in driver_fields and not key.startswith('csi-storage-k8s-io'))
+		volume_zone = csi_metadata.get('zone') or zone
+
+		csi_volume = self._build_csi_volume(volume._id, volume_zone, volume.capacity, parameters)
+		return self.volume_to_zone_mapping.add_if_missing(volume_id, csi_volume)
+
+	def load_volumes_cache_snapshot(self):
+		if not Config.VOLUMES_CACHE_SNAPSHOT_PATH:
+			return
+
+		try:
+			self.volume_to_zone_mapping.load_snapshot(Config.VOLUMES_CACHE_SNAPSHOT_PATH)
+		except Exception as ex:
+			# the snapshot is only an optimization, we can start with an empty cache
+			self.logger.warning('Failed to load VolumesCache snapshot from {}. Error: {}'.format(Config.VOLUMES_CACHE_SNAPSHOT_PATH, ex))
+
+		self.volumes_cache_snapshot_thread = VolumesCacheSnapshotThread(
+			self.volume_to_zone_mapping,
+			Config.VOLUMES_CACHE_SNAPSHOT_PATH,
+			self.stop_event,
+			Config.VOLUMES_CACHE_SNAPSHOT_INTERVAL_SECONDS or 10)
+		self.volumes_cache_snapshot_thread.start()
+
+	def start_capacity_poller_thread(self):
+		if not Config.CAPACITY_POLL_INTERVAL_SECONDS:
+			selection_policy = (Config.TOPOLOGY or {}).get('zoneSelectionPolicy')
+			if selection_policy in CAPACITY_AWARE_POLICIES:
+				self.logger.warning('zoneSelectionPolicy %s requires capacityPollIntervalSeconds to be set. Zones will only have capacity data after a GetCapacity call and will be picked randomly until then' % selection_policy)
+
+			# GetCapacity will refresh the capacity of a zone on-demand
+			return
+
+		self.capacity_poller_thread = ZoneCapacityPollerThread(self.stop_event, Config.CAPACITY_POLL_INTERVAL_SECONDS)
+		self.capacity_poller_thread.start()
+
+	def start_circuit_breaker_prober_thread(self):
+		self.circuit_breaker_prober_thread = ZoneCircuitBreakerProber(self.topology_service.topology, self.stop_event)
+		self.circuit_breaker_prober_thread.start()
+
+	def start_warm_pool_refill_thread(self):
+		if not self.warm_pool_manager.is_enabled():
+			return
+
+		self.warm_pool_refill_thread = WarmVolumePoolRefillThread(self.warm_pool_manager, self.stop_event, Config.WARM_VOLUME_POOL_REFILL_INTERVAL_SECONDS)
+		self.warm_pool_refill_thread.start()
+
 	def stop(self):
 		self.stop_event.set()
 		self.topology_service.stop_event.set()
@@ -537,3 +927,20 @@ class NVMeshControllerService(ControllerServicer):
 			self.topology_service_thread.join()
 
 		self.logger.info('Topology Service terminated.')
+
+		if self.capacity_poller_thread:
+			self.capacity_poller_thread.join()
+
+		if self.circuit_breaker_prober_thread:
+			self.circuit_breaker_prober_thread.join()
+
+		if self.warm_pool_refill_thread:
+			# wake up the refill thread so it will see the stop_event
+			self.warm_pool_manager.refill_event.set()
+			self.warm_pool_refill_thread.join()
+
+		self.list_volumes_executor.shutdown(wait=False)
+		self.create_volume_executor.shutdown(wait=False)
+
+		if self.volumes_cache_snapshot_thread:
+			self.volumes_cache_snapshot_thread.join()
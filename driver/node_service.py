@@ -13,8 +13,7 @@ import consts as Consts
 from csi.csi_pb2 import NodeGetInfoResponse, NodeGetCapabilitiesResponse, NodeGetVolumeStatsResponse, NodeServiceCapability, NodePublishVolumeResponse, NodeUnpublishVolumeResponse, \
 	NodeStageVolumeResponse, NodeUnstageVolumeResponse, NodeExpandVolumeResponse, Topology, VolumeCondition, VolumeUsage
 from csi.csi_pb2_grpc import NodeServicer
-from attach_detach_addon_to_sdk import NewClientAPI
-from topology_utils import TopologyUtils, NodeNotFoundInTopology
+from topology_utils import TopologyUtils, NodeNotFoundInTopology, ClientAPIPool
 from version_compatibility import CompatibilityValidator, VersionMatrix, VersionFetcher
 from dmcrypt import DMCrypt
 from consts import FSType
@@ -136,9 +135,7 @@ class NVMeshNodeService(NodeServicer):
 		return NodeStageVolumeResponse()
 
 	def get_client_api(self):
-		api_params = TopologyUtils.get_api_params(self.zone)
-		client_api = NewClientAPI(**api_params)
-		return client_api
+		return ClientAPIPool.get_client_api_for_zone(self.zone, self.logger)
 
 	@CatchServerErrors
 	def NodeUnstageVolume(self, request, context):
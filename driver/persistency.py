@@ -1,4 +1,16 @@
+import base64
+import json
+import logging
+import os
 import threading
+import time
+from collections import OrderedDict
+
+from csi.csi_pb2 import Volume
+
+logger = logging.getLogger('persistency')
+
+SNAPSHOT_FORMAT_VERSION = 1
 
 
 class ThreadSafeDict(object):
@@ -27,20 +39,208 @@ class ThreadSafeDict(object):
 
 
 class VolumesCache(ThreadSafeDict):
+	'''
+	Cache of the volumes created by this controller, used to answer repeated CreateVolume calls without calling the management.
+	Entries are kept in LRU order and are evicted when the cache has more than max_entries or when an entry was not used for ttl_seconds.
+	An entry that is in use (returned by get_or_create_new and not released yet) is never evicted,
+	so two requests for the same volume will always get the same entry (and the same lock).
+	'''
+	def __init__(self, max_entries=None, ttl_seconds=None):
+		ThreadSafeDict.__init__(self)
+		self._dict = OrderedDict()
+		self.max_entries = max_entries
+		self.ttl_seconds = ttl_seconds
+		self.is_dirty = False
+
 	def get_or_create_new(self, volume_id):
+		'''
+		Returns the entry for volume_id and marks it as in use, the caller must call release(entry) when done
+		'''
 		with self._lock:
-			volume_cache = self._dict.get(volume_id)
+			volume_cache = self._dict.pop(volume_id, None)
+			if volume_cache and not volume_cache.is_in_use() and self._is_expired(volume_cache, time.time()):
+				volume_cache = None
+
 			if not volume_cache:
 				volume_cache = VolumeCacheEntry(volume_id)
-				self._dict[volume_id] = volume_cache
+
+			# re-insert to move the entry to the end of the LRU order
+			self._dict[volume_id] = volume_cache
+			volume_cache.users += 1
+			volume_cache.last_access = time.time()
+			self._evict()
 
 			return volume_cache
 
+	def get(self, key, uuid=None):
+		with self._lock:
+			volume_cache = self._dict.pop(key, None)
+			if not volume_cache or (not volume_cache.is_in_use() and self._is_expired(volume_cache, time.time())):
+				return None
+
+			# re-insert to move the entry to the end of the LRU order
+			self._dict[key] = volume_cache
+			volume_cache.last_access = time.time()
+			return volume_cache
+
+	def add_if_missing(self, volume_id, csi_volume):
+		'''
+		Adds a volume that already exists in the management, returns False if the volume is already in the cache
+		'''
+		with self._lock:
+			volume_cache = self._dict.get(volume_id)
+			if volume_cache and (volume_cache.csi_volume or volume_cache.is_in_use()):
+				return False
+
+			volume_cache = VolumeCacheEntry(volume_id)
+			volume_cache.csi_volume = csi_volume
+			self._dict[volume_id] = volume_cache
+			self.is_dirty = True
+			self._evict()
+			return True
+
+	def release(self, volume_cache):
+		with self._lock:
+			volume_cache.users -= 1
+			self.is_dirty = True
+
+	def set(self, key, value):
+		with self._lock:
+			self._dict.pop(key, None)
+			self._dict[key] = value
+			self.is_dirty = True
+			self._evict()
+
+	def remove(self, key):
+		with self._lock:
+			self._dict.pop(key, None)
+			self.is_dirty = True
+
+	def remove_by_csi_volume_id(self, csi_volume_id):
+		'''
+		Removes the entries of the volume with this CO volume_id, used for volumes that are not cached by their own name (i.e claimed from a warm pool)
+		'''
+		with self._lock:
+			keys = [key for key, entry in self._dict.iteritems() if entry.csi_volume and entry.csi_volume.volume_id == csi_volume_id]
+			for key in keys:
+				del self._dict[key]
+
+			if keys:
+				self.is_dirty = True
+
+	def size(self):
+		with self._lock:
+			return len(self._dict)
+
+	def _is_expired(self, entry, now):
+		return self.ttl_seconds and now - entry.last_access > self.ttl_seconds
+
+	def _evict(self):
+		# must be called with self._lock held
+		now = time.time()
+		excess = len(self._dict) - self.max_entries if self.max_entries else 0
+		to_remove = []
+
+		# entries are ordered from the least recently used, so we can stop at the first entry that is not expired
+		# once we removed enough entries
+		for volume_id, entry in self._dict.iteritems():
+			if len(to_remove) >= excess and not self._is_expired(entry, now):
+				break
+
+			if entry.is_in_use():
+				continue
+
+			to_remove.append(volume_id)
+
+		for volume_id in to_remove:
+			del self._dict[volume_id]
+
+		if to_remove:
+			logger.debug('Evicted {} entries from VolumesCache'.format(len(to_remove)))
+
+	def save_snapshot(self, path):
+		with self._lock:
+			volumes = dict((volume_id, base64.b64encode(entry.csi_volume.SerializeToString()))
+							for volume_id, entry in self._dict.iteritems() if entry.csi_volume)
+			self.is_dirty = False
+
+		snapshot = {'version': SNAPSHOT_FORMAT_VERSION, 'volumes': volumes}
+
+		# write to a temp file and rename, so a crash while writing will not leave a corrupted snapshot
+		tmp_path = path + '.tmp'
+		with open(tmp_path, 'w') as f:
+			json.dump(snapshot, f, separators=(',', ':'))
+
+		os.rename(tmp_path, path)
+		logger.debug('Saved {} volumes to VolumesCache snapshot {}'.format(len(volumes), path))
+
+	def load_snapshot(self, path):
+		if not os.path.exists(path):
+			logger.info('VolumesCache snapshot {} does not exist'.format(path))
+			return 0
+
+		with open(path) as f:
+			snapshot = json.load(f)
+
+		if snapshot.get('version') != SNAPSHOT_FORMAT_VERSION:
+			logger.warning('Ignoring VolumesCache snapshot {} with unknown version {}'.format(path, snapshot.get('version')))
+			return 0
+
+		with self._lock:
+			for volume_id, serialized_volume in snapshot.get('volumes', {}).iteritems():
+				csi_volume = Volume()
+				csi_volume.ParseFromString(base64.b64decode(serialized_volume))
+				entry = VolumeCacheEntry(volume_id)
+				entry.csi_volume = csi_volume
+				self._dict[volume_id] = entry
+
+			self._evict()
+			count = len(self._dict)
+
+		logger.info('Loaded {} volumes from VolumesCache snapshot {}'.format(count, path))
+		return count
+
 
 class VolumeCacheEntry(object):
 	def __init__(self, volume_id):
 		self.volume_id = volume_id
 		self.lock = threading.Lock()
 		self.csi_volume = None
+		# the error of the last failed background creation (when ASYNC_CREATE_VOLUME is enabled)
+		self.error = None
+		# the number of times the creation of the volume was started, a retry of the request might find a volume created by a previous attempt
+		self.creation_attempts = 0
+		self.users = 0
+		self.last_access = time.time()
+
+	def is_in_use(self):
+		return self.users > 0 or self.lock.locked()
+
+
+class VolumesCacheSnapshotThread(threading.Thread):
+	'''
+	Writes the VolumesCache to disk every interval_seconds if it changed, and once more when stopped
+	'''
+	def __init__(self, volumes_cache, path, stop_event, interval_seconds):
+		threading.Thread.__init__(self)
+		self.name = 'volumes-cache-snapshot'
+		self.daemon = True
+		self.volumes_cache = volumes_cache
+		self.path = path
+		self.stop_event = stop_event
+		self.interval_seconds = interval_seconds
+
+	def run(self):
+		while not self.stop_event.wait(self.interval_seconds):
+			self.save_if_dirty()
+
+		self.save_if_dirty()
 
+	def save_if_dirty(self):
+		if not self.volumes_cache.is_dirty:
+			return
 
+		try:
+			self.volumes_cache.save_snapshot(self.path)
+		except Exception as ex:
+			logger.warning('Failed to save VolumesCache snapshot to {}. Error: {}'.format(self.path, ex))
@@ -2,6 +2,8 @@ import json
 import threading
 import logging
 
+from circuit_breaker import CircuitState, create_zone_circuit_breaker
+
 logger = logging.getLogger('topology')
 
 class SetEncoder(json.JSONEncoder):
@@ -16,8 +18,8 @@ class Topology(object):
 		self.nodes = {}
 		self.zones = {}
 		self.on_change_listeners = []
-		self.disabled_zones_lock = threading.Lock()
-		self.temp_disabled_zones = {}
+		self.circuit_breakers_lock = threading.Lock()
+		self.circuit_breakers = {}
 
 	def on_change(self):
 		for listener in self.on_change_listeners:
@@ -74,20 +76,41 @@ class Topology(object):
 		json_str = json.dumps(self.zones, cls=SetEncoder)
 		return json.loads(json_str)
 
-	def disable_zone(self, zone):
-		with self.disabled_zones_lock:
-			logger.warning('disabled_zones: zone {} disabled'.format(zone))
-			self.temp_disabled_zones[zone] = {}
+	def get_circuit_breaker(self, zone):
+		with self.circuit_breakers_lock:
+			breaker = self.circuit_breakers.get(zone)
+			if not breaker:
+				breaker = create_zone_circuit_breaker(zone)
+				self.circuit_breakers[zone] = breaker
+
+			return breaker
+
+	def get_circuit_breakers(self):
+		with self.circuit_breakers_lock:
+			return list(self.circuit_breakers.values())
+
+	def disable_zone(self, zone, reason='lost connection to management'):
+		self.get_circuit_breaker(zone).force_open(reason)
 
-	def make_sure_zone_enabled(self, zone):
-		with self.disabled_zones_lock:
-			if zone in self.temp_disabled_zones:
-				logger.info('disabled_zones: zone {} enabled'.format(zone))
-				del self.temp_disabled_zones[zone]
+	def make_sure_zone_enabled(self, zone, reason='connected to management'):
+		self.get_circuit_breaker(zone).force_close(reason)
 
 	def is_zone_disabled(self, zone):
-		with self.disabled_zones_lock:
-			return zone in self.temp_disabled_zones.keys()
+		return self.get_circuit_breaker(zone).is_open()
+
+	def allow_request_to_zone(self, zone):
+		return self.get_circuit_breaker(zone).allow_request()
+
+	def is_zone_healthy(self, zone):
+		# unlike allow_request_to_zone this does not take the trial request of a half-open zone,
+		# so it can be used by background requests that do not report their outcome to the circuit breaker
+		return self.get_circuit_breaker(zone).get_state() == CircuitState.CLOSED
+
+	def record_zone_success(self, zone):
+		self.get_circuit_breaker(zone).record_success()
+
+	def record_zone_failure(self, zone, reason):
+		self.get_circuit_breaker(zone).record_failure(reason)
 
 	def __str__(self):
 		return self.get_serializable_topology()
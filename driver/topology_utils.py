@@ -1,19 +1,26 @@
-import Queue
 import json
 import logging
 import random
 import threading
+import time
 
 from grpc import StatusCode
 
 import consts
 from NVMeshSDK.APIs.VolumeAPI import VolumeAPI
-from NVMeshSDK.ConnectionManager import ConnectionManager
+from NVMeshSDK.ConnectionManager import ConnectionManager, ConnectionManagerError
+from NVMeshSDK.RequestContext import RequestAbortedError
+from attach_detach_addon_to_sdk import NewClientAPI
 from common import DriverError
 from config import Config
 
 logger = logging.getLogger('topology-service')
 
+# weight of the latest sample in the moving averages of ZoneLatencyTracker
+LATENCY_EWMA_ALPHA = 0.2
+# DriverError codes that ZoneLatencyTracker counts as a failure of the zone
+ZONE_ERROR_CODES = [StatusCode.UNAVAILABLE, StatusCode.DEADLINE_EXCEEDED]
+
 class NodeNotFoundInTopology(Exception):
 	pass
 
@@ -196,7 +203,7 @@ class VolumeAPIPool(object):
 	def _create_new_volume_api(api_params):
 		sdk_logger = logging.getLogger('NVMeshSDK')
 		try:
-			volume_api = VolumeAPI(**api_params)
+			volume_api = VolumeAPI(fastEntities=True, **api_params)
 			return volume_api
 		except Exception as ex:
 			sdk_logger.error('Failed to create VolumeAPI with params: {}. \nError {}'.format(api_params, ex))
@@ -207,8 +214,141 @@ class VolumeAPIPool(object):
 		return VolumeAPIPool.__lock.locked()
 
 
+class ClientAPIPool(object):
+	'''
+	Reuses the ClientAPI of each management cluster on the node,
+	so NodeStageVolume and NodeUnstageVolume don't create a new API object (and resolve the DB UUID) on every call
+	'''
+	__lock = threading.Lock()
+	__api_dict = {}
+
+	@staticmethod
+	def get_client_api_for_zone(zone, log):
+		api_params = TopologyUtils.get_api_params(zone)
+		management_servers = api_params['managementServers']
+
+		with ClientAPIPool.__lock:
+			api = ClientAPIPool.__api_dict.get(management_servers)
+
+		if api:
+			log.debug('get_client_api_for_zone: got ClientAPI object from pool with mgmts: %s' % api.managementConnection.managementServers)
+			return api
+
+		# created outside of the lock since it includes HTTP calls which could take long if the server is unreachable
+		try:
+			new_api = NewClientAPI(**api_params)
+		except Exception as ex:
+			log.error('Failed to create ClientAPI with params: {}. \nError {}'.format(api_params, ex))
+			raise
+
+		with ClientAPIPool.__lock:
+			api = ClientAPIPool.__api_dict.setdefault(management_servers, new_api)
+
+		log.debug('get_client_api_for_zone: created new ClientAPI=%s from api_params %s' % (api.managementConnection.managementServers, api_params))
+		return api
+
+	@staticmethod
+	def clear():
+		with ClientAPIPool.__lock:
+			ClientAPIPool.__api_dict.clear()
+
+
+class ZoneStats(object):
+	def __init__(self, latency, is_error):
+		self.latency = latency
+		self.error_rate = 1.0 if is_error else 0.0
+		self.samples = 1
+
+	def add_sample(self, latency, is_error):
+		self.latency = LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * self.latency
+		self.error_rate = LATENCY_EWMA_ALPHA * (1.0 if is_error else 0.0) + (1 - LATENCY_EWMA_ALPHA) * self.error_rate
+		self.samples += 1
+
+	def get_score(self):
+		# lower is better, a zone that fails all requests is considered 20 times slower
+		return self.latency / max(0.05, 1 - self.error_rate)
+
+	def __repr__(self):
+		return 'ZoneStats(latency={:.3f}s, error_rate={:.2f}, samples={})'.format(self.latency, self.error_rate, self.samples)
+
+
+class ZoneRequestMeasurement(object):
+	def __init__(self, zone, batch_size=1):
+		self.zone = zone
+		self.batch_size = max(1, batch_size)
+		self.is_error = False
+		self.start_time = None
+
+	def __enter__(self):
+		self.start_time = time.time()
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		if isinstance(exc_val, RequestAbortedError):
+			# the caller gave up on the request, the time it took says nothing about the zone
+			return False
+
+		is_error = self.is_error or ZoneRequestMeasurement.is_zone_error(exc_val)
+		ZoneLatencyTracker.record(self.zone, (time.time() - self.start_time) / self.batch_size, is_error)
+		return False
+
+	@staticmethod
+	def is_zone_error(ex):
+		# only failures to reach the management or get a response from it count against the zone,
+		# errors about the request itself (i.e INVALID_ARGUMENT) would have failed on any zone
+		if isinstance(ex, DriverError):
+			return ex.code in ZONE_ERROR_CODES
+
+		return isinstance(ex, (ConnectionManagerError, EnvironmentError))
+
+
+class ZoneLatencyTracker(object):
+	'''
+	Keeps an exponentially weighted moving average of the latency and error rate of management requests for each zone
+	A request for N volumes (i.e a bulk save) is recorded as its latency divided by N, so zones that receive batched requests
+	are compared to the other zones by their latency per volume.
+	Usage:
+		with ZoneLatencyTracker.measure(zone, batch_size=len(volumes)) as measurement:
+			err, out = volume_api.save(volumes)
+			measurement.is_error = bool(err)
+	'''
+	__lock = threading.Lock()
+	__stats = {}
+
+	@staticmethod
+	def measure(zone, batch_size=1):
+		return ZoneRequestMeasurement(zone, batch_size)
+
+	@staticmethod
+	def record(zone, latency, is_error=False):
+		with ZoneLatencyTracker.__lock:
+			stats = ZoneLatencyTracker.__stats.get(zone)
+			if stats:
+				stats.add_sample(latency, is_error)
+			else:
+				ZoneLatencyTracker.__stats[zone] = ZoneStats(latency, is_error)
+
+	@staticmethod
+	def get_score(zone):
+		# returns None if there were no requests to this zone yet
+		with ZoneLatencyTracker.__lock:
+			stats = ZoneLatencyTracker.__stats.get(zone)
+			return stats.get_score() if stats else None
+
+	@staticmethod
+	def get_stats(zone):
+		with ZoneLatencyTracker.__lock:
+			return ZoneLatencyTracker.__stats.get(zone)
+
+	@staticmethod
+	def clear():
+		with ZoneLatencyTracker.__lock:
+			ZoneLatencyTracker.__stats.clear()
+
+
 class ZoneSelectionManager(object):
 	_zone_picker = None
+	_extra_policies = {}
 
 	@staticmethod
 	def get_instance():
@@ -217,6 +357,11 @@ class ZoneSelectionManager(object):
 
 		return ZoneSelectionManager._zone_picker
 
+	@staticmethod
+	def register_policy(selection_policy, picker_class):
+		# allows modules that depend on this one (i.e capacity) to add their own zone pickers
+		ZoneSelectionManager._extra_policies[selection_policy] = picker_class
+
 	@staticmethod
 	def _initialize_instance():
 		topology = Config.TOPOLOGY or {}
@@ -225,6 +370,10 @@ class ZoneSelectionManager(object):
 			return RandomZonePicker()
 		elif selection_policy == consts.ZoneSelectionPolicy.ROUND_ROBIN:
 			return RoundRobinZonePicker()
+		elif selection_policy == consts.ZoneSelectionPolicy.LATENCY_AWARE:
+			return LatencyAwareZonePicker()
+		elif selection_policy in ZoneSelectionManager._extra_policies:
+			return ZoneSelectionManager._extra_policies[selection_policy]()
 		else:
 			raise ValueError('Unknown zoneSelectionPolicy: %s ' % selection_policy)
 
@@ -248,17 +397,50 @@ class RandomZonePicker(ZonePicker):
 class RoundRobinZonePicker(ZonePicker):
 
 	def __init__(self):
-		self.zones_queue = Queue.Queue()
+		self.lock = threading.Lock()
+		self.zones = []
+		self.next_index = 0
 		self._build_queue()
 
 	def _build_queue(self):
 		topology_config = Config.TOPOLOGY
 		for zone in topology_config.get('zones').keys():
-			self.zones_queue.put(zone)
+			self.zones.append(zone)
 
-	def pick_zone(self, _unused):
-		zone = self.zones_queue.get()
-		self.zones_queue.put(zone)
-		return zone
+	def pick_zone(self, allowed_zones):
+		# If allowed_zones is empty all zones are allowed
+		with self.lock:
+			for i in range(len(self.zones)):
+				index = (self.next_index + i) % len(self.zones)
+				zone = self.zones[index]
+				if not allowed_zones or zone in allowed_zones:
+					self.next_index = (index + 1) % len(self.zones)
+					return zone
+
+		# none of the allowed zones is in the topology config
+		return random.choice(allowed_zones)
+
+
+class LatencyAwareZonePicker(ZonePicker):
+	'''
+	Picks a random allowed zone where the probability of each zone is inversely proportional to its latency score in ZoneLatencyTracker.
+	Slower zones are still picked once in a while so their score will be updated when they recover.
+	Zones without any requests yet get the best score of the other zones.
+	'''
+	def pick_zone(self, allowed_zones):
+		scores = [ZoneLatencyTracker.get_score(zone) for zone in allowed_zones]
+		known_scores = [score for score in scores if score is not None]
+
+		if not known_scores:
+			return random.choice(allowed_zones)
+
+		best_score = min(known_scores)
+		weights = [1.0 / max(score if score is not None else best_score, 0.001) for score in scores]
 
+		point = random.uniform(0, sum(weights))
+		for zone, weight in zip(allowed_zones, weights):
+			point -= weight
+			if point <= 0:
+				return zone
 
+		return allowed_zones[-1]
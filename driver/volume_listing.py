@@ -0,0 +1,143 @@
+import base64
+import json
+import logging
+import math
+
+logger = logging.getLogger('volume-listing')
+
+
+class InvalidListVolumesToken(ValueError):
+	pass
+
+
+class ListVolumesToken(object):
+	'''
+	The ListVolumes continuation token is an opaque (for the CO) base64 encoded json of {zone: last_volume_id_returned}.
+	A zone with a null cursor was not listed yet, a zone that is missing from the token was fully listed.
+	A token with a zone that is not in the topology (e.g. a token from before the zone was removed) is invalid.
+	'''
+	@staticmethod
+	def encode(cursors):
+		if not cursors:
+			return ''
+
+		return base64.urlsafe_b64encode(json.dumps(cursors, sort_keys=True, separators=(',', ':')))
+
+	@staticmethod
+	def decode(token, all_zones):
+		if not token:
+			return dict((zone, None) for zone in all_zones)
+
+		try:
+			cursors = json.loads(base64.urlsafe_b64decode(str(token)))
+		except (TypeError, ValueError) as ex:
+			raise InvalidListVolumesToken('Invalid starting_token {}. Error: {}'.format(token, ex))
+
+		if not isinstance(cursors, dict):
+			raise InvalidListVolumesToken('Invalid starting_token {}'.format(token))
+
+		unknown_zones = [zone for zone in cursors if zone not in all_zones]
+		if unknown_zones:
+			raise InvalidListVolumesToken('Invalid starting_token {}, zones {} are not in the topology'.format(token, ', '.join(sorted(unknown_zones))))
+
+		return cursors
+
+
+class ZoneListing(object):
+	'''
+	The listing state of a single zone within a ListVolumes call
+	'''
+	def __init__(self, zone, cursor):
+		self.zone = zone
+		# the _id of the last volume returned from this zone
+		self.cursor = cursor
+		# the _id of the last volume fetched from this zone
+		self.fetch_cursor = cursor
+		self.page = []
+		self.consumed = 0
+		self.is_exhausted = False
+		# the error of the last fetch, the zone is not fetched again in this call and its cursor is returned in the next token
+		self.error = None
+
+	def has_buffered(self):
+		return self.consumed < len(self.page)
+
+	def has_more(self):
+		return self.has_buffered() or not self.is_exhausted
+
+	def set_page(self, page, limit):
+		self.page = page
+		self.consumed = 0
+		self.is_exhausted = not limit or len(page) < limit
+		if page:
+			self.fetch_cursor = page[-1]._id
+
+	def pop(self):
+		volume = self.page[self.consumed]
+		self.consumed += 1
+		self.cursor = volume._id
+		return volume
+
+
+class MultiZoneVolumeLister(object):
+	'''
+	Lists volumes from all zones concurrently.
+	fetch_page_func(zone, after_id, limit) should return up to limit volumes (or all volumes if limit is 0) with _id greater than after_id sorted by _id.
+	Each zone is paged with its own keyset cursor so pages of different zones can be fetched in parallel,
+	the results are merged round-robin so every page includes volumes from all zones that still have volumes.
+	Each zone is asked only for its share of max_entries (plus ZONE_PAGE_MARGIN), and is asked for more only after it ran out of fetched volumes
+	while the page is not full yet, so the managements are not asked for volumes that are thrown away.
+	A zone that failed is skipped and keeps its cursor, so it is listed by the next calls. The error is raised only if no volumes could be listed.
+	'''
+	ZONE_PAGE_MARGIN = 1
+
+	def __init__(self, fetch_page_func, executor):
+		self.fetch_page_func = fetch_page_func
+		self.executor = executor
+
+	def list_volumes(self, cursors, max_entries):
+		listings = [ZoneListing(zone, cursors[zone]) for zone in sorted(cursors.keys())]
+		entries = []
+
+		def is_full():
+			return max_entries and len(entries) >= max_entries
+
+		while not is_full():
+			listings_to_fetch = [listing for listing in listings if not listing.has_buffered() and not listing.is_exhausted and not listing.error]
+			if listings_to_fetch:
+				self._fetch_pages(listings_to_fetch, listings, max_entries - len(entries) if max_entries else 0)
+
+			added = False
+			for listing in listings:
+				if is_full():
+					break
+
+				if listing.has_buffered():
+					entries.append((listing.zone, listing.pop()))
+					added = True
+
+			if not added:
+				break
+
+		failed_listings = [listing for listing in listings if listing.error]
+		if failed_listings and not entries:
+			raise failed_listings[0].error
+
+		next_cursors = dict((listing.zone, listing.cursor) for listing in listings if listing.has_more())
+		return entries, next_cursors
+
+	def _fetch_pages(self, listings_to_fetch, listings, remaining_entries):
+		if remaining_entries:
+			active_zones_count = len([listing for listing in listings if listing.has_more() and not listing.error]) or 1
+			limit = int(math.ceil(float(remaining_entries) / active_zones_count)) + MultiZoneVolumeLister.ZONE_PAGE_MARGIN
+		else:
+			limit = 0
+
+		futures_by_zone = dict((listing.zone, self.executor.submit(self.fetch_page_func, listing.zone, listing.fetch_cursor, limit)) for listing in listings_to_fetch)
+
+		for listing in listings_to_fetch:
+			try:
+				listing.set_page(list(futures_by_zone[listing.zone].result()), limit)
+			except Exception as ex:
+				logger.warning('Failed to list volumes in zone {}, skipping it. Error: {}'.format(listing.zone, ex))
+				listing.error = ex
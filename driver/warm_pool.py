@@ -0,0 +1,306 @@
+import collections
+import logging
+import threading
+import uuid
+
+from NVMeshSDK.MongoObj import MongoObj
+
+import consts as Consts
+from admission_control import ZoneAdmissionControl
+from bulk_requests import ZoneRequestBatcher
+from capacity import ZoneCapacityCache, get_all_zones
+from config import Config
+from topology_utils import VolumeAPIPool, ZoneLatencyTracker
+
+logger = logging.getLogger('warm-pool')
+
+POOL_VOLUME_NAME_PREFIX = 'csi-pool-'
+WARM_POOL_METADATA_KEY = 'warm_pool'
+DEFAULT_REFILL_INTERVAL_SECONDS = 30
+
+
+class WarmPoolDefinition(object):
+	'''
+	A set of StorageClass parameters and a capacity for which `size` volumes are kept pre-created in each zone.
+	A CreateVolume request is served from the pool only if its parameters and its required capacity are exactly the same as the pool's,
+	so a retry of the request will get the same response as if the volume was created by the request.
+	'''
+	def __init__(self, name, parameters, capacity, size, zones=None):
+		self.name = name
+		self.parameters = parameters or {}
+		self.capacity = capacity
+		self.size = size
+		self.zones = zones
+
+	def matches(self, parameters, capacity):
+		return self.capacity == capacity and self.parameters == parameters
+
+	def get_zones(self):
+		return self.zones or get_all_zones()
+
+	@staticmethod
+	def from_dict(pool_dict):
+		for key in ['name', 'capacity', 'size']:
+			if key not in pool_dict:
+				raise ValueError('warm volume pool {} is missing the "{}" field'.format(pool_dict, key))
+
+		# parameters from the StorageClass are always strings
+		parameters = dict((key, str(value)) for key, value in pool_dict.get('parameters', {}).items())
+		return WarmPoolDefinition(pool_dict['name'], parameters, int(pool_dict['capacity']), int(pool_dict['size']), pool_dict.get('zones'))
+
+	def __repr__(self):
+		return 'WarmPoolDefinition(name={}, capacity={}, size={}, parameters={})'.format(self.name, self.capacity, self.size, self.parameters)
+
+
+class WarmVolumePool(object):
+	'''
+	The ready volumes of a single pool definition in a single zone
+	'''
+	def __init__(self, definition, zone):
+		self.definition = definition
+		self.zone = zone
+		self.volumes = collections.deque()
+		self.creating = 0
+
+	def get_missing_count(self):
+		return max(0, self.definition.size - len(self.volumes) - self.creating)
+
+
+class WarmVolumePoolManager(object):
+	'''
+	Keeps pre-created volumes for every WarmPoolDefinition in every zone.
+	CreateVolume claims a ready volume by replacing its csi_metadata, which is much faster than allocating a new volume.
+	The WarmVolumePoolRefillThread creates new volumes in the background to replace the claimed ones.
+
+	volume_factory(name, definition, csi_metadata) should return an NVMesh Volume entity for the given pool definition.
+	is_zone_healthy(zone) should return False for zones that the pools should not send requests to.
+	'''
+	def __init__(self, definitions, volume_factory, is_zone_healthy=None):
+		self.definitions = definitions
+		self.volume_factory = volume_factory
+		self.is_zone_healthy = is_zone_healthy or (lambda zone: True)
+		self.lock = threading.Lock()
+		self.pools = {}
+		self.refill_event = threading.Event()
+
+	def is_enabled(self):
+		return bool(self.definitions)
+
+	def find_definition(self, parameters, capacity):
+		for definition in self.definitions:
+			if definition.matches(parameters, capacity):
+				return definition
+
+		return None
+
+	def get_pool(self, definition, zone):
+		with self.lock:
+			key = (definition.name, zone)
+			if key not in self.pools:
+				self.pools[key] = WarmVolumePool(definition, zone)
+
+			return self.pools[key]
+
+	def get_pools(self):
+		pools = []
+		for definition in self.definitions:
+			for zone in definition.get_zones():
+				pools.append(self.get_pool(definition, zone))
+
+		return pools
+
+	def claim(self, parameters, capacity, csi_metadata, allowed_zones, log=None):
+		'''
+		Returns (volume, zone) of a pool volume that now belongs to the request, or None if no matching volume is ready
+		'''
+		log = log or logger
+		definition = self.find_definition(parameters, capacity)
+		if not definition:
+			return None
+
+		while True:
+			pool_volume = self._pop_ready_volume(definition, allowed_zones)
+			if not pool_volume:
+				log.debug('No ready volumes in warm pool {}'.format(definition.name))
+				return None
+
+			volume, zone = pool_volume
+
+			# a volume was taken from the pool, in any case the pool should be refilled
+			self.refill_event.set()
+
+			volume.csi_metadata = dict(csi_metadata)
+			volume.csi_metadata['zone'] = zone
+
+			err = self._update_volume(zone, volume, log)
+			if not err:
+				log.info('Claimed volume {} from warm pool {} in zone {}'.format(volume.name, definition.name, zone))
+				return volume, zone
+
+			# we don't know if the update reached the management, so the volume is not returned to the pool
+			log.warning('Failed to claim volume {} from warm pool {} in zone {}. Error: {}'.format(volume.name, definition.name, zone, err))
+
+	def find_claimed_volume(self, parameters, capacity, csi_name, allowed_zones, log=None):
+		'''
+		Returns (volume, zone) of a volume that was already claimed for the request with this csi_name, or None.
+		A claimed volume keeps its pool name, so a retry of the request cannot rely on the volume name for idempotency,
+		and if the VolumesCache entry of the request was evicted (or the controller restarted) the managements are asked instead.
+		Raises the error of a zone that could not be searched, since the volume might have been claimed in that zone.
+		'''
+		log = log or logger
+		definition = self.find_definition(parameters, capacity)
+		if not definition:
+			return None
+
+		filterObj = [MongoObj(field='csi_metadata.csi_name', value=csi_name)]
+		for zone in self._get_allowed_zones(definition, allowed_zones):
+			volumes = self._get_volumes(zone, filterObj)
+			if volumes:
+				return volumes[0], zone
+
+		return None
+
+	def _get_allowed_zones(self, definition, allowed_zones):
+		return [zone for zone in definition.get_zones() if not allowed_zones or zone in allowed_zones]
+
+	def _pop_ready_volume(self, definition, allowed_zones):
+		zones = self._get_allowed_zones(definition, allowed_zones)
+		pools = [self.get_pool(definition, zone) for zone in zones if self.is_zone_healthy(zone)]
+
+		with self.lock:
+			pools_with_volumes = [pool for pool in pools if pool.volumes]
+			if not pools_with_volumes:
+				return None
+
+			# take from the fullest pool to keep the pools balanced between the zones
+			pool = max(pools_with_volumes, key=lambda p: len(p.volumes))
+			return pool.volumes.popleft(), pool.zone
+
+	def refill(self, log=None):
+		log = log or logger
+		for pool in self.get_pools():
+			if not self.is_zone_healthy(pool.zone):
+				continue
+
+			try:
+				self._refill_pool(pool, log)
+			except Exception as ex:
+				log.warning('Failed to refill warm pool {} in zone {}. Error: {}'.format(pool.definition.name, pool.zone, ex))
+
+	def _refill_pool(self, pool, log):
+		with self.lock:
+			count = min(pool.get_missing_count(), Config.MAX_VOLUMES_PER_BATCH or 50)
+			pool.creating += count
+
+		if not count:
+			return
+
+		try:
+			volumes = []
+			for _ in range(count):
+				csi_metadata = {WARM_POOL_METADATA_KEY: pool.definition.name, 'zone': pool.zone}
+				volumes.append(self.volume_factory(self._generate_volume_name(), pool.definition, csi_metadata))
+
+			log.debug('Creating {} volumes for warm pool {} in zone {}'.format(count, pool.definition.name, pool.zone))
+			created = self._save_volumes(pool.zone, volumes, log)
+		finally:
+			with self.lock:
+				pool.creating -= count
+
+		with self.lock:
+			pool.volumes.extend(created)
+
+		if created:
+			ZoneCapacityCache.consume(pool.zone, pool.definition.capacity * len(created))
+
+	def load_existing_volumes(self, log=None):
+		'''
+		Adds the unclaimed pool volumes that were created before the controller was restarted
+		'''
+		log = log or logger
+		for pool in self.get_pools():
+			try:
+				volumes = self._find_unclaimed_volumes(pool.zone, pool.definition)
+			except Exception as ex:
+				log.warning('Failed to load existing volumes of warm pool {} in zone {}. Error: {}'.format(pool.definition.name, pool.zone, ex))
+				continue
+
+			volumes = [v for v in volumes if v.capacity == pool.definition.capacity]
+			with self.lock:
+				known = set(v.name for v in pool.volumes)
+				pool.volumes.extend([v for v in volumes if v.name not in known])
+
+			log.info('Loaded {} existing volumes of warm pool {} in zone {}'.format(len(volumes), pool.definition.name, pool.zone))
+
+	def _generate_volume_name(self):
+		return POOL_VOLUME_NAME_PREFIX + uuid.uuid4().hex[:13]
+
+	def _save_volumes(self, zone, volumes, log):
+		volume_api = VolumeAPIPool.get_volume_api_for_zone(zone, log)
+		with ZoneAdmissionControl.admit(zone, Consts.ManagementRPC.SAVE), ZoneLatencyTracker.measure(zone, batch_size=len(volumes)) as measurement:
+			err, data = volume_api.save(volumes)
+			measurement.is_error = bool(err)
+
+		if err:
+			raise ValueError(err)
+
+		results = ZoneRequestBatcher.map_results_by_id([volume.name for volume in volumes], data)
+		return [volume for volume, result in zip(volumes, results) if result and result.get('success')]
+
+	def _update_volume(self, zone, volume, log):
+		volume_api = VolumeAPIPool.get_volume_api_for_zone(zone, log)
+		with ZoneAdmissionControl.admit(zone, Consts.ManagementRPC.UPDATE), ZoneLatencyTracker.measure(zone) as measurement:
+			err, data = volume_api.update([volume])
+			measurement.is_error = bool(err)
+
+		if not err and not (isinstance(data, list) and data and data[0].get('success')):
+			err = data
+
+		return err
+
+	def _find_unclaimed_volumes(self, zone, definition):
+		filterObj = [
+			MongoObj(field='csi_metadata.' + WARM_POOL_METADATA_KEY, value=definition.name),
+			MongoObj(field='csi_metadata.csi_name', value={'$exists': 0})
+		]
+
+		return self._get_volumes(zone, filterObj)
+
+	def _get_volumes(self, zone, filterObj):
+		volume_api = VolumeAPIPool.get_volume_api_for_zone(zone, logger)
+		err, volumes = volume_api.get(filter=filterObj)
+		if err:
+			raise ValueError(err)
+
+		return volumes
+
+
+def parse_warm_pool_definitions(pools_config):
+	if not pools_config:
+		return []
+
+	return [WarmPoolDefinition.from_dict(pool_dict) for pool_dict in pools_config]
+
+
+class WarmVolumePoolRefillThread(threading.Thread):
+	'''
+	Refills the warm pools every interval_seconds, or immediately after a volume was claimed
+	'''
+	def __init__(self, manager, stop_event, interval_seconds):
+		threading.Thread.__init__(self)
+		self.name = 'warm-pool-refill'
+		self.daemon = True
+		self.manager = manager
+		self.stop_event = stop_event
+		self.interval_seconds = interval_seconds or DEFAULT_REFILL_INTERVAL_SECONDS
+		self.logger = logger.getChild('refill')
+
+	def run(self):
+		self.manager.load_existing_volumes(self.logger)
+
+		while not self.stop_event.is_set():
+			self.manager.refill_event.clear()
+			self.manager.refill(self.logger)
+			self.manager.refill_event.wait(self.interval_seconds)
+
+		self.logger.info('Warm pool refill thread stopped')
@@ -3,6 +3,7 @@ import logging
 
 from websocket import WebSocketConnectionClosedException
 
+from NVMeshSDK.APIs.BaseClassAPI import IterateError
 from NVMeshSDK.APIs.ClientAPI import ClientAPI
 from NVMeshSDK.MongoObj import MongoObj
 from common import BackoffDelayWithStopEvent
@@ -127,7 +128,7 @@ class ZoneTopologyFetcherThread(threading.Thread):
 		api_params = self.get_api_params(management_info)
 
 		self.logger.debug('Creating API from servers %s ' % api_params['managementServers'])
-		api = ClientAPI(**api_params)
+		api = ClientAPI(fastEntities=True, **api_params)
 
 		# Verify Management version Compatible
 		self.version_validator.fetch_and_validate_nvmesh_mgmt_version(api)
@@ -138,12 +139,10 @@ class ZoneTopologyFetcherThread(threading.Thread):
 			MongoObj(field='client_status', value=1)
 		]
 
-		err, results = api.get(projection=projection)
-		if err:
-			raise Exception(str(err))
-
-		node_ids = [client.client_id for client in results]
-		return list(node_ids)
+		try:
+			return [client.client_id for client in api.iterate(projection=projection, pageSize=Config.MANAGEMENT_PAGE_SIZE or 1000)]
+		except IterateError as ex:
+			raise Exception(str(ex.err))
 
 	def get_ws_servers_list(self, mgmt_info):
 		ws_port = mgmt_info.get('ws_port', 4001)
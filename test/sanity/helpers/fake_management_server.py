@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+
+
+class FakeManagementServer(object):
+	'''
+	A minimal HTTP management server for SDK connection tests.
+	Every route returns an empty JSON list unless a response was set with set_response(route, status, body, headers).
+	With require_session set, /login sets a session cookie and other routes return 401 to requests without the cookie of the current session.
+	'''
+	def __init__(self):
+		self.requests = []
+		self.responses = {}
+		self.delay = 0
+		self.lock = threading.Lock()
+		self.in_flight = 0
+		self.max_in_flight = 0
+		self.require_session = False
+		self.session_number = 0
+		self.server = _ThreadingHTTPServer(('127.0.0.1', 0), self._create_handler())
+		self.thread = threading.Thread(target=self.server.serve_forever)
+		self.thread.daemon = True
+
+	@property
+	def url(self):
+		return 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+	def start(self):
+		self.thread.start()
+		return self
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def set_response(self, route, status=200, body=None, headers=None, times=None):
+		self.responses[route] = {'status': status, 'body': body if body is not None else [], 'headers': headers or {}, 'times': times}
+
+	def expire_session(self):
+		with self.lock:
+			self.session_number += 1
+
+	def _get_session_cookie(self):
+		with self.lock:
+			return 'session={}-{}'.format(self.server.server_address[1], self.session_number)
+
+	def count_requests(self, route):
+		with self.lock:
+			return len([r for r in self.requests if r == route])
+
+	def _get_response(self, route):
+		with self.lock:
+			self.requests.append(route)
+			response = self.responses.get(route)
+			if response and response['times'] is not None:
+				response['times'] -= 1
+				if response['times'] < 0:
+					del self.responses[route]
+					response = None
+
+		return response or {'status': 200, 'body': [], 'headers': {}}
+
+	def _create_handler(self):
+		fake_server = self
+
+		class Handler(BaseHTTPRequestHandler):
+			def _handle(self):
+				route = self.path.split('?')[0]
+				length = int(self.headers.getheader('content-length') or 0)
+				if length:
+					self.rfile.read(length)
+
+				with fake_server.lock:
+					fake_server.in_flight += 1
+					fake_server.max_in_flight = max(fake_server.max_in_flight, fake_server.in_flight)
+
+				try:
+					if fake_server.delay:
+						time.sleep(fake_server.delay)
+
+					response = fake_server._get_response(route)
+					headers = dict(response['headers'])
+					if fake_server.require_session:
+						session_cookie = fake_server._get_session_cookie()
+						if route == '/login':
+							headers['Set-Cookie'] = session_cookie + '; Path=/'
+						elif route != '/isAlive' and session_cookie not in (self.headers.getheader('Cookie') or ''):
+							response = {'status': 401, 'body': {'message': 'not logged in'}}
+
+					body = json.dumps(response['body'])
+					self.send_response(response['status'])
+					self.send_header('Content-Type', 'application/json')
+					self.send_header('Content-Length', str(len(body)))
+					for key, value in headers.items():
+						self.send_header(key, value)
+					self.end_headers()
+					self.wfile.write(body)
+				finally:
+					with fake_server.lock:
+						fake_server.in_flight -= 1
+
+			def do_GET(self):
+				self._handle()
+
+			def do_POST(self):
+				self._handle()
+
+			def log_message(self, format, *args):
+				pass
+
+		# keep-alive connections, like the management
+		Handler.protocol_version = 'HTTP/1.1'
+		return Handler
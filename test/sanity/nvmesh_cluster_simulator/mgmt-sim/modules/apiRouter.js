@@ -23,9 +23,26 @@ router.get('/version', function(req, res) {
 	res.json("version=\"2.0.2-mgmt-sim\"\ncommit=\"mgmt-sim\"\nchangeID=\"mgmt-sim\"\nbranch=\"HEAD\"\n");
 });
 
-router.get('/volumes/all/0/0', function(req,res) {
+router.get('/volumes/all/:page/:count', function(req,res) {
     var volumes = app.get('sim-data').volumes;
     var listOfVolumes = Object.values(volumes);
+
+    // minimal support for the keyset pagination used by ListVolumes: filter={"_id":{"$gt":..}} and sort={"_id":1}
+    var filter = req.query.filter ? JSON.parse(req.query.filter) : {};
+    if (filter._id && filter._id.$gt) {
+        listOfVolumes = listOfVolumes.filter(v => v._id > filter._id.$gt);
+    }
+
+    if (req.query.sort) {
+        listOfVolumes.sort((a, b) => a._id < b._id ? -1 : (a._id > b._id ? 1 : 0));
+    }
+
+    var page = parseInt(req.params.page);
+    var count = parseInt(req.params.count);
+    if (count > 0) {
+        listOfVolumes = listOfVolumes.slice(page * count, (page + 1) * count);
+    }
+
     res.json(listOfVolumes);
 });
 
@@ -0,0 +1,91 @@
+import threading
+import time
+import unittest
+
+from grpc import StatusCode
+
+from NVMeshSDK.RequestContext import RequestContext, RequestAbortedError
+from driver import admission_control
+from driver.admission_control import AdmissionLimiter, NoLimit, ZoneAdmissionControl
+from driver.common import DriverError
+
+
+class TestAdmissionLimiter(unittest.TestCase):
+	def test_rejects_when_the_queue_is_full(self):
+		limiter = AdmissionLimiter('test', max_concurrent=1, max_queue_size=0, queue_timeout=1)
+		limiter.acquire()
+
+		with self.assertRaises(DriverError) as cm:
+			limiter.acquire()
+
+		self.assertEqual(cm.exception.code, StatusCode.RESOURCE_EXHAUSTED)
+		self.assertEqual(limiter.get_metrics()['rejected'], 1)
+
+		limiter.release()
+		limiter.acquire()
+
+	def test_queued_request_times_out(self):
+		limiter = AdmissionLimiter('test', max_concurrent=1, max_queue_size=1, queue_timeout=0.1)
+		limiter.acquire()
+		self.assertRaises(DriverError, limiter.acquire)
+		self.assertEqual(limiter.get_metrics()['waiting'], 0)
+
+	def test_queued_request_stops_at_request_deadline(self):
+		limiter = AdmissionLimiter('test', max_concurrent=1, max_queue_size=1, queue_timeout=10)
+		limiter.acquire()
+
+		start = time.time()
+		with RequestContext.scope(timeRemaining=0.2):
+			self.assertRaises(RequestAbortedError, limiter.acquire)
+
+		self.assertLess(time.time() - start, 2)
+		self.assertEqual(limiter.get_metrics()['waiting'], 0)
+
+		cancelled = threading.Event()
+		threading.Timer(0.1, cancelled.set).start()
+		with RequestContext.scope(isCancelled=cancelled.is_set):
+			with self.assertRaises(RequestAbortedError) as cm:
+				limiter.acquire()
+
+		self.assertTrue(cm.exception.isCancelled)
+
+	def test_queued_request_gets_a_slot(self):
+		limiter = AdmissionLimiter('test', max_concurrent=1, max_queue_size=1, queue_timeout=5)
+		limiter.acquire()
+		admitted = threading.Event()
+
+		def waiting_request():
+			with limiter:
+				admitted.set()
+
+		t = threading.Thread(target=waiting_request)
+		t.start()
+		self.assertFalse(admitted.wait(0.1))
+
+		limiter.release()
+		t.join()
+		self.assertTrue(admitted.is_set())
+		self.assertEqual(limiter.get_metrics()['in_flight'], 0)
+
+
+class TestZoneAdmissionControl(unittest.TestCase):
+	def setUp(self):
+		ZoneAdmissionControl.clear()
+		admission_control.Config.MANAGEMENT_CONCURRENCY_LIMITS = {'save': 2, 'zones': {'zone_1': {'save': 1}}}
+
+	def tearDown(self):
+		ZoneAdmissionControl.clear()
+		admission_control.Config.MANAGEMENT_CONCURRENCY_LIMITS = None
+
+	def test_per_zone_limits(self):
+		self.assertEqual(ZoneAdmissionControl.get_limit('zone_1', 'save'), 1)
+		self.assertEqual(ZoneAdmissionControl.get_limit('zone_2', 'save'), 2)
+		self.assertIsNone(ZoneAdmissionControl.get_limit('zone_2', 'delete'))
+		self.assertIsInstance(ZoneAdmissionControl.admit('zone_2', 'delete'), NoLimit)
+
+		limiter = ZoneAdmissionControl.admit('zone_1', 'save')
+		self.assertIs(ZoneAdmissionControl.admit('zone_1', 'save'), limiter)
+		self.assertEqual(limiter.max_concurrent, 1)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,147 @@
+import threading
+import time
+import unittest
+
+from NVMeshSDK.RequestContext import RequestContext
+from driver.bulk_requests import ZoneRequestBatcher, BatchItem
+
+
+class TestZoneRequestBatcher(unittest.TestCase):
+	def _submit_in_threads(self, batcher, zone_and_keys):
+		results = {}
+		errors = {}
+
+		def submit(zone, key):
+			try:
+				results[key] = batcher.submit(zone, key, key)
+			except Exception as ex:
+				errors[key] = ex
+
+		threads = [threading.Thread(target=submit, args=(zone, key)) for zone, key in zone_and_keys]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+
+		return results, errors
+
+	def test_concurrent_items_are_sent_in_one_batch(self):
+		calls = []
+
+		def execute(zone, items):
+			calls.append((zone, [item.key for item in items]))
+			for item in items:
+				item.set_result('saved-' + item.payload)
+
+		batcher = ZoneRequestBatcher('test', execute, window_ms=300, max_batch_size=50)
+		results, errors = self._submit_in_threads(batcher, [('A', 'vol-%d' % i) for i in range(10)])
+
+		self.assertEqual(len(calls), 1)
+		self.assertEqual(sorted(calls[0][1]), sorted(['vol-%d' % i for i in range(10)]))
+		self.assertEqual(results['vol-3'], 'saved-vol-3')
+		self.assertFalse(errors)
+
+	def test_batches_are_per_zone(self):
+		calls = []
+
+		def execute(zone, items):
+			calls.append(zone)
+			for item in items:
+				item.set_result(zone)
+
+		batcher = ZoneRequestBatcher('test', execute, window_ms=300, max_batch_size=50)
+		results, errors = self._submit_in_threads(batcher, [('A', 'a1'), ('B', 'b1'), ('A', 'a2'), ('B', 'b2')])
+
+		self.assertEqual(sorted(calls), ['A', 'B'])
+		self.assertEqual(results['a2'], 'A')
+		self.assertEqual(results['b1'], 'B')
+
+	def test_full_batch_is_sent_without_waiting_for_the_window(self):
+		def execute(zone, items):
+			for item in items:
+				item.set_result(len(items))
+
+		batcher = ZoneRequestBatcher('test', execute, window_ms=10000, max_batch_size=2)
+		start = time.time()
+		results, errors = self._submit_in_threads(batcher, [('A', 'v1'), ('A', 'v2')])
+
+		self.assertLess(time.time() - start, 5)
+		self.assertEqual(results, {'v1': 2, 'v2': 2})
+
+	def test_exception_is_raised_for_all_items(self):
+		def execute(zone, items):
+			raise ValueError('management is down')
+
+		batcher = ZoneRequestBatcher('test', execute, window_ms=200, max_batch_size=10)
+		results, errors = self._submit_in_threads(batcher, [('A', 'v1'), ('A', 'v2')])
+
+		self.assertFalse(results)
+		self.assertEqual(len(errors), 2)
+		self.assertIn('management is down', str(errors['v1']))
+
+	def test_item_without_result_gets_an_error(self):
+		def execute(zone, items):
+			items[0].set_result('ok')
+
+		batcher = ZoneRequestBatcher('test', execute, window_ms=1, max_batch_size=1)
+		self.assertEqual(batcher.submit('A', 'v1', 'v1'), 'ok')
+		self.assertFalse(batcher.is_enabled())
+
+	def test_batch_is_not_aborted_with_the_leader(self):
+		def execute(zone, items):
+			RequestContext.checkCurrent()
+			for item in items:
+				item.set_result('saved-' + item.payload)
+
+		batcher = ZoneRequestBatcher('test', execute, window_ms=200, max_batch_size=2)
+		results = {}
+
+		def submit_as_follower():
+			with RequestContext.scope(timeRemaining=10):
+				results['vol-2'] = batcher.submit('A', 'vol-2', 'vol-2')
+
+		follower = threading.Timer(0.05, submit_as_follower)
+		follower.start()
+		with RequestContext.scope(isCancelled=lambda: True):
+			results['vol-1'] = batcher.submit('A', 'vol-1', 'vol-1')
+
+		follower.join()
+		self.assertEqual(results, {'vol-1': 'saved-vol-1', 'vol-2': 'saved-vol-2'})
+
+	def test_batch_context(self):
+		with RequestContext.scope(timeRemaining=1, isCancelled=lambda: True):
+			cancelled = BatchItem('v1', None)
+
+		with RequestContext.scope(timeRemaining=10):
+			active = BatchItem('v2', None)
+
+		context = ZoneRequestBatcher.create_batch_context([cancelled, active])
+		self.assertFalse(context.isCancelled())
+		self.assertGreater(context.getTimeRemaining(), 5)
+		self.assertTrue(ZoneRequestBatcher.create_batch_context([cancelled]).isCancelled())
+		self.assertIsNone(ZoneRequestBatcher.create_batch_context([active, BatchItem('v3', None)]))
+
+	def test_map_results_by_id(self):
+		items = ['v1', 'v2']
+
+		by_id = ZoneRequestBatcher.map_results_by_id(items, [{'_id': 'v2', 'success': True}, {'_id': 'v1', 'success': False}])
+		self.assertEqual(by_id[0]['success'], False)
+		self.assertEqual(by_id[1]['success'], True)
+
+		by_position = ZoneRequestBatcher.map_results_by_id(items, [{'success': True}, {'success': False}])
+		self.assertEqual(by_position[1]['success'], False)
+
+		missing = ZoneRequestBatcher.map_results_by_id(items, [{'_id': 'v1', 'success': True}])
+		self.assertIsNone(missing[1])
+
+		# a response with ids is never matched by position, even when it has one result for each key
+		mismatched = ZoneRequestBatcher.map_results_by_id(items, [{'_id': 'v1', 'success': True}, {'_id': 'v3', 'success': True}])
+		self.assertEqual(mismatched[0]['_id'], 'v1')
+		self.assertIsNone(mismatched[1])
+
+	def test_unique_keys(self):
+		items = [BatchItem('v1', None), BatchItem('v2', None), BatchItem('v1', None)]
+		self.assertEqual(ZoneRequestBatcher.unique_keys(items), ['v1', 'v2'])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+
+from driver import capacity
+from driver.capacity import ZoneCapacityCache, ZoneReservations, MostFreeSpaceZonePicker, WeightedZonePicker
+
+
+class TestZoneCapacityCache(unittest.TestCase):
+	def setUp(self):
+		self.fetch_calls = []
+		self.fetch_error = None
+		self.original_fetch = ZoneCapacityCache._fetch_zone_capacity
+		self.original_ttl = capacity.Config.CAPACITY_CACHE_TTL_SECONDS
+
+		def fetch(zone):
+			self.fetch_calls.append(zone)
+			if self.fetch_error:
+				raise self.fetch_error
+			return 1000, 400
+
+		ZoneCapacityCache._fetch_zone_capacity = staticmethod(fetch)
+		ZoneCapacityCache.clear()
+
+	def tearDown(self):
+		ZoneCapacityCache._fetch_zone_capacity = staticmethod(self.original_fetch)
+		capacity.Config.CAPACITY_CACHE_TTL_SECONDS = self.original_ttl
+		ZoneCapacityCache.clear()
+
+	def test_fresh_entry_is_served_from_memory(self):
+		capacity.Config.CAPACITY_CACHE_TTL_SECONDS = 60
+		ZoneCapacityCache.refresh('A')
+
+		entry = ZoneCapacityCache.get_or_refresh('A')
+		self.assertEqual(entry.free_space, 400)
+		self.assertEqual(entry.total_space, 1000)
+		self.assertEqual(self.fetch_calls, ['A'])
+
+	def test_missing_entry_is_fetched_on_demand(self):
+		entry = ZoneCapacityCache.get_or_refresh('B')
+		self.assertEqual(entry.free_space, 400)
+		self.assertEqual(self.fetch_calls, ['B'])
+
+	def test_stale_entry_is_returned_if_refresh_fails(self):
+		ZoneCapacityCache.set('A', 1000, 123)
+		capacity.Config.CAPACITY_CACHE_TTL_SECONDS = -1
+		self.fetch_error = ValueError('zone is down')
+
+		entry = ZoneCapacityCache.get_or_refresh('A')
+		self.assertEqual(entry.free_space, 123)
+		self.assertEqual(self.fetch_calls, ['A'])
+
+	def test_error_is_raised_if_zone_was_never_fetched(self):
+		self.fetch_error = ValueError('zone is down')
+		self.assertRaises(ValueError, ZoneCapacityCache.get_or_refresh, 'A')
+
+
+class TestCapacityAwareZonePickers(unittest.TestCase):
+	def setUp(self):
+		ZoneCapacityCache.clear()
+		ZoneReservations.clear()
+		ZoneCapacityCache.set('A', 1000, 100)
+		ZoneCapacityCache.set('B', 1000, 500)
+		ZoneCapacityCache.set('C', 1000, 0)
+
+	def tearDown(self):
+		ZoneCapacityCache.clear()
+		ZoneReservations.clear()
+
+	def test_most_free_space_picks_the_zone_with_most_free_space(self):
+		picker = MostFreeSpaceZonePicker()
+		self.assertEqual(picker.pick_zone(['A', 'B', 'C']), 'B')
+		self.assertEqual(picker.pick_zone(['A', 'C']), 'A')
+
+	def test_most_free_space_takes_reservations_into_account(self):
+		picker = MostFreeSpaceZonePicker()
+		ZoneReservations.reserve('B', 450)
+		self.assertEqual(picker.pick_zone(['A', 'B']), 'A')
+
+		ZoneReservations.release('B', 450)
+		self.assertEqual(picker.pick_zone(['A', 'B']), 'B')
+
+	def test_most_free_space_without_capacity_info(self):
+		picker = MostFreeSpaceZonePicker()
+		self.assertIn(picker.pick_zone(['D', 'E']), ['D', 'E'])
+
+	def test_weighted_never_picks_a_full_zone(self):
+		picker = WeightedZonePicker()
+		picks = [picker.pick_zone(['A', 'B', 'C']) for _ in range(200)]
+
+		self.assertNotIn('C', picks)
+		self.assertGreater(picks.count('B'), picks.count('A'))
+
+	def test_consume_updates_free_space(self):
+		ZoneCapacityCache.consume('A', 30)
+		self.assertEqual(ZoneCapacityCache.get('A').free_space, 70)
+
+if __name__ == '__main__':
+	unittest.main()
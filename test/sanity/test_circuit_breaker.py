@@ -0,0 +1,116 @@
+import time
+import unittest
+
+from driver.circuit_breaker import ZoneCircuitBreaker, CircuitState
+from driver.topology import Topology
+
+
+class TestZoneCircuitBreaker(unittest.TestCase):
+	def _create_breaker(self, **kwargs):
+		params = {'failure_rate_threshold': 0.5, 'minimum_requests': 4, 'window_seconds': 60, 'open_timeout': 0.2, 'max_open_timeout': 1}
+		params.update(kwargs)
+		return ZoneCircuitBreaker('A', **params)
+
+	def test_opens_when_failure_rate_crosses_threshold(self):
+		breaker = self._create_breaker()
+
+		breaker.record_success()
+		breaker.record_failure('timeout')
+		breaker.record_failure('timeout')
+		self.assertEqual(breaker.get_state(), CircuitState.CLOSED)
+		self.assertTrue(breaker.allow_request())
+
+		breaker.record_success()
+		breaker.record_failure('timeout')
+		self.assertEqual(breaker.get_state(), CircuitState.OPEN)
+		self.assertFalse(breaker.allow_request())
+		self.assertTrue(breaker.is_open())
+
+	def test_minimum_requests(self):
+		breaker = self._create_breaker(minimum_requests=3)
+		breaker.record_failure('timeout')
+		breaker.record_failure('timeout')
+		self.assertEqual(breaker.get_state(), CircuitState.CLOSED)
+
+	def test_probe_moves_to_half_open_and_trial_closes(self):
+		breaker = self._create_breaker()
+		breaker.force_open('websocket disconnected')
+		self.assertFalse(breaker.is_probe_due())
+
+		time.sleep(0.25)
+		self.assertTrue(breaker.is_probe_due())
+		breaker.on_probe_result(True)
+		self.assertEqual(breaker.get_state(), CircuitState.HALF_OPEN)
+
+		# only a single trial request is allowed
+		self.assertTrue(breaker.allow_request())
+		self.assertFalse(breaker.allow_request())
+
+		breaker.record_success()
+		self.assertEqual(breaker.get_state(), CircuitState.CLOSED)
+		self.assertEqual(breaker.get_stats()['transitions'], {'closed->open': 1, 'open->half-open': 1, 'half-open->closed': 1})
+
+	def test_zone_health_check_does_not_take_the_trial(self):
+		topology = Topology()
+		breaker = self._create_breaker()
+		topology.circuit_breakers['A'] = breaker
+		self.assertTrue(topology.is_zone_healthy('A'))
+
+		breaker.force_open('websocket disconnected')
+		time.sleep(0.25)
+		breaker.on_probe_result(True)
+
+		self.assertFalse(topology.is_zone_healthy('A'))
+		self.assertFalse(topology.is_zone_healthy('A'))
+		self.assertTrue(topology.allow_request_to_zone('A'))
+
+	def test_trial_without_outcome_is_released(self):
+		breaker = self._create_breaker()
+		breaker.force_open('websocket disconnected')
+		time.sleep(0.25)
+		breaker.on_probe_result(True)
+
+		try:
+			with breaker.allow_request() as permit:
+				self.assertTrue(permit)
+				self.assertFalse(breaker.allow_request())
+				raise ValueError('invalid argument')
+		except ValueError:
+			pass
+
+		self.assertEqual(breaker.get_state(), CircuitState.HALF_OPEN)
+		with breaker.allow_request() as permit:
+			self.assertTrue(permit)
+			breaker.record_success()
+
+		self.assertEqual(breaker.get_state(), CircuitState.CLOSED)
+
+	def test_failed_trial_reopens_with_backoff(self):
+		breaker = self._create_breaker()
+		breaker.force_open('websocket disconnected')
+		time.sleep(0.25)
+		breaker.on_probe_result(True)
+		breaker.allow_request()
+		breaker.record_failure('timeout')
+
+		self.assertEqual(breaker.get_state(), CircuitState.OPEN)
+		self.assertAlmostEqual(breaker.open_timeout, 0.4)
+
+		breaker.on_probe_result(False, 'connection refused')
+		self.assertAlmostEqual(breaker.open_timeout, 0.8)
+
+		breaker.on_probe_result(False, 'connection refused')
+		self.assertEqual(breaker.open_timeout, 1)
+
+	def test_force_open_keeps_timers(self):
+		breaker = self._create_breaker()
+		breaker.force_open('websocket disconnected')
+		opened_at = breaker.opened_at
+		breaker.force_open('websocket disconnected')
+		self.assertEqual(breaker.opened_at, opened_at)
+
+		breaker.force_close('websocket connected')
+		self.assertEqual(breaker.get_state(), CircuitState.CLOSED)
+
+if __name__ == '__main__':
+	unittest.main()
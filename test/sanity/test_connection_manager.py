@@ -0,0 +1,474 @@
+import gc
+import json
+import threading
+import time
+import unittest
+
+from NVMeshSDK.APIs.BaseClassAPI import BaseClassAPI, IterateError, MAX_SHARED_WORKERS
+from NVMeshSDK.APIs.ConfigurationVersionAPI import DBUUIDCache
+from NVMeshSDK.APIs.VolumeAPI import VolumeAPI
+from NVMeshSDK.ConnectionManager import ConnectionManager, Connection, ManagementTimeout, defaultConfig
+from NVMeshSDK.RequestContext import RequestContext, RequestAbortedError
+from NVMeshSDK.Utils import Utils
+from test.sanity.helpers.fake_management_server import FakeManagementServer
+
+
+def create_connection(servers):
+	return Connection(user='admin', password='admin', configFile='/nonexistent', configObject=defaultConfig, managementServers=servers)
+
+
+class RecordingConnection(Connection):
+	def __init__(self, *args, **kwargs):
+		self.responses = []
+		Connection.__init__(self, *args, **kwargs)
+
+	def sendRequest(self, *args, **kwargs):
+		res = Connection.sendRequest(self, *args, **kwargs)
+		self.responses.append(res)
+		return res
+
+
+class TestConnectionManager(unittest.TestCase):
+	def setUp(self):
+		self.server = FakeManagementServer().start()
+		self.addCleanup(self.server.stop)
+
+	def test_get_instance_creates_a_single_connection_per_db_uuid(self):
+		connections = []
+
+		def get_instance():
+			connections.append(ConnectionManager.getInstance('test-db-uuid', [self.server.url]))
+
+		threads = [threading.Thread(target=get_instance) for _ in range(10)]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+
+		self.addCleanup(ConnectionManager.removeInstance, 'test-db-uuid')
+		self.assertEqual(len(set(id(c) for c in connections)), 1)
+		self.assertIs(ConnectionManager.debug_getInstances()['test-db-uuid'], connections[0])
+
+	def test_concurrent_requests_use_pooled_connections(self):
+		connection = create_connection([self.server.url])
+		self.server.delay = 0.2
+		results = []
+
+		def request():
+			results.append(connection.get('/volumes/count'))
+
+		threads = [threading.Thread(target=request) for _ in range(20)]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+
+		self.assertEqual(len(results), 20)
+		self.assertTrue(all(err is None for err, out in results))
+		self.assertGreater(self.server.max_in_flight, 1)
+
+	def test_least_outstanding_requests(self):
+		other_server = FakeManagementServer().start()
+		self.addCleanup(other_server.stop)
+
+		connection = create_connection([self.server.url, other_server.url])
+		self.addCleanup(connection.close)
+
+		first = connection.acquireServer()
+		second = connection.acquireServer()
+		self.assertNotEqual(first, second)
+
+		connection.releaseServer(first)
+		self.assertEqual(connection.acquireServer(), first)
+
+	def test_each_server_is_logged_in_to_before_it_is_used(self):
+		other_server = FakeManagementServer().start()
+		self.addCleanup(other_server.stop)
+		for server in [self.server, other_server]:
+			server.require_session = True
+			server.set_response('/login', body={'success': True})
+
+		connection = create_connection([self.server.url, other_server.url])
+		self.addCleanup(connection.close)
+		connection.retryPolicy.maxRetries = 0
+
+		for i in range(10):
+			err, out = connection.get('/volumes/count')
+			self.assertIsNone(err)
+
+		for server in [self.server, other_server]:
+			self.assertGreater(server.count_requests('/volumes/count'), 0)
+			self.assertEqual(server.count_requests('/login'), 1)
+
+	def test_health_prober_stops_when_the_connection_is_not_used(self):
+		other_server = FakeManagementServer().start()
+		self.addCleanup(other_server.stop)
+		config = dict(defaultConfig, HEALTH_CHECK_INTERVAL=0.05)
+		servers = [self.server.url, other_server.url]
+
+		connection = Connection(user='admin', password='admin', configFile='/nonexistent', configObject=config, managementServers=servers)
+		prober = connection.healthProber
+		del connection
+		gc.collect()
+		prober.join(1)
+		self.assertFalse(prober.is_alive())
+
+		connection = ConnectionManager.getInstance('prober-db-uuid', servers)
+		ConnectionManager.removeInstance('prober-db-uuid')
+		connection.healthProber.join(6)
+		self.assertFalse(connection.healthProber.is_alive())
+
+	def test_is_alive_tries_all_servers_in_rotations(self):
+		connection = create_connection([self.server.url])
+		connection.retryPolicy.baseDelay = 0.01
+		connection.maxManagementsRotations = 2
+		self.server.set_response('/isAlive', 500, times=1)
+
+		self.assertTrue(connection.isAlive())
+		self.assertEqual(self.server.count_requests('/isAlive'), 2)
+
+		self.server.set_response('/isAlive', 500)
+		self.assertRaises(ManagementTimeout, connection.isAlive)
+
+	def test_unreachable_server_is_skipped_until_it_is_alive(self):
+		connection = create_connection([self.server.url, 'http://127.0.0.1:1'])
+		self.addCleanup(connection.close)
+
+		self.assertFalse(connection.probeServer(1))
+		for i in range(10):
+			err, out = connection.get('/volumes/count')
+			self.assertIsNone(err)
+
+		self.assertEqual(self.server.count_requests('/volumes/count'), 10)
+		self.assertTrue(connection.probeServer(0))
+
+		# when all servers are unhealthy requests are still sent
+		connection.setServerHealth(0, False)
+		self.assertIn(connection.acquireServer(), [0, 1])
+
+	def test_retry_after_response_is_retried(self):
+		connection = create_connection([self.server.url])
+		self.server.set_response('/volumes/count', 503, headers={'Retry-After': '0'}, times=1)
+
+		err, out = connection.get('/volumes/count')
+		self.assertIsNone(err)
+		self.assertEqual(self.server.count_requests('/volumes/count'), 2)
+
+	def test_retried_stream_response_is_closed(self):
+		connection = RecordingConnection(user='admin', password='admin', configFile='/nonexistent', configObject=defaultConfig, managementServers=[self.server.url])
+		self.server.set_response('/volumes/all/0/0', 503, headers={'Retry-After': '0'}, times=1)
+		self.server.set_response('/login', body={'success': True})
+
+		err, out = connection.getStream('/volumes/all/0/0')
+		self.assertIsNone(err)
+		self.assertEqual(list(out), [])
+		self.assertEqual([res.status_code for res in connection.responses], [200, 503, 200])
+		self.assertTrue(all(res.raw.closed for res in connection.responses))
+
+	def test_retryable_response_is_returned_when_retries_are_exhausted(self):
+		connection = create_connection([self.server.url])
+		connection.retryPolicy.baseDelay = 0.01
+		self.server.set_response('/volumes/count', 429)
+
+		err, out = connection.get('/volumes/count')
+		self.assertEqual(err['code'], 429)
+		self.assertEqual(self.server.count_requests('/volumes/count'), connection.retryPolicy.maxRetries + 1)
+
+	def test_retry_budget_stops_retries(self):
+		connection = create_connection([self.server.url])
+		connection.retryPolicy.baseDelay = 0.01
+		connection.retryBudget.minRetriesPerSecond = 0
+		connection.retryBudget.tokens = 1
+		self.server.set_response('/volumes/count', 503)
+
+		connection.get('/volumes/count')
+		# one retry from the budget and none from the ratio (0.2) of the request
+		self.assertEqual(self.server.count_requests('/volumes/count'), 2)
+
+	def test_hedged_get_uses_the_fastest_server(self):
+		slow_server = FakeManagementServer().start()
+		self.addCleanup(slow_server.stop)
+
+		connection = create_connection([slow_server.url, self.server.url])
+		self.addCleanup(connection.close)
+		connection.hedgingPolicy.enabled = True
+		connection.hedgingPolicy.initialDelay = 0.05
+		slow_server.delay = 1
+
+		start = time.time()
+		err, out = connection.get('/volumes/count')
+		self.assertIsNone(err)
+		self.assertLess(time.time() - start, 0.5)
+		self.assertEqual(self.server.count_requests('/volumes/count'), 1)
+		self.assertEqual(connection.managementServer, self.server.url)
+
+	def test_hedged_get_reuses_a_bounded_number_of_threads(self):
+		other_server = FakeManagementServer().start()
+		self.addCleanup(other_server.stop)
+
+		connection = create_connection([self.server.url, other_server.url])
+		self.addCleanup(connection.close)
+		connection.hedgingPolicy.enabled = True
+		connection.hedgingPolicy.initialDelay = 0.05
+		connection.hedgingPolicy.maxConcurrentAttempts = 2
+		other_server.delay = 0.2
+		self.server.delay = 0.2
+
+		for i in range(5):
+			err, out = connection.get('/volumes/count')
+			self.assertIsNone(err)
+
+		self.assertLessEqual(len([t for t in threading.enumerate() if t.name.startswith('hedged-get')]), 2)
+
+	def test_hedged_get_stops_at_the_request_deadline(self):
+		slow_server = FakeManagementServer().start()
+		self.addCleanup(slow_server.stop)
+
+		connection = create_connection([slow_server.url, self.server.url])
+		self.addCleanup(connection.close)
+		connection.hedgingPolicy.enabled = True
+		connection.hedgingPolicy.initialDelay = 0.05
+		connection.retryPolicy.baseDelay = 0.01
+		slow_server.delay = 1
+		self.server.delay = 1
+
+		start = time.time()
+		with RequestContext.scope(timeRemaining=0.3):
+			self.assertRaises(RequestAbortedError, connection.get, '/volumes/count')
+
+		self.assertLess(time.time() - start, 0.6)
+
+	def test_management_server_is_tracked_per_thread(self):
+		other_server = FakeManagementServer().start()
+		self.addCleanup(other_server.stop)
+		other_server.delay = 0.3
+
+		connection = create_connection([self.server.url, other_server.url])
+		self.addCleanup(connection.close)
+		servers = {}
+
+		def request(name):
+			connection.get('/volumes/count')
+			servers[name] = connection.managementServer
+
+		# the slow request is sent to the other server while self.server is unhealthy
+		connection.setServerHealth(0, False)
+		slow = threading.Thread(target=request, args=('slow',))
+		slow.start()
+		time.sleep(0.1)
+		connection.setServerHealth(0, True)
+
+		# the other server has an outstanding request, so this request goes to self.server and completes first
+		request('fast')
+		slow.join()
+
+		self.assertEqual(servers['fast'], self.server.url)
+		self.assertEqual(servers['slow'], other_server.url)
+
+	def test_expired_session_is_renewed_by_a_single_login(self):
+		self.server.set_response('/login', body={'success': True})
+		connection = create_connection([self.server.url])
+		self.server.delay = 0.2
+		self.server.set_response('/volumes/count', 401, times=10)
+		results = []
+
+		def request():
+			results.append(connection.get('/volumes/count'))
+
+		threads = [threading.Thread(target=request) for _ in range(10)]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+
+		self.assertTrue(all(err is None for err, out in results))
+		# the login of the connection and a single login after the session expired
+		self.assertEqual(self.server.count_requests('/login'), 2)
+
+	def test_session_is_refreshed_before_it_expires(self):
+		self.server.set_response('/login', body={'success': True})
+		connection = create_connection([self.server.url])
+		connection.serverStates[0].nextSessionRefreshTime = time.time() - 1
+
+		connection.get('/volumes/count')
+		connection.get('/volumes/count')
+		self.assertEqual(self.server.count_requests('/login'), 2)
+
+	def test_expired_session_is_renewed_on_the_rejecting_server(self):
+		other_server = FakeManagementServer().start()
+		self.addCleanup(other_server.stop)
+		for server in [self.server, other_server]:
+			server.require_session = True
+			server.set_response('/login', body={'success': True})
+
+		connection = create_connection([self.server.url, other_server.url])
+		self.addCleanup(connection.close)
+		connection.retryPolicy.maxRetries = 0
+		results = []
+
+		def request():
+			results.append(connection.get('/volumes/count'))
+
+		# log in to the other server while requests are sent only to it
+		connection.setServerHealth(0, False)
+		request()
+		self.server.expire_session()
+		other_server.expire_session()
+
+		# the slow request is rejected by the other server after self.server was logged in to again
+		other_server.delay = 0.3
+		slow = threading.Thread(target=request)
+		slow.start()
+		time.sleep(0.1)
+		connection.setServerHealth(0, True)
+		connection.setServerHealth(1, False)
+		request()
+		slow.join()
+
+		self.assertTrue(all(err is None for err, out in results))
+		self.assertEqual(self.server.count_requests('/login'), 2)
+		self.assertEqual(other_server.count_requests('/login'), 2)
+
+	def test_json_response_is_not_searched_for_login(self):
+		connection = create_connection([self.server.url])
+		self.server.set_response('/volumes/all/0/0', body=[{'_id': 'vol', 'url': '/login'}])
+
+		err, out = connection.get('/volumes/all/0/0')
+		self.assertIsNone(err)
+		self.assertEqual(self.server.count_requests('/login'), 1)
+
+	def test_db_uuid_is_cached(self):
+		self.server.set_response('/dbUUID', body={'dbUUID': 'cached-db-uuid'})
+		self.addCleanup(ConnectionManager.removeInstance, 'cached-db-uuid')
+		self.addCleanup(DBUUIDCache.clear)
+		servers = self.server.url.replace('http://', '')
+
+		first = VolumeAPI(managementServers=servers, managementProtocol='http')
+		second = VolumeAPI(managementServers=servers, managementProtocol='http')
+		self.assertIs(first.managementConnection, second.managementConnection)
+		self.assertEqual(self.server.count_requests('/dbUUID'), 1)
+	def test_resolving_the_db_uuid_again_does_not_leak_connections(self):
+		other_server = FakeManagementServer().start()
+		self.addCleanup(other_server.stop)
+		for server in [self.server, other_server]:
+			server.set_response('/dbUUID', body={'dbUUID': 'leak-db-uuid'})
+
+		self.addCleanup(ConnectionManager.removeInstance, 'leak-db-uuid')
+		self.addCleanup(DBUUIDCache.clear)
+		servers = ','.join(server.url.replace('http://', '') for server in [self.server, other_server])
+		probers_before = [t for t in threading.enumerate() if t.name == 'mgmt-health-prober']
+
+		connections = []
+		for i in range(3):
+			# as if the cached DB UUID expired
+			DBUUIDCache.clear()
+			connections.append(VolumeAPI(managementServers=servers, managementProtocol='http').managementConnection)
+
+		registered = ConnectionManager.debug_getInstances()['leak-db-uuid']
+		self.addCleanup(registered.close)
+		self.assertTrue(all(connection is registered for connection in connections))
+
+		new_probers = [t for t in threading.enumerate() if t.name == 'mgmt-health-prober' and t not in probers_before]
+		for prober in new_probers:
+			if prober is not registered.healthProber:
+				prober.join(1)
+
+		self.assertEqual([t for t in new_probers if t.is_alive()], [registered.healthProber])
+
+	def test_stream_volumes(self):
+		self.server.set_response('/dbUUID', body={'dbUUID': 'stream-db-uuid'})
+		self.addCleanup(ConnectionManager.removeInstance, 'stream-db-uuid')
+		self.addCleanup(DBUUIDCache.clear)
+		volumes = [{'_id': 'vol-{}'.format(i), 'name': 'vol-{}'.format(i), 'capacity': i} for i in range(1000)]
+		self.server.set_response('/volumes/all/0/0', body=volumes)
+
+		volume_api = VolumeAPI(managementServers=self.server.url.replace('http://', ''), managementProtocol='http')
+		err, out = volume_api.stream()
+		self.assertIsNone(err)
+		self.assertEqual([v.capacity for v in out], range(1000))
+
+		self.server.set_response('/volumes/all/0/0', 500)
+		err, out = volume_api.stream()
+		self.assertEqual(err['code'], 500)
+		self.assertIsNone(out)
+
+	def test_iterate_volumes_in_pages(self):
+		self.server.set_response('/dbUUID', body={'dbUUID': 'iterate-db-uuid'})
+		self.addCleanup(ConnectionManager.removeInstance, 'iterate-db-uuid')
+		self.addCleanup(DBUUIDCache.clear)
+		page = [{'_id': 'vol-{}'.format(i), 'capacity': i} for i in range(2)]
+		self.server.set_response('/volumes/all/0/2', body=page, times=2)
+
+		volume_api = VolumeAPI(managementServers=self.server.url.replace('http://', ''), managementProtocol='http')
+		volumes = list(volume_api.iterate(pageSize=2))
+		self.assertEqual([v.capacity for v in volumes], [0, 1, 0, 1])
+		# two full pages and an empty page that ends the iteration
+		self.assertEqual(self.server.count_requests('/volumes/all/0/2'), 3)
+
+		self.server.set_response('/volumes/all/0/2', 500)
+		with self.assertRaises(IterateError):
+			list(volume_api.iterate(pageSize=2))
+
+	def test_get_by_ids_in_chunks(self):
+		self.server.set_response('/dbUUID', body={'dbUUID': 'get-by-ids-db-uuid'})
+		self.addCleanup(ConnectionManager.removeInstance, 'get-by-ids-db-uuid')
+		self.addCleanup(DBUUIDCache.clear)
+		self.server.set_response('/volumes/all/0/0', body=[{'_id': 'vol-1', 'capacity': 1}])
+
+		volume_api = VolumeAPI(managementServers=self.server.url.replace('http://', ''), managementProtocol='http')
+		ids = ['vol-{}'.format(i) for i in range(100)]
+		err, volumes = volume_api.getByIds(ids + ids, maxQueryLength=400)
+		self.assertIsNone(err)
+
+		# each chunk returns a single volume from the fake server
+		requests_count = self.server.count_requests('/volumes/all/0/0')
+		self.assertGreater(requests_count, 1)
+		self.assertEqual(len(volumes), requests_count)
+
+		self.server.set_response('/volumes/all/0/0', 500)
+		err, volumes = volume_api.getByIds(ids, maxQueryLength=400)
+		self.assertEqual(err['code'], 500)
+		self.assertIsNone(volumes)
+
+	def test_run_concurrently_uses_the_shared_threads(self):
+		lock = threading.Lock()
+		state = {'running': 0, 'max_running': 0, 'max_threads': 0}
+
+		def task(value):
+			with lock:
+				state['running'] += 1
+				state['max_running'] = max(state['max_running'], state['running'])
+				state['max_threads'] = max(state['max_threads'], threading.active_count())
+			time.sleep(0.01)
+			with lock:
+				state['running'] -= 1
+			return value * 2
+
+		self.assertEqual(BaseClassAPI.runConcurrently(task, range(20), 3), [value * 2 for value in range(20)])
+		self.assertLessEqual(state['max_running'], 3)
+
+		threads_before = threading.active_count()
+		calls = [threading.Thread(target=BaseClassAPI.runConcurrently, args=(task, range(20), 3)) for _ in range(10)]
+		for call in calls:
+			call.start()
+		for call in calls:
+			call.join()
+
+		# the calling threads and the threads of the shared executor
+		self.assertLessEqual(state['max_threads'], threads_before + len(calls) + MAX_SHARED_WORKERS)
+
+		with self.assertRaises(ZeroDivisionError):
+			BaseClassAPI.runConcurrently(lambda value: 1 / value, range(5), 3)
+
+	def test_split_values_for_query(self):
+		ids = ['vol-{}'.format(i) for i in range(100)]
+		chunks = Utils.splitValuesForQuery(ids, 50, 300)
+		self.assertEqual(sum(chunks, []), ids)
+		for chunk in chunks:
+			self.assertLessEqual(50 + Utils.getURLEncodedLength(json.dumps(chunk)[1:-1]), 300)
+
+		# a value longer than the limit is sent on its own
+		self.assertEqual(Utils.splitValuesForQuery(['a' * 500, 'b'], 50, 300), [['a' * 500], ['b']])
+
+if __name__ == '__main__':
+	unittest.main()
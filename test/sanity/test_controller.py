@@ -154,13 +154,30 @@ class TestControllerServiceWithoutTopology(TestCaseWithServerRunning):
 		msg = self.ctrl_client.ValidateVolumeCapabilities(volume_id="vol_1")
 		log.debug(msg)
 
-	# @CatchRequestErrors
-	# @unittest.skip('ListVolumes need to be updated to use new NVMeshSDK')
-	# def test_list_volumes(self):
-	# 	msg = self.ctrl_client.ListVolumes(max_entries=2)
-	# 	print(msg.entries)
-	# 	msg = self.ctrl_client.ListVolumes(max_entries=2, starting_token=msg.next_token)
-	# 	print(msg.entries)
+	@CatchRequestErrors
+	def test_list_volumes(self):
+		parameters = {'vpg': 'DEFAULT_CONCATENATED_VPG'}
+		created_volume_ids = set()
+		for i in range(5):
+			msg = self.ctrl_client.CreateVolume(name='list-vol-%d' % i, capacity_in_bytes=1 * GB, parameters=parameters)
+			created_volume_ids.add(msg.volume.volume_id)
+			self.addCleanup(self.ctrl_client.DeleteVolume, volume_id=msg.volume.volume_id)
+
+		listed_volume_ids = []
+		next_token = ''
+		while True:
+			msg = self.ctrl_client.ListVolumes(max_entries=2, starting_token=next_token)
+			self.assertLessEqual(len(msg.entries), 2)
+			listed_volume_ids.extend([entry.volume.volume_id for entry in msg.entries])
+			next_token = msg.next_token
+			if not next_token:
+				break
+
+		self.assertEqual(len(listed_volume_ids), len(set(listed_volume_ids)))
+		self.assertTrue(created_volume_ids.issubset(set(listed_volume_ids)))
+
+		with self.assertRaises(_Rendezvous):
+			self.ctrl_client.ListVolumes(max_entries=2, starting_token='not-a-valid-token')
 
 	@CatchRequestErrors
 	def test_controller_get_capabilities(self):
@@ -172,8 +189,9 @@ class TestControllerServiceWithoutTopology(TestCaseWithServerRunning):
 		capabilitiesReceived = set(map(get_capability_string, msg.capabilities))
 		expectedCapabilities = {
 			'CREATE_DELETE_VOLUME',
-			#'LIST_VOLUMES',
+			'LIST_VOLUMES',
 			'EXPAND_VOLUME',
+			'GET_CAPACITY',
 		}
 
 		self.assertSetEqual(expectedCapabilities, capabilitiesReceived)
@@ -198,6 +216,61 @@ class TestControllerServiceWithoutTopology(TestCaseWithServerRunning):
 		self.assertEquals(msg.capacity_bytes, new_size)
 
 
+class TestAsyncCreateVolume(TestCaseWithServerRunning):
+	driver_server = None
+	cluster1 = None
+
+	@classmethod
+	def setUpClass(cls):
+		super(TestAsyncCreateVolume, cls).setUpClass()
+		cls.cluster1 = NVMeshManagementSim('cluster_' + cls.__name__, options={'volumeCreationDelayMS': 2000})
+		cls.cluster1.start()
+
+		config = {
+			'MANAGEMENT_SERVERS': cls.cluster1.get_mgmt_server_string(),
+			'MANAGEMENT_PROTOCOL': 'https',
+			'MANAGEMENT_USERNAME': 'admin@excelero.com',
+			'MANAGEMENT_PASSWORD': 'admin',
+			'TOPOLOGY_TYPE': None,
+			'TOPOLOGY': None,
+			'SDK_LOG_LEVEL': 'DEBUG',
+			'ASYNC_CREATE_VOLUME': True,
+			'ASYNC_CREATE_VOLUME_MAX_WORKERS': 2,
+			'ASYNC_CREATE_VOLUME_WAIT_SECONDS': 0.1
+		}
+
+		ConfigLoaderMock(config).load()
+		cls.driver_server = start_server(Consts.DriverType.Controller, config=config)
+		cls.ctrl_client = ControllerClient()
+
+	@classmethod
+	def tearDownClass(cls):
+		if cls.driver_server:
+			cls.driver_server.stop()
+		cls.cluster1.stop()
+
+	def test_retries_get_the_result_of_the_background_creation(self):
+		parameters = {'vpg': 'DEFAULT_CONCATENATED_VPG'}
+
+		def create_volume():
+			return self.ctrl_client.CreateVolume(name='pvc-test-async-create', capacity_in_bytes=5 * GB, parameters=parameters)
+
+		with self.assertRaises(_Rendezvous) as first_attempt:
+			create_volume()
+
+		self.assertEqual(first_attempt.exception._state.code, StatusCode.ABORTED)
+
+		# a retry while the volume is still being created
+		with self.assertRaises(_Rendezvous) as second_attempt:
+			create_volume()
+
+		self.assertEqual(second_attempt.exception._state.code, StatusCode.ABORTED)
+
+		time.sleep(3)
+		response = create_volume()
+		self.assertTrue(response.volume.volume_id)
+		self.ctrl_client.DeleteVolume(volume_id=response.volume.volume_id)
+
 class TestControllerServiceWithZoneTopology(TestCaseWithServerRunning):
 	driver_server = None
 	clusters = None
@@ -382,8 +455,9 @@ class TestControllerServiceWithZoneTopology(TestCaseWithServerRunning):
 		capabilitiesReceived = set(map(get_capability_string, msg.capabilities))
 		expectedCapabilities = {
 			'CREATE_DELETE_VOLUME',
-			#'LIST_VOLUMES',
+			'LIST_VOLUMES',
 			'EXPAND_VOLUME',
+			'GET_CAPACITY',
 		}
 
 		self.assertSetEqual(expectedCapabilities, capabilitiesReceived)
@@ -477,6 +551,18 @@ class TestControllerServiceWithZoneTopology(TestCaseWithServerRunning):
 		self.assertEqual(selection_sequence[1], selection_sequence[4])
 		self.assertEqual(selection_sequence[2], selection_sequence[5])
 
+	def test_round_robin_zone_picker_with_allowed_zones(self):
+		picker = RoundRobinZonePicker()
+		allowed_zones = picker.zones[:2]
+		selection_sequence = [picker.pick_zone(allowed_zones) for i in range(4)]
+
+		for zone in selection_sequence:
+			self.assertIn(zone, allowed_zones)
+
+		self.assertNotEqual(selection_sequence[0], selection_sequence[1])
+		self.assertEqual(selection_sequence[0], selection_sequence[2])
+		self.assertEqual(selection_sequence[1], selection_sequence[3])
+
 class TestZoneTopologyScale(TestCaseWithServerRunning):
 	driver_server = None
 	clusters = None
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import copy
+import json
+import timeit
+import unittest
+
+from NVMeshSDK.Entities.Entity import Entity
+from NVMeshSDK.Entities.Volume import Volume
+from NVMeshSDK.MongoObj import MongoObj
+
+
+def json_round_trip(obj):
+	# the serialization Entity used before toDict
+	return json.loads(json.dumps(obj.__dict__ if not isinstance(obj, dict) else obj, default=lambda x: x.__dict__))
+
+
+def create_volume(volume_class=Volume):
+	volume = volume_class(
+		name='vol-1',
+		capacity=10 ** 12,
+		RAIDLevel='Striped RAID-0',
+		stripeWidth=2,
+		diskClasses=('dc-1', 'dc-2'),
+		description=u'unicode א description',
+		chunks=[{'_id': 'chunk-1', 'vlbs': 0, 'vlbe': 1.5, 'pRaids': [{'diskSegments': [{'diskID': 'disk-1', 'type': None}]}]}],
+		csi_metadata={'csi_name': 'pvc-1', 1: True, 'filter': MongoObj(field=Volume.Size, value={'$gt': 1})})
+	volume.deserialize()
+	return volume
+
+
+class TestEntitySerialization(unittest.TestCase):
+	def test_payload_is_identical_to_json_round_trip(self):
+		volume = create_volume()
+		expected = json_round_trip(create_volume().instantiate().filterNoneValues())
+
+		self.assertEqual(volume.serialize(), expected)
+		self.assertEqual(json.dumps(volume.serialize()), json.dumps(expected))
+
+	def test_str_is_identical(self):
+		volume = create_volume()
+		expected = json.dumps(copy.deepcopy(create_volume().instantiate().__dict__), sort_keys=True, indent=4, default=lambda x: x.__dict__)
+		self.assertEqual(str(volume), expected)
+
+	def test_fast_entity_payload(self):
+		self.assertEqual(json.dumps(create_volume(Volume.getFastClass()).serialize()), json.dumps(create_volume().serialize()))
+
+	def test_to_dict_does_not_share_objects(self):
+		volume = create_volume()
+		volume_dict = Entity.myToDict(volume)
+		volume_dict['chunks'][0]['vlbs'] = 100
+		self.assertEqual(volume.chunks[0].vlbs, 0)
+
+	def test_to_dict_is_faster_than_json_round_trip(self):
+		# a typical CreateVolume payload
+		volume = Volume(name='vol-1', capacity=10 ** 12, RAIDLevel='Concatenated', csi_metadata={'csi_name': 'pvc-1', 'zone': 'A'})
+		round_trip_time = min(timeit.repeat(lambda: json_round_trip(volume), number=1000, repeat=3))
+		to_dict_time = min(timeit.repeat(lambda: Entity.myToDict(volume), number=1000, repeat=3))
+		self.assertLess(to_dict_time, round_trip_time)
+
+	def test_repr(self):
+		self.assertEqual(repr(create_volume()), '<Volume vol-1>')
+
+
+if __name__ == '__main__':
+	unittest.main()
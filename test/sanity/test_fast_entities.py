@@ -0,0 +1,107 @@
+import glob
+import importlib
+import os
+import unittest
+
+from NVMeshSDK.Entities.Chunk import Chunk
+from NVMeshSDK.Entities.Entity import Entity, LAZY_OBJECTS_ATTR
+from NVMeshSDK.Entities.Volume import Volume
+
+VOLUME = {
+	'_id': 'vol-1',
+	'name': 'vol-1',
+	'capacity': 1000,
+	'RAIDLevel': 'Concatenated',
+	'csi_metadata': {'csi_name': 'pvc-1'},
+	'chunks': [{'_id': 'chunk-1', 'vlbs': 0, 'vlbe': 10, 'pRaids': [{'diskSegments': [{'diskID': 'disk-1'}]}]}]
+}
+
+
+def get_entity_classes():
+	entities_dir = os.path.dirname(os.path.abspath(Volume.__module__.replace('.', '/') + '.py'))
+	entity_classes = set()
+	for path in glob.glob(os.path.join(entities_dir, '*.py')):
+		module = importlib.import_module('NVMeshSDK.Entities.' + os.path.basename(path)[:-3])
+		for value in vars(module).values():
+			if isinstance(value, type) and issubclass(value, Entity) and value is not Entity:
+				entity_classes.add(value)
+
+	return entity_classes
+
+
+def get_class_attribute(cls, name):
+	# the attribute as it is stored in the class, without binding methods to the class
+	for klass in cls.__mro__:
+		if name in vars(klass):
+			return vars(klass)[name]
+
+
+class TestFastEntities(unittest.TestCase):
+	def create_volumes(self):
+		volume = Volume(**VOLUME)
+		volume.deserialize()
+		fast_volume = Volume.getFastClass()(**VOLUME)
+		fast_volume.deserialize()
+		return volume, fast_volume
+
+	def test_fast_volume_is_compatible(self):
+		volume, fast_volume = self.create_volumes()
+
+		self.assertIsInstance(fast_volume, Volume)
+		self.assertIs(Volume.getFastClass(), type(fast_volume))
+		self.assertEqual(fast_volume.serialize(), volume.serialize())
+		self.assertEqual(str(fast_volume), str(volume))
+		self.assertEqual(fast_volume, volume)
+		self.assertEqual(fast_volume.csi_metadata, {'csi_name': 'pvc-1'})
+		self.assertFalse(hasattr(fast_volume, 'description'))
+		self.assertEqual(getattr(fast_volume, Volume.Size.dbKey), 1000)
+
+	def test_nested_entities(self):
+		volume, fast_volume = self.create_volumes()
+
+		self.assertIsInstance(fast_volume.chunks[0], Chunk.getFastClass())
+		self.assertEqual(getattr(fast_volume, 'chunks._id'), ['chunk-1'])
+		self.assertEqual(fast_volume.chunks[0].pRaids[0].diskSegments[0].diskID, 'disk-1')
+
+	def test_nested_entities_are_instantiated_when_accessed(self):
+		for volume_class in [Volume, Volume.getFastClass()]:
+			volume = volume_class(**VOLUME)
+			volume.deserialize()
+			self.assertNotIn('chunks', vars(volume))
+			self.assertFalse(hasattr(volume, 'reservation'))
+
+			self.assertEqual(getattr(volume, 'chunks._id'), ['chunk-1'])
+			self.assertIsInstance(volume.chunks[0], Chunk)
+			self.assertNotIn(LAZY_OBJECTS_ATTR, vars(volume))
+
+	def test_serialize_instantiates_nested_entities(self):
+		volume = Volume(**VOLUME)
+		volume.deserialize()
+		self.assertEqual(volume.serialize()['chunks'][0]['pRaids'][0]['diskSegments'][0]['diskID'], 'disk-1')
+		self.assertNotIn(LAZY_OBJECTS_ATTR, volume.getAttributes())
+
+	def test_fast_volume_uses_slots(self):
+		fast_volume = Volume.getFastClass()(name='vol-2', capacity=10)
+		self.assertEqual(fast_volume._id, 'vol-2')
+		self.assertEqual(fast_volume.getAttributes(), {'name': 'vol-2', '_id': 'vol-2', 'capacity': 10})
+
+	def test_all_entities_have_fast_classes(self):
+		for entity_class in get_entity_classes():
+			self.assertTrue(issubclass(entity_class.getFastClass(), entity_class))
+
+	def test_fast_classes_keep_the_class_attributes(self):
+		fast_class_attributes = ['__init__', '__getattribute__', '__slots__', '__doc__', '__module__', 'getAttributes', '_isFastEntity']
+		for entity_class in get_entity_classes():
+			fast_class = entity_class.getFastClass()
+			for name in dir(entity_class):
+				if name not in fast_class_attributes:
+					self.assertIs(get_class_attribute(fast_class, name), get_class_attribute(entity_class, name), '{}.{}'.format(fast_class.__name__, name))
+
+	def test_constructor_argument_with_the_name_of_a_class_attribute(self):
+		self.assertEqual(Volume.getFastClass()(name='vol-2', VSGs=['vsg-1']).VSGs, ['vsg-1'])
+		self.assertEqual(Volume.getFastClass()(name='vol-2', VSGs=['vsg-1']).getAttributes()['VSGs'], ['vsg-1'])
+
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,51 @@
+import json
+import unittest
+
+from NVMeshSDK.JSONStream import iterJSONArray, JSONStreamError
+
+
+def split_to_chunks(text, size):
+	return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class TestJSONStream(unittest.TestCase):
+	def test_array_split_at_every_position(self):
+		items = [{'_id': 'vol-1', 'capacity': 1000, 'tags': ['a', 'b]', '{']}, 12345, 'text, with comma', None, [], {'nested': {'x': 1.5}}]
+		text = ' [ ' + ', '.join(json.dumps(item) for item in items) + ' ]\n'
+
+		for size in range(1, len(text) + 1):
+			self.assertEqual(list(iterJSONArray(split_to_chunks(text, size))), items, 'failed with chunk size {}'.format(size))
+
+	def test_item_split_to_many_chunks(self):
+		items = [{'_id': 'vol-{}'.format(i), 'tags': ['tag-{}'.format(j) for j in range(1000)]} for i in range(3)]
+		chunks = split_to_chunks(json.dumps(items), 7)
+		read_chunks = []
+
+		def iter_chunks():
+			for chunk in chunks:
+				read_chunks.append(chunk)
+				yield chunk
+
+		stream = iterJSONArray(iter_chunks())
+		self.assertEqual(next(stream), items[0])
+		# items are still yielded before the rest of the response is read
+		self.assertLess(len(read_chunks), len(chunks))
+		self.assertEqual(list(stream), items[1:])
+
+	def test_empty_array(self):
+		self.assertEqual(list(iterJSONArray(['[', ' ', ']'])), [])
+		self.assertEqual(list(iterJSONArray([])), [])
+
+	def test_not_an_array(self):
+		self.assertEqual(list(iterJSONArray(['{"success": ', 'true}'])), [{'success': True}])
+
+	def test_truncated_array(self):
+		with self.assertRaises(ValueError):
+			list(iterJSONArray(['[{"_id": 1}, {"_id"']))
+
+		with self.assertRaises(JSONStreamError):
+			list(iterJSONArray(['[{"_id": 1}']))
+
+
+if __name__ == '__main__':
+	unittest.main()
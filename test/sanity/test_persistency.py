@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from driver.csi.csi_pb2 import Volume
+from driver.persistency import VolumesCache
+
+
+class TestVolumesCache(unittest.TestCase):
+	def _create_entry(self, cache, volume_id, capacity=1024):
+		entry = cache.get_or_create_new(volume_id)
+		entry.csi_volume = Volume(volume_id='zone_1:' + volume_id, capacity_bytes=capacity)
+		cache.release(entry)
+		return entry
+
+	def test_lru_eviction(self):
+		cache = VolumesCache(max_entries=3)
+		for i in range(3):
+			self._create_entry(cache, 'vol-%d' % i)
+
+		# touch vol-0 so vol-1 is the least recently used
+		cache.release(cache.get_or_create_new('vol-0'))
+		self._create_entry(cache, 'vol-3')
+
+		self.assertEqual(cache.size(), 3)
+		self.assertIsNone(cache.get('vol-1'))
+		self.assertIsNotNone(cache.get('vol-0'))
+
+	def test_get_updates_the_lru_order(self):
+		cache = VolumesCache(max_entries=2, ttl_seconds=0.5)
+		self._create_entry(cache, 'vol-0')
+		self._create_entry(cache, 'vol-1')
+		time.sleep(0.3)
+
+		# reading vol-0 makes vol-1 the least recently used and restarts the ttl of vol-0
+		self.assertIsNotNone(cache.get('vol-0'))
+		self._create_entry(cache, 'vol-2')
+		self.assertIsNone(cache.get('vol-1'))
+
+		time.sleep(0.3)
+		self.assertIsNotNone(cache.get('vol-0'))
+
+	def test_entries_in_use_are_not_evicted(self):
+		cache = VolumesCache(max_entries=1)
+		in_progress = cache.get_or_create_new('vol-0')
+		locked = cache.get_or_create_new('vol-1')
+		cache.release(locked)
+		locked.lock.acquire()
+		self._create_entry(cache, 'vol-2')
+
+		self.assertIs(cache.get('vol-0'), in_progress)
+		self.assertIs(cache.get('vol-1'), locked)
+		self.assertIs(cache.get_or_create_new('vol-0'), in_progress)
+		locked.lock.release()
+
+	def test_ttl_eviction(self):
+		cache = VolumesCache(ttl_seconds=0.1)
+		entry = self._create_entry(cache, 'vol-0')
+		time.sleep(0.2)
+
+		new_entry = cache.get_or_create_new('vol-0')
+		self.assertIsNot(new_entry, entry)
+		self.assertIsNone(new_entry.csi_volume)
+
+	def test_add_if_missing(self):
+		cache = VolumesCache()
+		existing = self._create_entry(cache, 'vol-0')
+		in_progress = cache.get_or_create_new('vol-1')
+
+		self.assertFalse(cache.add_if_missing('vol-0', Volume(volume_id='zone_2:vol-0')))
+		self.assertFalse(cache.add_if_missing('vol-1', Volume(volume_id='zone_2:vol-1')))
+		self.assertTrue(cache.add_if_missing('vol-2', Volume(volume_id='zone_2:vol-2')))
+
+		self.assertIs(cache.get('vol-0'), existing)
+		self.assertIs(cache.get('vol-1'), in_progress)
+		self.assertEqual(cache.get_or_create_new('vol-2').csi_volume.volume_id, 'zone_2:vol-2')
+
+	def test_remove_by_csi_volume_id(self):
+		cache = VolumesCache()
+		self._create_entry(cache, 'vol-0')
+		entry = cache.get_or_create_new('pvc-1')
+		entry.csi_volume = Volume(volume_id='zone_1:csi-pool-1', capacity_bytes=1024)
+		cache.release(entry)
+
+		cache.remove_by_csi_volume_id('zone_1:csi-pool-1')
+		self.assertIsNone(cache.get('pvc-1'))
+		self.assertIsNotNone(cache.get('vol-0'))
+
+	def test_snapshot(self):
+		tmp_dir = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, tmp_dir)
+		path = os.path.join(tmp_dir, 'volumes-cache.json')
+
+		cache = VolumesCache()
+		self._create_entry(cache, 'vol-0', capacity=5)
+		cache.get_or_create_new('vol-in-progress')
+		self.assertTrue(cache.is_dirty)
+		cache.save_snapshot(path)
+		self.assertFalse(cache.is_dirty)
+
+		restored = VolumesCache()
+		self.assertEqual(restored.load_snapshot(path), 1)
+		entry = restored.get_or_create_new('vol-0')
+		self.assertEqual(entry.csi_volume.volume_id, 'zone_1:vol-0')
+		self.assertEqual(entry.csi_volume.capacity_bytes, 5)
+
+		self.assertEqual(VolumesCache().load_snapshot(os.path.join(tmp_dir, 'missing.json')), 0)
+
+if __name__ == '__main__':
+	unittest.main()
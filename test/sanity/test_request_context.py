@@ -0,0 +1,67 @@
+import threading
+import time
+import unittest
+
+from NVMeshSDK.RequestContext import RequestContext, RequestAbortedError
+from driver.common import BackoffDelay, BackoffDelayWithStopEvent
+
+
+class TestRequestContext(unittest.TestCase):
+	def test_timeout_is_limited_to_the_time_remaining(self):
+		self.assertEqual(RequestContext.getTimeout(30), 30)
+
+		with RequestContext.scope(timeRemaining=5):
+			self.assertLessEqual(RequestContext.getTimeout(30), 5)
+			self.assertEqual(RequestContext.getTimeout(1), 1)
+
+		self.assertIsNone(RequestContext.getCurrent())
+
+	def test_deadline_exceeded(self):
+		with RequestContext.scope(timeRemaining=0.1):
+			RequestContext.checkCurrent()
+			self.assertRaises(RequestAbortedError, RequestContext.sleep, 1)
+			time.sleep(0.15)
+
+			with self.assertRaises(RequestAbortedError) as cm:
+				RequestContext.checkCurrent()
+
+			self.assertFalse(cm.exception.isCancelled)
+
+	def test_cancelled(self):
+		cancelled = threading.Event()
+		with RequestContext.scope(isCancelled=cancelled.is_set):
+			RequestContext.checkCurrent()
+			cancelled.set()
+
+			with self.assertRaises(RequestAbortedError) as cm:
+				RequestContext.checkCurrent()
+
+			self.assertTrue(cm.exception.isCancelled)
+
+	def test_bind_to_current_passes_the_context_to_other_threads(self):
+		results = []
+
+		def worker():
+			results.append(RequestContext.getTimeout(30))
+
+		with RequestContext.scope(timeRemaining=5):
+			t = threading.Thread(target=RequestContext.bindToCurrent(worker))
+
+		t.start()
+		t.join()
+		self.assertLessEqual(results[0], 5)
+
+	def test_backoff_stops_when_the_deadline_will_pass(self):
+		backoff = BackoffDelay(initial_delay=0.5, factor=1, max_timeout=10)
+		with RequestContext.scope(timeRemaining=0.2):
+			self.assertRaises(RequestAbortedError, backoff.wait)
+
+		backoff = BackoffDelayWithStopEvent(threading.Event(), initial_delay=0.5, factor=1, max_timeout=10)
+		with RequestContext.scope(timeRemaining=0.2):
+			self.assertRaises(RequestAbortedError, backoff.wait)
+
+		# without a request context the backoff waits as before
+		self.assertFalse(backoff.wait())
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+from NVMeshSDK.RequestHedging import HedgingPolicy, LatencyWindow
+
+
+class TestRequestHedging(unittest.TestCase):
+	def test_percentile(self):
+		window = LatencyWindow(size=100)
+		for i in range(100):
+			window.add(i / 100.0)
+
+		self.assertEqual(window.getPercentile(95), 0.95)
+		self.assertEqual(window.getPercentile(100), 0.99)
+
+	def test_hedge_delay(self):
+		policy = HedgingPolicy(percentile=50, minDelay=0.1, initialDelay=2)
+		self.assertEqual(policy.getHedgeDelay(), 2)
+
+		for _ in range(50):
+			policy.recordLatency(0.01)
+
+		self.assertEqual(policy.getHedgeDelay(), 0.1)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,54 @@
+import time
+import unittest
+from email.utils import formatdate
+
+from NVMeshSDK.RetryPolicy import RetryPolicy, RetryBudget
+
+
+class TestRetryPolicy(unittest.TestCase):
+	def test_backoff_delay_is_bounded(self):
+		policy = RetryPolicy(baseDelay=0.5, maxDelay=3)
+		for retry_number in range(10):
+			delay = policy.getBackoffDelay(retry_number)
+			self.assertGreaterEqual(delay, 0)
+			self.assertLessEqual(delay, min(3, 0.5 * 2 ** retry_number))
+
+	def test_retry_after(self):
+		policy = RetryPolicy(maxRetryAfter=30)
+		self.assertEqual(policy.getRetryDelay(0, '2'), 2)
+		self.assertEqual(policy.getRetryDelay(0, '600'), 30)
+		self.assertAlmostEqual(RetryPolicy.parseRetryAfter(formatdate(time.time() + 10, usegmt=True)), 10, delta=2)
+		self.assertIsNone(RetryPolicy.parseRetryAfter('not a date'))
+
+	def test_total_timeout(self):
+		policy = RetryPolicy(totalTimeout=5)
+		self.assertTrue(policy.hasTimeForRetry(time.time(), 1))
+		self.assertFalse(policy.hasTimeForRetry(time.time() - 4.5, 1))
+
+	def test_from_config(self):
+		policy = RetryPolicy.fromConfig({'MAX_HTTP_REQUEST_RETRIES': '5', 'REQUEST_TOTAL_TIMEOUT': 0})
+		self.assertEqual(policy.maxRetries, 5)
+		self.assertIsNone(policy.totalTimeout)
+
+
+class TestRetryBudget(unittest.TestCase):
+	def test_requests_deposit_retries(self):
+		budget = RetryBudget(ratio=0.5, minRetriesPerSecond=0, maxTokens=10)
+		budget.tokens = 0
+		self.assertFalse(budget.tryAcquireRetry())
+
+		budget.recordRequest()
+		budget.recordRequest()
+		self.assertTrue(budget.tryAcquireRetry())
+		self.assertFalse(budget.tryAcquireRetry())
+
+	def test_tokens_are_capped(self):
+		budget = RetryBudget(ratio=1, minRetriesPerSecond=0, maxTokens=2)
+		for _ in range(10):
+			budget.recordRequest()
+
+		self.assertEqual(sum(1 for _ in range(10) if budget.tryAcquireRetry()), 2)
+
+
+if __name__ == '__main__':
+	unittest.main()
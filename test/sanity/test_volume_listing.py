@@ -0,0 +1,106 @@
+import unittest
+from concurrent import futures
+
+from driver.volume_listing import ListVolumesToken, MultiZoneVolumeLister, InvalidListVolumesToken
+
+
+class FakeVolume(object):
+	def __init__(self, _id):
+		self._id = _id
+
+
+class TestMultiZoneVolumeLister(unittest.TestCase):
+	def setUp(self):
+		self.volumes_by_zone = {
+			'A': ['a%d' % i for i in range(5)],
+			'B': ['b%d' % i for i in range(2)],
+			'C': [],
+		}
+		self.executor = futures.ThreadPoolExecutor(max_workers=3)
+		self.addCleanup(self.executor.shutdown)
+
+	def _fetch_page(self, zone, after_id, limit):
+		ids = sorted(_id for _id in self.volumes_by_zone[zone] if after_id is None or _id > after_id)
+		if limit:
+			ids = ids[:limit]
+		return [FakeVolume(_id) for _id in ids]
+
+	def _list_all(self, max_entries):
+		lister = MultiZoneVolumeLister(self._fetch_page, self.executor)
+		token = ''
+		pages = []
+		while True:
+			cursors = ListVolumesToken.decode(token, self.volumes_by_zone.keys())
+			entries, next_cursors = lister.list_volumes(cursors, max_entries)
+			pages.append([volume._id for zone, volume in entries])
+			token = ListVolumesToken.encode(next_cursors)
+			if not token:
+				return pages
+
+	def test_pages_are_merged_from_all_zones(self):
+		pages = self._list_all(max_entries=3)
+
+		self.assertEqual(pages[0], ['a0', 'b0', 'a1'])
+		self.assertTrue(all(len(page) <= 3 for page in pages))
+
+		all_ids = [_id for page in pages for _id in page]
+		self.assertEqual(sorted(all_ids), sorted(self.volumes_by_zone['A'] + self.volumes_by_zone['B']))
+
+	def test_list_without_max_entries(self):
+		pages = self._list_all(max_entries=0)
+		self.assertEqual(len(pages), 1)
+		self.assertEqual(len(pages[0]), 7)
+
+	def test_zones_are_asked_only_for_their_share(self):
+		self.volumes_by_zone = dict((zone, ['%s%03d' % (zone, i) for i in range(100)]) for zone in ['A', 'B', 'C'])
+		fetched_counts = []
+
+		def fetch(zone, after_id, limit):
+			page = self._fetch_page(zone, after_id, limit)
+			fetched_counts.append(len(page))
+			return page
+
+		lister = MultiZoneVolumeLister(fetch, self.executor)
+		entries, next_cursors = lister.list_volumes(ListVolumesToken.decode('', ['A', 'B', 'C']), 9)
+
+		self.assertEqual(len(entries), 9)
+		self.assertEqual(next_cursors, {'A': 'A002', 'B': 'B002', 'C': 'C002'})
+		self.assertLessEqual(sum(fetched_counts), 9 + 3 * MultiZoneVolumeLister.ZONE_PAGE_MARGIN)
+
+	def test_zone_is_asked_for_more_when_others_run_out(self):
+		self.volumes_by_zone = {'A': ['a%02d' % i for i in range(20)], 'B': ['b0'], 'C': []}
+		lister = MultiZoneVolumeLister(self._fetch_page, self.executor)
+		entries, next_cursors = lister.list_volumes(ListVolumesToken.decode('', ['A', 'B', 'C']), 10)
+
+		self.assertEqual([volume._id for zone, volume in entries], ['a00', 'b0'] + ['a%02d' % i for i in range(1, 9)])
+		self.assertEqual(next_cursors, {'A': 'a08'})
+
+	def test_zone_error_is_raised(self):
+		def fetch(zone, after_id, limit):
+			raise ValueError('zone %s is down' % zone)
+
+		lister = MultiZoneVolumeLister(fetch, self.executor)
+		self.assertRaises(ValueError, lister.list_volumes, {'A': None}, 10)
+
+	def test_failed_zone_is_skipped_and_keeps_its_cursor(self):
+		def fetch(zone, after_id, limit):
+			if zone == 'B':
+				raise ValueError('zone B is down')
+
+			return self._fetch_page(zone, after_id, limit)
+
+		lister = MultiZoneVolumeLister(fetch, self.executor)
+		entries, next_cursors = lister.list_volumes({'A': None, 'B': 'b0', 'C': None}, 10)
+
+		self.assertEqual([volume._id for zone, volume in entries], self.volumes_by_zone['A'])
+		self.assertEqual(next_cursors, {'B': 'b0'})
+
+	def test_invalid_token(self):
+		self.assertRaises(InvalidListVolumesToken, ListVolumesToken.decode, 'not-a-token', ['A'])
+		self.assertRaises(InvalidListVolumesToken, ListVolumesToken.decode, ListVolumesToken.encode(['A']), ['A'])
+
+		# a token from before zone B was removed from the topology
+		self.assertRaises(InvalidListVolumesToken, ListVolumesToken.decode, ListVolumesToken.encode({'A': 'a1', 'B': None}), ['A'])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+
+from driver.warm_pool import WarmPoolDefinition, WarmVolumePoolManager, parse_warm_pool_definitions
+
+
+class FakeVolume(object):
+	def __init__(self, name, capacity, csi_metadata):
+		self.name = name
+		self.capacity = capacity
+		self.csi_metadata = csi_metadata
+
+
+class FakeWarmVolumePoolManager(WarmVolumePoolManager):
+	def __init__(self, definitions, **kwargs):
+		WarmVolumePoolManager.__init__(self, definitions, lambda name, definition, md: FakeVolume(name, definition.capacity, md), **kwargs)
+		self.saved = []
+		self.updated = []
+		self.update_error = None
+		self.volumes_by_zone = {}
+		self.get_errors_by_zone = {}
+
+	def _save_volumes(self, zone, volumes, log):
+		self.saved.extend(volumes)
+		return volumes
+
+	def _update_volume(self, zone, volume, log):
+		self.updated.append(volume)
+		return self.update_error
+
+	def _get_volumes(self, zone, filterObj):
+		if zone in self.get_errors_by_zone:
+			raise ValueError(self.get_errors_by_zone[zone])
+
+		csi_name = filterObj[0].value
+		return [v for v in self.volumes_by_zone.get(zone, []) if v.csi_metadata.get('csi_name') == csi_name]
+
+
+class TestWarmVolumePool(unittest.TestCase):
+	def setUp(self):
+		self.definition = WarmPoolDefinition.from_dict({
+			'name': 'fast',
+			'capacity': 1024,
+			'size': 2,
+			'parameters': {'vpg': 'DEFAULT_CONCATENATED_VPG'},
+			'zones': ['A', 'B']
+		})
+
+	def test_parse_definitions(self):
+		definitions = parse_warm_pool_definitions([{'name': 'p', 'capacity': '10', 'size': 1, 'parameters': {'stripeWidth': 2}}])
+		self.assertEqual(definitions[0].parameters, {'stripeWidth': '2'})
+		self.assertTrue(definitions[0].matches({'stripeWidth': '2'}, 10))
+		self.assertFalse(definitions[0].matches({'stripeWidth': '2'}, 11))
+		self.assertRaises(ValueError, WarmPoolDefinition.from_dict, {'name': 'p', 'size': 1})
+		self.assertEqual(parse_warm_pool_definitions(None), [])
+
+	def test_refill_and_claim(self):
+		manager = FakeWarmVolumePoolManager([self.definition])
+		manager.refill()
+		self.assertEqual(len(manager.saved), 4)
+		self.assertEqual(manager.saved[0].csi_metadata['warm_pool'], 'fast')
+
+		# pools are already full
+		manager.refill()
+		self.assertEqual(len(manager.saved), 4)
+
+		claimed = manager.claim({'vpg': 'DEFAULT_CONCATENATED_VPG'}, 1024, {'csi_name': 'pvc-1'}, ['B'])
+		volume, zone = claimed
+		self.assertEqual(zone, 'B')
+		self.assertEqual(volume.csi_metadata, {'csi_name': 'pvc-1', 'zone': 'B'})
+		self.assertTrue(manager.refill_event.is_set())
+
+		manager.refill()
+		self.assertEqual(len(manager.saved), 5)
+
+	def test_find_claimed_volume(self):
+		manager = FakeWarmVolumePoolManager([self.definition])
+		manager.refill()
+		volume, zone = manager.claim({'vpg': 'DEFAULT_CONCATENATED_VPG'}, 1024, {'csi_name': 'pvc-1'}, ['B'])
+		manager.volumes_by_zone[zone] = [volume]
+
+		self.assertEqual(manager.find_claimed_volume({'vpg': 'DEFAULT_CONCATENATED_VPG'}, 1024, 'pvc-1', []), (volume, 'B'))
+		self.assertIsNone(manager.find_claimed_volume({'vpg': 'DEFAULT_CONCATENATED_VPG'}, 1024, 'pvc-2', []))
+		self.assertIsNone(manager.find_claimed_volume({'vpg': 'DEFAULT_CONCATENATED_VPG'}, 1024, 'pvc-1', ['A']))
+		self.assertIsNone(manager.find_claimed_volume({'vpg': 'OTHER'}, 1024, 'pvc-1', []))
+
+		# the volume might have been claimed in a zone that could not be searched
+		manager.get_errors_by_zone['A'] = 'timeout'
+		self.assertRaises(ValueError, manager.find_claimed_volume, {'vpg': 'DEFAULT_CONCATENATED_VPG'}, 1024, 'pvc-2', [])
+
+	def test_no_match(self):
+		manager = FakeWarmVolumePoolManager([self.definition])
+		manager.refill()
+
+		self.assertIsNone(manager.claim({'vpg': 'OTHER'}, 1024, {'csi_name': 'pvc-1'}, []))
+		self.assertIsNone(manager.claim({'vpg': 'DEFAULT_CONCATENATED_VPG'}, 2048, {'csi_name': 'pvc-1'}, []))
+		self.assertIsNone(manager.claim({'vpg': 'DEFAULT_CONCATENATED_VPG'}, 1024, {'csi_name': 'pvc-1'}, ['C']))
+
+	def test_disabled_zones_and_failed_claims_are_skipped(self):
+		manager = FakeWarmVolumePoolManager([self.definition], is_zone_healthy=lambda zone: zone != 'A')
+		manager.refill()
+		self.assertEqual(len(manager.saved), 2)
+
+		manager.update_error = 'timeout'
+		self.assertIsNone(manager.claim({'vpg': 'DEFAULT_CONCATENATED_VPG'}, 1024, {'csi_name': 'pvc-1'}, []))
+
+		# both volumes of zone B were tried and dropped from the pool
+		self.assertEqual(len(manager.updated), 2)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,93 @@
+import time
+import unittest
+
+from grpc import StatusCode
+
+from NVMeshSDK.ConnectionManager import ManagementTimeout
+from NVMeshSDK.RequestContext import RequestAbortedError
+from driver.common import DriverError
+from driver.topology_utils import ZoneLatencyTracker, LatencyAwareZonePicker
+
+
+class TestZoneLatencyTracker(unittest.TestCase):
+	def setUp(self):
+		ZoneLatencyTracker.clear()
+
+	def tearDown(self):
+		ZoneLatencyTracker.clear()
+
+	def test_moving_average(self):
+		ZoneLatencyTracker.record('A', 1.0)
+		self.assertAlmostEqual(ZoneLatencyTracker.get_score('A'), 1.0)
+
+		ZoneLatencyTracker.record('A', 2.0)
+		self.assertAlmostEqual(ZoneLatencyTracker.get_stats('A').latency, 1.2)
+		self.assertIsNone(ZoneLatencyTracker.get_score('B'))
+
+	def test_errors_increase_the_score(self):
+		ZoneLatencyTracker.record('A', 0.5)
+		ZoneLatencyTracker.record('B', 0.5)
+		ZoneLatencyTracker.record('B', 0.5, is_error=True)
+
+		self.assertGreater(ZoneLatencyTracker.get_score('B'), ZoneLatencyTracker.get_score('A'))
+
+	def test_measure_records_exceptions_as_errors(self):
+		def failing_request():
+			with ZoneLatencyTracker.measure('A'):
+				raise ManagementTimeout('https://mgmt:4000', 'timeout')
+
+		self.assertRaises(ManagementTimeout, failing_request)
+		self.assertEqual(ZoneLatencyTracker.get_stats('A').error_rate, 1.0)
+
+		with ZoneLatencyTracker.measure('A') as measurement:
+			measurement.is_error = False
+
+		self.assertEqual(ZoneLatencyTracker.get_stats('A').samples, 2)
+
+	def test_measure_ignores_errors_of_the_request(self):
+		def raise_in_measurement(ex):
+			try:
+				with ZoneLatencyTracker.measure('A'):
+					raise ex
+			except Exception:
+				pass
+
+		raise_in_measurement(DriverError(StatusCode.INVALID_ARGUMENT, 'bad capacity'))
+		raise_in_measurement(ValueError('bad response'))
+		self.assertEqual(ZoneLatencyTracker.get_stats('A').error_rate, 0.0)
+
+		raise_in_measurement(DriverError(StatusCode.UNAVAILABLE, 'zone is down'))
+		self.assertGreater(ZoneLatencyTracker.get_stats('A').error_rate, 0.0)
+
+	def test_measure_ignores_aborted_requests(self):
+		try:
+			with ZoneLatencyTracker.measure('A'):
+				raise RequestAbortedError('Request cancelled', isCancelled=True)
+		except RequestAbortedError:
+			pass
+
+		self.assertIsNone(ZoneLatencyTracker.get_stats('A'))
+
+	def test_batched_requests_are_recorded_per_volume(self):
+		with ZoneLatencyTracker.measure('A', batch_size=10):
+			time.sleep(0.1)
+
+		with ZoneLatencyTracker.measure('B'):
+			time.sleep(0.05)
+
+		self.assertLess(ZoneLatencyTracker.get_stats('A').latency, 0.05)
+		self.assertLess(ZoneLatencyTracker.get_score('A'), ZoneLatencyTracker.get_score('B'))
+
+	def test_latency_aware_picker_prefers_faster_zones(self):
+		for i in range(5):
+			ZoneLatencyTracker.record('fast', 0.1)
+			ZoneLatencyTracker.record('slow', 2.0)
+
+		picker = LatencyAwareZonePicker()
+		picks = [picker.pick_zone(['fast', 'slow']) for _ in range(200)]
+
+		self.assertGreater(picks.count('fast'), picks.count('slow') * 3)
+		self.assertEqual(picker.pick_zone(['slow']), 'slow')
+
+if __name__ == '__main__':
+	unittest.main()